@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# Program run time estimate
+# Copyright 2017 - Michael T. Mayers
+# Licensed under the GPLV3 - see https://www.gnu.org/licenses/gpl-3.0.html
+#
+# walks Toolpath chunks: G00 moves at the rapid rate, G01 at their F.
+#
+# without an acceleration every move runs at its full speed. with one
+# (in/s^2, a single value or per X Y Z axis) every move starts and ends
+# at rest (exact stop, G61) on a trapezoidal speed profile, or an S
+# curve when a jerk limit (in/s^3) is given too. the axis limits are
+# projected onto the move direction, the most limiting axis wins. short
+# ring moves that never reach F are where this matters.
+#
+# with numpy a chunk is worked out as whole segment arrays, without it
+# only the constant velocity model is available.
+
+import math
+
+from toolpath import RAPID, UNSET
+
+RAPIDRATE = 200.0 # in/min
+ACCEL = 20.0      # in/s^2, what the GUI assumes for its second estimate
+
+#############################################################################
+
+class Estimator(object):
+
+    def __init__(self, rapidRate=RAPIDRATE, accel=None, jerk=None):
+        self.rapidRate = rapidRate
+        self.accel = accel
+        self.jerk = jerk
+        self.feedLength = 0.0
+        self.rapidLength = 0.0
+        self.minutes = 0.0
+        self.cache = {}
+
+    def add(self, tp):
+        # stamped layers (same key, same entry XY) take the same time
+        ck = None
+        if tp.key is not None:
+            ck = (tp.key, tp.start[0], tp.start[1])
+            hit = self.cache.get(ck)
+            if hit is not None:
+                self.accumulate(*hit)
+                return
+        totals = chunkTotals(tp, self.rapidRate, self.accel, self.jerk)
+        if ck is not None:
+            self.cache[ck] = totals
+        self.accumulate(*totals)
+
+    def accumulate(self, feedLength, rapidLength, minutes):
+        self.feedLength += feedLength
+        self.rapidLength += rapidLength
+        self.minutes += minutes
+
+    def tap(self, chunks):
+        # pass chunks through (to an emitter) while adding them up
+        for tp in chunks:
+            self.add(tp)
+            yield tp
+
+    def summary(self):
+        return {
+            "feedLength": self.feedLength,
+            "rapidLength": self.rapidLength,
+            "minutes": self.minutes,
+        }
+
+#############################################################################
+
+def chunkTotals(tp, rapidRate=RAPIDRATE, accel=None, jerk=None):
+    # (feed length, rapid length, minutes). an axis that is still unknown
+    # (nan / UNSET) on either end of a move doesn't contribute
+    if len(tp) == 0:
+        return 0.0, 0.0, 0.0
+    try:
+        import numpy
+    except ImportError:
+        if accel is not None:
+            raise
+        return chunkTotalsScalar(tp, rapidRate)
+    length, seconds, rapid = segmentTimes(tp, rapidRate, accel, jerk)
+    return (float(length[~rapid].sum()), float(length[rapid].sum()), float(seconds.sum())/60.0)
+
+def chunkTotalsScalar(tp, rapidRate=RAPIDRATE):
+    scale = 1.0 if tp.decimals is None else 10.0**-tp.decimals
+    unset = UNSET if tp.decimals is not None else None
+    def val(v):
+        if v == unset or v != v:
+            return None
+        return v*scale
+    px, py, pz, pf = [val(v) for v in tp.start]
+    feedLength = rapidLength = minutes = 0.0
+    for m, x, y, z, f in zip(tp.motion, tp.x, tp.y, tp.z, tp.f):
+        x, y, z, f = val(x), val(y), val(z), val(f)
+        d2 = 0.0
+        if x is not None and px is not None:
+            d2 += (x-px)*(x-px)
+        if y is not None and py is not None:
+            d2 += (y-py)*(y-py)
+        if z is not None and pz is not None:
+            d2 += (z-pz)*(z-pz)
+        d = math.sqrt(d2)
+        if m == RAPID:
+            rapidLength += d
+            minutes += d/rapidRate
+        else:
+            feedLength += d
+            if d and f:
+                minutes += d/f
+        px, py, pz = x, y, z
+    return feedLength, rapidLength, minutes
+
+###################################
+
+def segmentTimes(tp, rapidRate=RAPIDRATE, accel=None, jerk=None):
+    # -> (length, seconds, is rapid) arrays, one entry per segment
+    import numpy as np
+    A = tp.arrays()
+    P = np.column_stack((A["x"], A["y"], A["z"]))
+    start = np.array([tp.value(v) for v in tp.start[:3]], dtype=np.float64)
+    D = np.diff(np.vstack((start[None,:], P)), axis=0)
+    D[np.isnan(D)] = 0.0
+    length = np.sqrt((D*D).sum(axis=1))
+    rapid = A["motion"] == RAPID
+    v = np.where(rapid, rapidRate, A["f"])/60.0  # in/s
+    moving = (length > 0) & (v > 0)  # nan feed compares False
+    seconds = np.zeros(len(length))
+    L = length[moving]
+    v = v[moving]
+    if accel is None:
+        seconds[moving] = L/v
+    else:
+        U = np.abs(D[moving]) / L[:,None]
+        a = axisLimit(U, accel)
+        j = axisLimit(U, jerk) if jerk is not None else None
+        seconds[moving] = profileTime(L, v, a, j)
+    return length, seconds, rapid
+
+def axisLimit(U, limit):
+    # per axis limits (X, Y, Z) projected onto unit move directions U
+    import numpy as np
+    limit = np.broadcast_to(np.asarray(limit, dtype=np.float64), (3,))
+    with np.errstate(divide="ignore"):
+        return np.min(np.where(U > 0, limit[None,:]/U, np.inf), axis=1)
+
+def ramp(w, a, j):
+    # S curve from rest to speed w under acceleration a and jerk j:
+    # (time, distance)
+    import numpy as np
+    t = np.where(w >= a*a/j, w/a + a/j, 2.0*np.sqrt(w/j))
+    return t, w*t/2.0
+
+def profileTime(L, v, a, j=None):
+    # seconds to move L from rest to rest, speed v, acceleration a and
+    # optionally jerk j (all arrays)
+    import numpy as np
+    if j is None:
+        # trapezoid, or a triangle when L is too short to reach v
+        full = L >= v*v/a
+        return np.where(full, L/v + v/a, 2.0*np.sqrt(L/a))
+    t, d = ramp(v, a, j)
+    out = 2.0*t + (L - 2.0*d)/v
+    short = 2.0*d > L
+    if short.any():
+        # peak speed never reaches v: bisect the peak at which both ramps
+        # just cover L
+        Ls, a, j = L[short], a[short], j[short]
+        lo = np.zeros_like(Ls)
+        hi = v[short].copy()
+        for i in range(48):
+            mid = 0.5*(lo + hi)
+            over = 2.0*ramp(mid, a, j)[1] > Ls
+            hi = np.where(over, mid, hi)
+            lo = np.where(over, lo, mid)
+        out[short] = 2.0*ramp(0.5*(lo + hi), a, j)[0]
+    return out
+
+#############################################################################
+
+def estimate(chunks, rapidRate=RAPIDRATE, accel=None, jerk=None):
+    est = Estimator(rapidRate, accel, jerk)
+    for tp in chunks:
+        est.add(tp)
+    return est.summary()
+
+def strategySaving(params, rapidRate=RAPIDRATE, accel=None, jerk=None):
+    # facing the same stock with concentric rings vs one spiral
+    import gcodecore
+    out = {}
+    for strategy in gcodecore.STRATEGIES:
+        # the machine's path, every layer also in sub / loop mode
+        chunks = gcodecore.machinePath("facing")(params.replace(strategy=strategy))
+        out[strategy] = estimate(chunks, rapidRate, accel, jerk)["minutes"]
+    out["saved"] = out["rings"] - out["spiral"]
+    out["percent"] = 100.0*out["saved"]/out["rings"] if out["rings"] else 0.0
+    return out
+
+def formatMinutes(minutes):
+    # 83.5 -> "1:23:30"
+    s = int(round(minutes*60))
+    return "%d:%02d:%02d" % (s//3600, s//60%60, s%60)
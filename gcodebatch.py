@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# Batch generation over a job manifest
+# Copyright 2017 - Michael T. Mayers
+# Licensed under the GPLV3 - see https://www.gnu.org/licenses/gpl-3.0.html
+#
+# a manifest is a CSV file (header row of column names) or a JSON list of
+# objects, one job each:
+#
+#   kind,name,x2,y2,z1,z2,material,cutDir
+#   facing,lid,4,3,1,0.5,"Aluminum, 7075",Climb
+#   recting,base,6,6,0.75,0,Mild Steel,
+#
+# JSON may also be {"defaults": {...}, "jobs": [...]}. columns are
+# JobParams names plus kind, name, modal, decimals, comments, compress
+# (gz or xz) and level (0-9); empty / missing ones take the defaults.
+# every job is written to
+#
+#   <outdir>/<index>-<kind>-<name>.ngc[.gz|.xz]
+#
+# by a pool of worker processes, and a summary (lines, bytes, estimated
+# cycle time, seconds) is printed and saved as <outdir>/summary.json
+
+import os, re, csv, json, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import gcodecore, gcodeio
+from gcodecore import JobParams, number
+from gcodeemit import emitText, emitModal
+from gcodecache import ProgramCache, cacheKey
+from cycletime import Estimator, estimate
+
+#############################################################################
+
+JOBKEYS = ("kind", "name", "modal", "decimals", "comments", "compress", "level")
+COMPRESS = ("", "gz", "xz")
+
+def truth(v):
+    if isinstance(v, str):
+        return v.strip().lower() in ("1", "y", "yes", "true", "on")
+    return bool(v)
+
+def coerce(key, v):
+    # manifest value -> what JobParams / the job expects. CSV hands
+    # everything over as str, JSON may already have the right type
+    if key in ("modal", "comments"):
+        return truth(v)
+    if key in ("decimals", "level"):
+        return int(v)
+    if key == "compress":
+        v = str(v).strip().lower().lstrip(".")
+        if v in ("none", "no"):
+            v = ""
+        if v not in COMPRESS:
+            raise ValueError(v)
+        return v
+    if key in ("kind", "name"):
+        return str(v)
+    d = JobParams.defaults[key]
+    if isinstance(d, str):
+        return str(v)
+    if isinstance(v, str):
+        v = number(v)
+    return int(v) if isinstance(d, int) else float(v)
+
+def makeJob(index, row, defaults=None):
+    # one manifest row -> job dict (index, kind, name, output options, params)
+    if not isinstance(row, dict):
+        raise ValueError("job %d: not a row of columns <%s>" % (index, row))
+    if None in row:
+        # csv.DictReader keeps the cells past the header under None
+        raise ValueError("job %d: more cells than columns" % index)
+    row = dict(defaults or {}, **row)
+    job = {"index": index, "kind": "facing", "name": "",
+           "modal": False, "decimals": 4, "comments": False,
+           "compress": "", "level": None}
+    params = {}
+    for key, v in row.items():
+        key = key.strip()
+        if v is None or (isinstance(v, str) and not v.strip()):
+            continue
+        if key not in JOBKEYS and key not in JobParams.defaults:
+            raise ValueError("job %d: unknown column <%s>" % (index, key))
+        try:
+            v = coerce(key, v)
+        except (ValueError, ZeroDivisionError):
+            raise ValueError("job %d: bad %s <%s>" % (index, key, v))
+        if key in JOBKEYS:
+            job[key] = v
+        else:
+            params[key] = v
+    if job["kind"] not in gcodecore.generators:
+        raise ValueError("job %d: unknown kind <%s>" % (index, job["kind"]))
+    if job["level"] is not None and not 0 <= job["level"] <= 9:
+        raise ValueError("job %d: bad level <%d>" % (index, job["level"]))
+    if "docXY" not in params:
+        params["docXY"] = params.get("toolDiam", JobParams.defaults["toolDiam"])*0.25
+    try:
+        JobParams(**params) # validate up front, not in a worker
+    except (TypeError, ValueError) as e:
+        raise ValueError("job %d: %s" % (index, e))
+    job["params"] = params
+    return job
+
+def readManifest(path):
+    with open(path, newline="") as f:
+        if path.lower().endswith(".json"):
+            data = json.load(f)
+            defaults = {}
+            if isinstance(data, dict):
+                defaults = data.get("defaults", {})
+                data = data.get("jobs", [])
+            rows = data
+        else:
+            defaults = {}
+            rows = list(csv.DictReader(f))
+    return [makeJob(i+1, row, defaults) for i, row in enumerate(rows)]
+
+def slug(text):
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", text).strip("_")
+
+def jobFileName(job, width=4):
+    # stable for a given manifest: row number, kind and name (or the
+    # material and stock size when the row has no name)
+    name = job["name"]
+    if not name:
+        p = JobParams(**job["params"])
+        name = "%s-%gx%g" % (p.material.split(",")[0], p.x2-p.x1, p.y2-p.y1)
+    ext = "." + job["compress"] if job.get("compress") else ""
+    return "%0*d-%s-%s.ngc%s" % (width, job["index"], job["kind"], slug(name), ext)
+
+def jobCost(job):
+    # rough relative work (segments), only used to hand the big jobs out first
+    p = JobParams(**job["params"])
+    xa, xb = p.xaxb()
+    ya, yb = p.yayb()
+    za, zb = p.zazb()
+    layers = int((za-zb)/p.docZ) + 1 if p.docZ > 0 else 1
+    rings = min(xb-xa, yb-ya)/(2.0*p.docXY) + 1 if p.docXY > 0 else 1
+    return layers*rings
+
+#############################################################################
+
+def runJob(job, path, engine="auto", motion=None, cache=None):
+    # worker side: generate one program straight to its file. motion is
+    # the cycletime.Estimator arguments (rapidRate, accel, jerk), cache
+    # (root, maxBytes) of a gcodecache.ProgramCache or None
+    t0 = time.perf_counter()
+    params = JobParams(**job["params"])
+    motion = motion or {}
+    est = Estimator(**motion)
+    expanded = params.layerMode == "expand"
+    def lines():
+        chunks = gcodecore.pathGenerator(job["kind"], engine)(params)
+        if expanded:
+            chunks = est.tap(chunks)
+        if job["modal"]:
+            return emitModal(chunks, job["decimals"], job["comments"])
+        return emitText(chunks)
+    def meta():
+        if not expanded:
+            # o-word programs hold the layer once, time every layer
+            return dict(estimate(gcodecore.machinePath(job["kind"], engine)(params), **motion),
+                        motion=motion)
+        return dict(est.summary(), motion=motion)
+    cached = False
+    if cache is None:
+        nlines, nbytes = gcodeio.writeProgramFile(lines(), path, level=job.get("level"))
+        info = meta()
+    else:
+        pc = ProgramCache(*cache)
+        key = cacheKey(job["kind"], params, job["modal"], job["decimals"], job["comments"])
+        info, cached = pc.fetch(key, lines, meta)
+        try:
+            with gcodeio.openOutput(path, job.get("level")) as f:
+                nlines, nbytes = pc.copy(info, f)
+        except FileNotFoundError:
+            # evicted by another worker between lookup and copy
+            info, cached = pc.store(key, lines(), meta), False
+            with gcodeio.openOutput(path, job.get("level")) as f:
+                nlines, nbytes = pc.copy(info, f)
+        if info.get("motion") != json.loads(json.dumps(motion)):
+            # stored with another machine model
+            info = estimate(gcodecore.machinePath(job["kind"], engine)(params), **motion)
+    return {
+        "index": job["index"],
+        "kind": job["kind"],
+        "name": job["name"],
+        "path": path,
+        "lines": nlines,
+        "bytes": nbytes,
+        "minutes": info["minutes"],
+        "feedLength": info["feedLength"],
+        "rapidLength": info["rapidLength"],
+        "cached": cached,
+        "seconds": time.perf_counter() - t0,
+    }
+
+def runBatch(jobs, outdir, workers=None, engine="auto", motion=None, progress=None,
+             cache=None):
+    # -> list of per job results in manifest order. workers=1 runs in
+    # this process (no pool)
+    os.makedirs(outdir, exist_ok=True)
+    width = max(4, len(str(len(jobs))))
+    paths = [os.path.join(outdir, jobFileName(job, width)) for job in jobs]
+    results = []
+    if workers == 1:
+        for job, path in zip(jobs, paths):
+            results.append(runJob(job, path, engine, motion, cache))
+            if progress:
+                progress(results[-1])
+        return results
+    # one job per task, biggest first: job sizes vary by orders of
+    # magnitude and a 48" plate picked up last would leave every other
+    # worker idle while it runs
+    order = sorted(range(len(jobs)), key=lambda i: -jobCost(jobs[i]))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(runJob, jobs[i], paths[i], engine, motion, cache): i
+                   for i in order}
+        done = [None]*len(jobs)
+        for future in as_completed(futures):
+            done[futures[future]] = future.result()
+            if progress:
+                progress(done[futures[future]])
+    return done
+
+def summarize(results, wall):
+    busy = sum(r["seconds"] for r in results)
+    return {
+        "jobs": results,
+        "total": {
+            "jobs": len(results),
+            "lines": sum(r["lines"] for r in results),
+            "bytes": sum(r["bytes"] for r in results),
+            "minutes": sum(r["minutes"] for r in results),
+            "cached": sum(1 for r in results if r["cached"]),
+            "seconds": busy,
+            "wall": wall,
+            "parallelism": busy/wall if wall else 0.0,
+        },
+    }
+
+def formatResult(r):
+    return "%-40s %10d lines %12d bytes %9.1f min %8.3f s%s" % (
+        os.path.basename(r["path"]), r["lines"], r["bytes"], r["minutes"], r["seconds"],
+        " (cached)" if r["cached"] else "")
+
+def formatTotal(t):
+    return ("%d jobs (%d cached), %d lines, %d bytes, %0.1f min cycle time, "
+            "%0.2f s work in %0.2f s wall (x%0.1f)" % (
+        t["jobs"], t["cached"], t["lines"], t["bytes"], t["minutes"], t["seconds"], t["wall"],
+        t["parallelism"]))
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# Generator benchmarks over a job matrix
+# Copyright 2017 - Michael T. Mayers
+# Licensed under the GPLV3 - see https://www.gnu.org/licenses/gpl-3.0.html
+#
+# every case is one program (kind, square plate, docXY, docZ, cutDir on
+# 0.1" of stock) made the way gcodecli makes it - toolpath chunks, text,
+# written to a file - and timed twice over:
+#
+#   generate   the toolpath chunks alone
+#   total      chunks + text + the file write (best of `repeat`)
+#
+# plus one more run under tracemalloc for the peak memory. results go to
+# JSON (cases keyed by id, with the python / numpy / generator versions
+# they were taken on); compare() lines two such files up and flags cases
+# slower or bigger than a threshold, and any whose output changed size.
+# compareEngines() times the program text of every case on the scalar
+# and the numpy engine and checks the two are byte identical.
+#
+# never imports PyQt5, runs on a build box.
+
+import os, sys, json, time, hashlib, platform, tempfile, tracemalloc
+
+import gcodecore, gcodeio
+from gcodecore import JobParams, DOCZ_CHOICES, CUTDIRS
+from gcodeemit import emitText, emitModal
+
+PLATES = (1, 2, 4, 8, 12, 24, 48)               # in, square
+DOCXYS = (0.25, 0.1, 0.05, 0.02, 0.01, 0.005)
+DOCZS = tuple(text for text, v in DOCZ_CHOICES)
+DEPTH = 0.1                                     # in of stock faced off
+TOOLDIAM = 0.5
+
+# the corners of the matrix, a second or so (the whole one is ~10s)
+QUICK = {"plates": (1, 4, 48), "docXYs": (0.1, 0.005), "docZs": ("1/8", "1/100")}
+
+MINSECONDS = 0.01   # faster cases are too noisy to flag
+THRESHOLD = 10.0    # % slower / bigger that counts as a regression
+
+#############################################################################
+
+def matrix(kinds=None, plates=PLATES, docXYs=DOCXYS, docZs=DOCZS, cutDirs=CUTDIRS):
+    # -> case dicts, the small ones first
+    docZ = dict(DOCZ_CHOICES)
+    cases = []
+    for kind in kinds or list(gcodecore.generators):
+        for plate in plates:
+            for docXY in docXYs:
+                for z in docZs:
+                    for cutDir in cutDirs:
+                        cases.append({
+                            "id": "%s-%gin-xy%g-z%s-%s" % (kind, plate, docXY, z, cutDir),
+                            "kind": kind, "plate": plate, "docXY": docXY,
+                            "docZ": z, "cutDir": cutDir,
+                            "params": {"x2": float(plate), "y2": float(plate),
+                                       "z1": DEPTH, "z2": 0.0, "toolDiam": TOOLDIAM,
+                                       "docXY": docXY, "docZ": docZ[z], "cutDir": cutDir},
+                        })
+    return cases
+
+def environment(engine, modal):
+    try:
+        import numpy
+        numpyVersion = numpy.__version__
+    except ImportError:
+        numpyVersion = None
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "numpy": numpyVersion,
+        "generatorVersion": gcodecore.GENERATOR_VERSION,
+        "engine": engine,
+        "modal": modal,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+#############################################################################
+
+def runCase(case, outdir, engine="auto", modal=False, repeat=3, memory=True):
+    params = JobParams(**case["params"])
+    gen = gcodecore.pathGenerator(case["kind"], engine)
+    path = os.path.join(outdir, "case.ngc")
+    def program():
+        chunks = gen(params)
+        return emitModal(chunks) if modal else emitText(chunks)
+    generate = total = float("inf")
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        for tp in gen(params):
+            pass
+        generate = min(generate, time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        nlines, nbytes = gcodeio.writeProgramFile(program(), path)
+        total = min(total, time.perf_counter() - t0)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            gcodeio.writeProgramFile(program(), path)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    os.remove(path)
+    return dict(case, lines=nlines, bytes=nbytes, generateSeconds=generate, seconds=total,
+                linesPerSecond=nlines/total if total else 0.0,
+                bytesPerSecond=nbytes/total if total else 0.0, peakBytes=peak)
+
+def runBench(cases, engine="auto", modal=False, repeat=3, memory=True, progress=None):
+    # -> {"environment": ..., "cases": {id: result}}
+    results = {}
+    t0 = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="gcodebench") as outdir:
+        for case in cases:
+            r = results[case["id"]] = runCase(case, outdir, engine, modal, repeat, memory)
+            if progress:
+                progress(r)
+    return {"environment": environment(engine, modal), "seconds": time.perf_counter() - t0,
+            "cases": results}
+
+def formatCase(r):
+    text = "%-40s %9d lines %10d bytes %8.4fs %10.0f lines/s %6.1f MB/s" % (
+        r["id"], r["lines"], r["bytes"], r["seconds"], r["linesPerSecond"],
+        r["bytesPerSecond"]/1e6)
+    if r["peakBytes"] is not None:
+        text += " peak %7.2f MB" % (r["peakBytes"]/1e6)
+    return text
+
+def engineCase(case, engine, modal=False, repeat=3):
+    # -> (best seconds, lines, sha1) of the program text on one engine
+    params = JobParams(**case["params"])
+    gen = gcodecore.pathGenerator(case["kind"], engine)
+    best = float("inf")
+    for i in range(repeat):
+        h = hashlib.sha1()
+        nlines = 0
+        t0 = time.perf_counter()
+        chunks = gen(params)
+        for text in (emitModal(chunks) if modal else emitText(chunks)):
+            h.update(text.encode("utf-8"))
+            nlines += text.count("\n")
+        best = min(best, time.perf_counter() - t0)
+    return best, nlines, h.hexdigest()
+
+def compareEngines(cases, engines=("scalar", "numpy"), modal=False, repeat=3, progress=None):
+    # -> one row per case: its seconds per engine, the speedup of the last
+    # engine over the first and whether they wrote the same bytes
+    rows = []
+    for case in cases:
+        runs = [engineCase(case, engine, modal, repeat) for engine in engines]
+        seconds = [s for s, n, digest in runs]
+        row = {"id": case["id"], "lines": runs[0][1],
+               "seconds": dict(zip(engines, seconds)),
+               "speedup": seconds[0]/seconds[-1] if seconds[-1] else 0.0,
+               "same": len(set(digest for s, n, digest in runs)) == 1}
+        rows.append(row)
+        if progress:
+            progress(row)
+    return rows
+
+def formatEngines(row):
+    return "%-40s %9d lines %s %7.1fx%s" % (
+        row["id"], row["lines"],
+        " ".join("%s %8.4fs" % (engine, s) for engine, s in row["seconds"].items()),
+        row["speedup"], "" if row["same"] else "  OUTPUT DIFFERS")
+
+#############################################################################
+# comparing runs
+
+def compare(old, new, threshold=THRESHOLD, minSeconds=MINSECONDS):
+    # two runBench() results -> list of findings, (case id, what, old, new)
+    # for every regression, output change or case missing from either
+    out = []
+    limit = 1.0 + threshold/100.0
+    for cid in sorted(set(old["cases"]) | set(new["cases"])):
+        a = old["cases"].get(cid)
+        b = new["cases"].get(cid)
+        if a is None or b is None:
+            out.append((cid, "only in " + ("new" if a is None else "old"), None, None))
+            continue
+        if a["bytes"] != b["bytes"] or a["lines"] != b["lines"]:
+            out.append((cid, "output", a["bytes"], b["bytes"]))
+        if max(a["seconds"], b["seconds"]) >= minSeconds and b["seconds"] > a["seconds"]*limit:
+            out.append((cid, "seconds", a["seconds"], b["seconds"]))
+        if a.get("peakBytes") and b.get("peakBytes") and b["peakBytes"] > a["peakBytes"]*limit:
+            out.append((cid, "peakBytes", a["peakBytes"], b["peakBytes"]))
+    return out
+
+def totals(run):
+    cases = list(run["cases"].values())
+    return {"cases": len(cases), "seconds": sum(c["seconds"] for c in cases),
+            "lines": sum(c["lines"] for c in cases), "bytes": sum(c["bytes"] for c in cases)}
+
+def formatFinding(f):
+    cid, what, a, b = f
+    if a is None:
+        return "%-40s %s" % (cid, what)
+    change = 100.0*(b - a)/a if a else float("inf")
+    if what == "seconds":
+        return "%-40s SLOWER  %0.4fs -> %0.4fs (%+0.1f%%)" % (cid, a, b, change)
+    if what == "peakBytes":
+        return "%-40s MEMORY  %0.2f MB -> %0.2f MB (%+0.1f%%)" % (cid, a/1e6, b/1e6, change)
+    return "%-40s OUTPUT  %d bytes -> %d bytes" % (cid, a, b)
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+def save(run, path):
+    if path in (None, "-"):
+        json.dump(run, sys.stdout, indent=1)
+        sys.stdout.write("\n")
+        return
+    with open(path, "w") as f:
+        json.dump(run, f, indent=1)
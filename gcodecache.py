@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# Content addressed on-disk cache of generated programs
+# Copyright 2017 - Michael T. Mayers
+# Licensed under the GPLV3 - see https://www.gnu.org/licenses/gpl-3.0.html
+#
+# a program is stored under the sha256 of (generator version, kind,
+# JobParams.normalized(), output options), so the same stock / tool /
+# feed comes straight back off disk no matter how the corners were typed
+# in. layout:
+#
+#   <root>/ab/abcdef....ngc    program text
+#   <root>/ab/abcdef....json   meta (lines, bytes, whatever the writer adds)
+#
+# entries are written to a temp file and os.replace()d into place, so
+# concurrent batch workers never see half a program; two workers missing
+# on the same key both generate it and the last rename wins (same bytes).
+# a hit touches the entry's mtime, eviction drops the oldest mtimes
+# first until the cache is under its size cap.
+#
+# the size is kept running per process and root (a worker makes a
+# ProgramCache per job), so a store only lists the cache when the total
+# goes over the cap or the count is RESCAN seconds old (other processes
+# store too). an eviction then goes down to EVICTTO of the cap, the next
+# stores don't each evict one entry. the listing also drops temp files a
+# killed writer left behind, once they are TMPAGE seconds old.
+
+import os, json, time, hashlib, tempfile
+
+import gcodecore, gcodeio
+
+DEFAULT_ROOT = os.path.join(os.path.expanduser("~"), ".cache", "gcodegen")
+DEFAULT_MAXBYTES = 1<<30
+EVICTTO = 0.9
+RESCAN = 60.0
+TMPAGE = 3600.0
+
+# root -> [bytes, time of the listing] in this process
+sizes = {}
+
+#############################################################################
+
+def cacheKey(kind, params, modal=False, decimals=4, comments=False):
+    output = {"modal": bool(modal)}
+    if modal:
+        output.update(decimals=decimals, comments=bool(comments))
+    blob = json.dumps({
+        "version": gcodecore.GENERATOR_VERSION,
+        "kind": kind,
+        "params": params.normalized(),
+        "output": output,
+    }, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+#############################################################################
+
+class ProgramCache(object):
+
+    def __init__(self, root=None, maxBytes=DEFAULT_MAXBYTES):
+        self.root = root or os.environ.get("GCODE_CACHE") or DEFAULT_ROOT
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, key, ext=".ngc"):
+        return os.path.join(self.root, key[:2], key + ext)
+
+    ###################################
+
+    def lookup(self, key):
+        # -> meta dict on a hit (program path under "path"), None on a miss
+        path = self.path(key)
+        try:
+            with open(self.path(key, ".json")) as f:
+                meta = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        meta["path"] = path
+        return meta
+
+    def store(self, key, lines, meta=None):
+        # stream `lines` into the cache, -> meta dict with the program path.
+        # meta may be a callable, called once lines is used up
+        d = os.path.dirname(self.path(key))
+        os.makedirs(d, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=d, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                nlines, nbytes = gcodeio.writeProgram(lines, f)
+            meta = dict((meta() if callable(meta) else meta) or {}, lines=nlines, bytes=nbytes)
+            # program first: a meta file always has its program in place
+            os.replace(tmp, self.path(key))
+            self.atomicWrite(self.path(key, ".json"), json.dumps(meta).encode("utf-8"))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.stores += 1
+        if self.root in sizes:
+            sizes[self.root][0] += nbytes
+        self.evict(keep=key)
+        meta["path"] = self.path(key)
+        return meta
+
+    def atomicWrite(self, path, data):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def fetch(self, key, lines, meta=None):
+        # lookup() or, on a miss, store(lines()). lines is a callable so
+        # nothing is generated on a hit. -> (meta, hit)
+        hit = self.lookup(key)
+        if hit is not None:
+            return hit, True
+        return self.store(key, lines(), meta), False
+
+    ###################################
+
+    def entries(self, tmpAge=None):
+        # (mtime, bytes, key) of every complete entry. with tmpAge, temp
+        # files older than that (seconds) are removed on the way
+        out = []
+        now = time.time()
+        for sub in os.listdir(self.root):
+            d = os.path.join(self.root, sub)
+            if not os.path.isdir(d):
+                continue
+            for name in os.listdir(d):
+                if tmpAge is not None and name.endswith(".tmp"):
+                    try:
+                        if now - os.stat(os.path.join(d, name)).st_mtime > tmpAge:
+                            os.remove(os.path.join(d, name))
+                    except OSError:
+                        pass # renamed into place or removed meanwhile
+                    continue
+                if not name.endswith(".ngc"):
+                    continue
+                try:
+                    st = os.stat(os.path.join(d, name))
+                except OSError:
+                    continue # evicted by another process meanwhile
+                out.append((st.st_mtime, st.st_size, name[:-4]))
+        return out
+
+    def size(self):
+        return sum(e[1] for e in self.entries())
+
+    def evict(self, maxBytes=None, keep=None):
+        # least recently used first until the total fits (never `keep`,
+        # the entry just stored). without maxBytes nothing is listed while
+        # the running size is under the cap
+        cap = self.maxBytes if maxBytes is None else maxBytes
+        if cap is None:
+            return 0
+        now = time.time()
+        known = sizes.get(self.root)
+        if maxBytes is None and known is not None and known[0] <= cap and now - known[1] < RESCAN:
+            return 0
+        entries = self.entries(TMPAGE)
+        total = sum(e[1] for e in entries)
+        target = cap*EVICTTO if maxBytes is None and total > cap else cap
+        removed = 0
+        for mtime, size, key in sorted(entries):
+            if total <= target:
+                break
+            if key == keep:
+                continue
+            self.remove(key)
+            total -= size
+            removed += 1
+        sizes[self.root] = [total, now]
+        self.evictions += removed
+        return removed
+
+    def remove(self, key):
+        # meta first, so lookups miss before the program goes away
+        for ext in (".json", ".ngc"):
+            try:
+                os.remove(self.path(key, ext))
+            except OSError:
+                pass
+
+    def copy(self, meta, dest):
+        # stream a looked up program into a binary file / socket
+        with open(meta["path"], "rb") as f:
+            return gcodeio.writeChunks(gcodeio.readChunks(f), dest)
+
+    def clear(self):
+        for mtime, size, key in self.entries():
+            self.remove(key)
+        sizes.pop(self.root, None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "hitRate": self.hits/float(lookups) if lookups else 0.0,
+        }
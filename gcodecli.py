@@ -0,0 +1,606 @@
+#!/usr/bin/env python3
+# Headless facing / recting generator
+# Copyright 2017 - Michael T. Mayers
+# Licensed under the GPLV3 - see https://www.gnu.org/licenses/gpl-3.0.html
+#
+#  gcodecli.py facing --x2 4 --y2 3 --z1 1 --z2 0.5 --docZ 1/16 -o face.ngc
+#  gcodecli.py recting --cutDir Climb --material "Mild Steel"
+#  gcodecli.py batch order.csv -o out/ -j 8
+#  gcodecli.py fixture plate.csv -o plate.ngc
+#  gcodecli.py parse someone.ngc --estimate
+#  gcodecli.py send /dev/ttyUSB0 face.ngc 10.0.0.7:23 lid.ngc
+#  gcodecli.py facing --x2 4 --y2 3 --send /dev/ttyACM0
+#  gcodecli.py serve --port 8017 -j 4
+#  gcodecli.py bench --quick -o today.json
+#  gcodecli.py bench --compare before.json today.json
+#  gcodecli.py bench --quick --engines
+#  gcodecli.py facing --x2 24 --y2 24 -o face.ngc.xz --level 9 --pack face.gcpk
+#  gcodecli.py unpack face.gcpk -o face.ngc
+#
+# never imports PyQt5
+
+import os, sys, csv, json, time, argparse
+
+import gcodecore, gcodeio, gcodecache, cycletime
+from gcodecore import JobParams, number, sfmtable, CUTDIRS, LAYERMODES, STRATEGIES
+from gcodeemit import emitText, emitModal
+from toolpath import Toolpath
+
+#############################################################################
+
+def addJobArgs(parser):
+    D = JobParams.defaults
+    for k in ("x1","x2","y1","y2","z1","z2","safeZ","docZ","feedRate","toolDiam"):
+        parser.add_argument("--"+k, type=number, default=D[k], metavar="N",
+                            help="(default %g)" % D[k])
+    parser.add_argument("--docXY", type=number, default=None, metavar="N",
+                        help="radial DOC (default toolDiam*0.25)")
+    parser.add_argument("--flutes", type=int, default=D["flutes"], metavar="N")
+    parser.add_argument("--cutDir", choices=CUTDIRS, default=D["cutDir"])
+    parser.add_argument("--material", choices=list(sfmtable), default=D["material"], metavar="NAME")
+    parser.add_argument("--resolution", type=number, default=None, metavar="N",
+                        help="build the toolpath on an integer grid of N (power of ten, e.g. 1e-4)")
+    parser.add_argument("--strategy", choices=STRATEGIES, default=D["strategy"],
+                        help="facing: concentric rings with hops, or one continuous spiral")
+    parser.add_argument("--layerMode", choices=LAYERMODES, default=D["layerMode"],
+                        help="write every Z layer out, or the layer once as an o-word sub / while loop")
+
+def jobParams(args):
+    d = {k: getattr(args, k) for k in JobParams.defaults}
+    if d["docXY"] is None:
+        d["docXY"] = d["toolDiam"]*0.25
+    return JobParams(**d)
+
+#############################################################################
+
+def cmdGenerate(args):
+    params = jobParams(args)
+    if args.speeds:
+        S = gcodecore.speeds(params)
+        sys.stdout.write("sfm %d\nrpm %d\nipt %g ... %g\nipm %0.1f ... %0.1f\n"
+                         "mrr %0.1f ... %0.1f\nuhp %f\nhp  %0.3f ... %0.3f\n"
+                         % ((S["sfm"], S["rpm"]) + S["ipt"] + S["ipm"] + S["mrr"]
+                            + (S["uhp"],) + S["hpr"]))
+        return 0
+    est = None
+    if args.estimate:
+        est = cycletime.Estimator(**motionArgs(args))
+    # an expanded program is estimated as it is written, o-word ones
+    # (the layer written once) from the expanded path afterwards
+    walk = est is not None and params.layerMode != "expand"
+    tap = None if walk else est
+    prof = None
+    if args.profile:
+        import gcodeprof
+        prof = gcodeprof.Profiler(args.deep)
+        prof.count("layers", len(gcodecore.Grid(params).layerZs()))
+        prof.start()
+    if args.send:
+        # straight from the generator to the controller, no file
+        import gcodednc
+        r = gcodednc.sendAll([(args.send, programText(args, params, tap, prof))], **dncArgs(args))[0]
+        sys.stderr.write(gcodednc.formatReport(r) + "\n")
+        if "failed" in r:
+            return 1
+        nlines, nbytes = r["lines"], r["bytes"]
+    elif args.cache is not None and not args.toolpath and not args.pack:
+        cache = gcodecache.ProgramCache(args.cache or None, cacheBytes(args))
+        key = gcodecache.cacheKey(args.kind, params, args.modal, args.decimals, args.comments)
+        meta, hit = cache.fetch(key, lambda: programText(args, params, tap, prof))
+        try:
+            copyCached(cache, meta, args)
+        except FileNotFoundError:
+            # evicted by another process between lookup and copy
+            if tap is not None:
+                est = tap = cycletime.Estimator(**motionArgs(args))
+            meta, hit = cache.store(key, programText(args, params, tap, prof)), False
+            copyCached(cache, meta, args)
+        walk = walk or (est is not None and hit)
+        sys.stderr.write("cache %s %s\n" % ("hit" if hit else "miss", key[:16]))
+        nlines, nbytes = meta["lines"], meta["bytes"]
+    else:
+        nlines, nbytes = writeOutput(programText(args, params, tap, prof), args.output, prof,
+                                     args.level)
+    if prof is not None:
+        prof.stop()
+        prof.count("lines", nlines)
+        prof.count("bytes", nbytes)
+        saveProfile(prof, args.profile)
+    if walk:
+        for tp in gcodecore.machinePath(args.kind, args.engine)(params):
+            est.add(tp)
+    if args.simulate:
+        import gcodesim
+        report = gcodesim.simulate(params, gcodecore.machinePath(args.kind, args.engine)(params))
+        sys.stderr.write("%s (%d x %d cells of %0.4f in, %0.2fs)\n" % (
+            gcodesim.formatReport(report), report["nx"], report["ny"],
+            report["cell"], report["seconds"]))
+        for island in report["islands"][:10]:
+            sys.stderr.write("  uncut %0.4f in\N{SUPERSCRIPT TWO} in X %0.4f..%0.4f Y %0.4f..%0.4f\n" % (
+                (island["area"],) + island["x"] + island["y"]))
+    if est is not None:
+        sys.stderr.write("%d lines, %d bytes, feed %0.1f in, rapid %0.1f in, cycle time %s\n" % (
+            nlines, nbytes, est.feedLength, est.rapidLength, cycletime.formatMinutes(est.minutes)))
+        if args.kind == "facing":
+            S = cycletime.strategySaving(params, **motionArgs(args))
+            sys.stderr.write("rings %s, spiral %s: the spiral saves %s (%0.1f%%)\n" % (
+                cycletime.formatMinutes(S["rings"]), cycletime.formatMinutes(S["spiral"]),
+                cycletime.formatMinutes(S["saved"]), S["percent"]))
+    return 0
+
+def programText(args, params, est=None, prof=None):
+    chunks = gcodecore.pathGenerator(args.kind, args.engine)(params)
+    if prof is not None:
+        chunks = prof.tally(prof.wrap("geometry", chunks))
+    if est is not None:
+        chunks = est.tap(chunks)
+        if prof is not None:
+            chunks = prof.wrap("estimate", chunks)
+    if args.pack:
+        import gcodepack
+        chunks = gcodepack.packing(chunks, args.pack)
+        if prof is not None:
+            chunks = prof.wrap("pack", chunks)
+    if args.toolpath:
+        tp = Toolpath.concat(chunks)
+        tp.save(args.toolpath)
+        chunks = [tp]
+    if args.modal:
+        lines = emitModal(chunks, args.decimals, args.comments)
+    else:
+        lines = emitText(chunks)
+    return lines if prof is None else prof.wrap("format", lines)
+
+def writeOutput(lines, path, prof=None, level=None):
+    if prof is None:
+        return gcodeio.writeProgramFile(lines, path, level=level)
+    import gcodeprof
+    return gcodeprof.writeProgramFile(lines, path, prof, level)
+
+def saveProfile(prof, path):
+    # JSON report to path, the summary to stderr
+    import gcodeprof
+    report = prof.report()
+    sys.stderr.write(gcodeprof.formatReport(report) + "\n")
+    if path != "-":
+        with open(path, "w") as f:
+            json.dump(report, f, indent=1)
+
+def axes(text):
+    # "20" or "20,20,5" (X,Y,Z)
+    values = [number(v) for v in text.split(",")]
+    if len(values) not in (1, 3):
+        raise argparse.ArgumentTypeError("give one value or X,Y,Z")
+    return values[0] if len(values) == 1 else tuple(values)
+
+def addMotionArgs(parser):
+    parser.add_argument("--rapidRate", type=number, default=cycletime.RAPIDRATE, metavar="N",
+                        help="G00 speed for the cycle time estimate (default %g in/min)" % cycletime.RAPIDRATE)
+    parser.add_argument("--accel", type=axes, default=None, metavar="A[,Ay,Az]",
+                        help="axis acceleration in/s^2 for the estimate (default: none, constant speed)")
+    parser.add_argument("--jerk", type=axes, default=None, metavar="J[,Jy,Jz]",
+                        help="axis jerk in/s^3, S curve moves (needs --accel)")
+
+def motionArgs(args):
+    if args.jerk is not None and args.accel is None:
+        raise ValueError("--jerk needs --accel")
+    return {"rapidRate": args.rapidRate, "accel": args.accel, "jerk": args.jerk}
+
+def copyCached(cache, meta, args):
+    if args.output in (None, "-"):
+        cache.copy(meta, sys.stdout.buffer)
+    else:
+        with gcodeio.openOutput(args.output, args.level) as f:
+            cache.copy(meta, f)
+
+def cacheBytes(args):
+    return int(args.cacheSize*(1<<20)) if args.cacheSize else None
+
+def addCacheArgs(parser):
+    parser.add_argument("--cache", nargs="?", const="", default=None, metavar="DIR",
+                        help="reuse / keep programs in an on-disk cache "
+                             "(default dir $GCODE_CACHE or %s)" % gcodecache.DEFAULT_ROOT)
+    parser.add_argument("--cacheSize", type=number, default=gcodecache.DEFAULT_MAXBYTES>>20,
+                        metavar="MB", help="evict least recently used programs above this "
+                                           "(default %d, 0 = no limit)" % (gcodecache.DEFAULT_MAXBYTES>>20))
+
+def cmdBatch(args):
+    import gcodebatch
+    jobs = gcodebatch.readManifest(args.manifest)
+    def progress(r):
+        if not args.quiet:
+            sys.stdout.write(gcodebatch.formatResult(r) + "\n")
+            sys.stdout.flush()
+    t0 = time.perf_counter()
+    cache = None
+    if args.cache is not None:
+        cache = (args.cache or None, cacheBytes(args))
+    results = gcodebatch.runBatch(jobs, args.outdir, args.workers, args.engine,
+                                  motionArgs(args), progress, cache)
+    summary = gcodebatch.summarize(results, time.perf_counter() - t0)
+    with open(os.path.join(args.outdir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=1)
+    sys.stdout.write(gcodebatch.formatTotal(summary["total"]) + "\n")
+    return 0
+
+def cmdFixture(args):
+    import gcodebatch, gcodefixture
+    parts = gcodefixture.partsFromJobs(gcodebatch.readManifest(args.manifest), args.engine)
+    if not parts:
+        raise ValueError("no parts in %s" % args.manifest)
+    order = None
+    if not args.keepOrder:
+        order, report = gcodefixture.planOrder(parts)
+    chunks = gcodefixture.fixturePath(parts, order, args.safeZ)
+    if args.modal:
+        lines = emitModal(chunks, args.decimals, args.comments)
+    else:
+        lines = emitText(chunks)
+    nlines, nbytes = gcodeio.writeProgramFile(lines, args.output, level=args.level)
+    sys.stderr.write("%d parts, %d lines, %d bytes\n" % (len(parts), nlines, nbytes))
+    if order is not None:
+        sys.stderr.write("rapids between parts: %0.1f in as listed, %0.1f in planned, "
+                         "%0.1f in saved (%0.1f%%), planned in %0.3fs\n" % (
+            report["rapidGiven"], report["rapidPlanned"], report["rapidSaved"],
+            report["percent"], report["seconds"]))
+    return 0
+
+def cmdUnpack(args):
+    import gcodepack
+    pack = gcodepack.Pack(args.pack)
+    try:
+        chunks = pack.chunks()
+        if args.modal:
+            lines = emitModal(chunks, args.decimals, args.comments)
+        else:
+            lines = emitText(chunks)
+        nlines, nbytes = gcodeio.writeProgramFile(lines, args.output, level=args.level)
+    finally:
+        pack.close()
+    sys.stderr.write("%d chunks, %d segments, %d lines, %d bytes\n" % (
+        len(pack), pack.segments, nlines, nbytes))
+    return 0
+
+def cmdParse(args):
+    import gcodeparse
+    if args.program == "-":
+        parser = gcodeparse.parseBytes(sys.stdin.buffer.read())
+    else:
+        parser = gcodeparse.parseFile(args.program)
+    tp = parser.toolpath()
+    S = parser.stats()
+    sys.stdout.write("%d lines, %d segments, %d arcs (as chords), %d bad words, "
+                     "%0.3fs (%0.1f MB/s)\n" % (S["lines"], S["segments"], S["arcs"],
+                                               S["badWords"], S["seconds"], S["mbps"]))
+    if args.toolpath:
+        tp.save(args.toolpath)
+    if args.estimate:
+        E = cycletime.estimate([tp], **motionArgs(args))
+        sys.stdout.write("feed %0.1f in, rapid %0.1f in, cycle time %s\n" % (
+            E["feedLength"], E["rapidLength"], cycletime.formatMinutes(E["minutes"])))
+    return 0
+
+def addDncArgs(parser):
+    parser.add_argument("--rx", type=int, default=gcodecore.RXBUFFER, metavar="N",
+                        help="controller receive buffer bytes (default %d, grbl)" % gcodecore.RXBUFFER)
+    parser.add_argument("--baud", type=int, default=gcodecore.BAUD, metavar="N",
+                        help="serial ports (default %d)" % gcodecore.BAUD)
+    parser.add_argument("--keepComments", action="store_true",
+                        help="send comments and blank lines too")
+    parser.add_argument("--settle", type=number, default=0.0, metavar="S",
+                        help="wait after connecting, e.g. 2 for a grbl resetting on open")
+    parser.add_argument("--timeout", type=number, default=None, metavar="S",
+                        help="give up when a line isn't acknowledged in S seconds")
+    parser.add_argument("--underrun", type=number, default=gcodecore.UNDERRUN, metavar="S",
+                        help="count the receive buffer sitting empty longer than S "
+                             "as an underrun (default %g)" % gcodecore.UNDERRUN)
+
+def dncArgs(args):
+    return {"rxBuffer": args.rx, "baud": args.baud, "strip": not args.keepComments,
+            "settle": args.settle, "timeout": args.timeout, "underrun": args.underrun}
+
+def cmdSend(args):
+    import gcodednc
+    if len(args.pairs) % 2:
+        raise ValueError("give TARGET PROGRAM pairs")
+    jobs = [(target, gcodednc.fileBlocks(path))
+            for target, path in zip(args.pairs[0::2], args.pairs[1::2])]
+    reports = gcodednc.sendAll(jobs, **dncArgs(args))
+    for r in reports:
+        sys.stderr.write(gcodednc.formatReport(r) + "\n")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(reports, f, indent=1)
+    return 1 if any("failed" in r or r["errors"] for r in reports) else 0
+
+def cmdFakeCnc(args):
+    import asyncio, gcodednc
+    fake = gcodednc.FakeController(args.rx, args.planner, args.lineTime)
+    async def serve():
+        if args.pty:
+            task, path = await fake.servePty()
+            sys.stderr.write("stand-in controller on %s\n" % path)
+            await task
+        else:
+            server, where = await fake.serveTcp(args.host, args.port)
+            sys.stderr.write("stand-in controller on %s\n" % where)
+            await server.serve_forever()
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.close()
+    for s in fake.sessions:
+        sys.stderr.write("%d lines, %d bytes, %d underruns (%0.3fs), %d overflows\n" % (
+            s["lines"], s["bytes"], s["underruns"], s["starved"], s["overflows"]))
+    return 0
+
+def cmdServe(args):
+    import asyncio, gcodeserve
+    async def serve():
+        service = gcodeserve.Service(args.workers, args.cache, cacheBytes(args),
+                                     args.maxQueued, args.engine, args.timeout)
+        port = await service.start(args.port)
+        sys.stderr.write("serving on http://%s:%d/ (%d workers, cache %s)\n" % (
+            gcodeserve.HOST, port, service.workers, service.cache.root))
+        try:
+            await service.server.serve_forever()
+        finally:
+            await service.close()
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+def cmdBench(args):
+    import gcodebench
+    if args.compare:
+        old, new = [gcodebench.load(path) for path in args.compare]
+        findings = gcodebench.compare(old, new, args.threshold, args.minSeconds)
+        for f in findings:
+            sys.stdout.write(gcodebench.formatFinding(f) + "\n")
+        a, b = gcodebench.totals(old), gcodebench.totals(new)
+        sys.stdout.write("%d cases, %0.2fs -> %0.2fs total, %d findings\n" % (
+            b["cases"], a["seconds"], b["seconds"], len(findings)))
+        return 1 if findings else 0
+    axes = dict(gcodebench.QUICK) if args.quick else {}
+    for name in ("plates", "docXYs", "docZs"):
+        if getattr(args, name):
+            axes[name] = getattr(args, name)
+    if args.cutDir:
+        axes["cutDirs"] = args.cutDir
+    cases = gcodebench.matrix(args.kind, **axes)
+    if args.engines:
+        rows = gcodebench.compareEngines(cases, modal=args.modal, repeat=args.repeat)
+        for row in rows:
+            sys.stdout.write(gcodebench.formatEngines(row) + "\n")
+        differ = sum(1 for row in rows if not row["same"])
+        sys.stdout.write("%d cases, %d with different output\n" % (len(rows), differ))
+        return 1 if differ else 0
+    def progress(r):
+        if not args.quiet:
+            sys.stderr.write(gcodebench.formatCase(r) + "\n")
+    run = gcodebench.runBench(cases, args.engine, args.modal, args.repeat, not args.noMemory,
+                              progress)
+    gcodebench.save(run, args.output)
+    t = gcodebench.totals(run)
+    sys.stderr.write("%d cases, %d lines, %d bytes, %0.2fs (%0.1fs with repeats)\n" % (
+        t["cases"], t["lines"], t["bytes"], t["seconds"], run["seconds"]))
+    return 0
+
+def docZText(text):
+    if text not in dict(gcodecore.DOCZ_CHOICES):
+        raise argparse.ArgumentTypeError("one of %s" % ", ".join(t for t, v in gcodecore.DOCZ_CHOICES))
+    return text
+
+def cmdOptimize(args):
+    import gcodespeeds
+    machine = gcodespeeds.MachineProfile(maxHP=args.maxHP, maxRPM=args.maxRPM,
+                                         minRPM=args.minRPM, maxFeed=args.maxFeed)
+    sweep = gcodespeeds.Sweep(machine, args.material or None,
+                              args.toolDiam or gcodespeeds.TOOLDIAMS,
+                              args.flutes or gcodespeeds.FLUTES,
+                              args.docXY or None)
+    best = sweep.best(args.top)
+    sys.stdout.write("%-20s %7s %6s %7s %7s %8s %7s %8s %7s %6s\n" % (
+        "material", "tool", "flutes", "docXY", "docZ", "feed", "rpm", "ipt", "mrr", "hp"))
+    for c in best:
+        sys.stdout.write("%-20s %7g %6d %7.4f %7.4f %8.2f %7d %8.5f %7.3f %6.3f\n" % (
+            c["material"], c["toolDiam"], c["flutes"], c["docXY"], c["docZ"],
+            c["feedRate"], c["rpm"], c["ipt"], c["mrr"], c["hp"]))
+    if args.manifest:
+        # the candidates on the given stock, as a gcodebatch manifest
+        base = {k: getattr(args, k) for k in ("x1","x2","y1","y2","z1","z2","safeZ")}
+        keys = ("kind", "name") + tuple(base) + gcodespeeds.PARAM_KEYS
+        with open(args.manifest, "w", newline="") as f:
+            w = csv.DictWriter(f, keys)
+            w.writeheader()
+            for i, c in enumerate(best):
+                row = dict(base, kind=args.kind, name="rank%d" % (i+1))
+                row.update((k, c[k]) for k in gcodespeeds.PARAM_KEYS)
+                w.writerow(row)
+    return 0
+
+#############################################################################
+
+def addLevelArg(parser):
+    parser.add_argument("--level", type=int, default=None, choices=range(10), metavar="0-9",
+                        help="compression level of .gz / .xz output (default gzip 9, xz 6)")
+
+def makeParser():
+    parser = argparse.ArgumentParser(description="headless facing / recting gcode generator")
+    sub = parser.add_subparsers(dest="command")
+    sub.required = True
+    for kind in gcodecore.generators:
+        p = sub.add_parser(kind, help="generate a %s program" % kind)
+        addJobArgs(p)
+        p.add_argument("-o", "--output", default=None,
+                       help="output .ngc path, .ngc.gz / .ngc.xz compressed (default stdout)")
+        addLevelArg(p)
+        p.add_argument("--speeds", action="store_true", help="print feeds and speeds instead of gcode")
+        p.add_argument("--toolpath", default=None, metavar="PATH",
+                       help="also save the toolpath arrays (Toolpath.load() reads them back)")
+        p.add_argument("--pack", default=None, metavar="PATH",
+                       help="also save the program as a packed toolpath (.gcpk, see gcodepack.py)")
+        p.add_argument("--modal", action="store_true",
+                       help="size optimized output: only changed words, fixed decimals")
+        p.add_argument("--decimals", type=int, default=4, metavar="N",
+                       help="--modal number precision (default 4, G20 inches)")
+        p.add_argument("--comments", action="store_true", help="keep move comments with --modal")
+        p.add_argument("--engine", choices=gcodecore.ENGINES, default="auto",
+                       help="toolpath engine, numpy needs numpy (default auto)")
+        addCacheArgs(p)
+        p.add_argument("--estimate", action="store_true",
+                       help="print lines, bytes and the cycle time estimate to stderr")
+        addMotionArgs(p)
+        p.add_argument("--simulate", action="store_true",
+                       help="check the face is cleared to z2 on a heightmap (numpy), report to stderr")
+        p.add_argument("--profile", default=None, metavar="PATH",
+                       help="time the pipeline stages, JSON report to PATH (- = summary only)")
+        p.add_argument("--deep", action="store_true",
+                       help="--profile with cProfile and tracemalloc (slower)")
+        p.add_argument("--send", default=None, metavar="TARGET",
+                       help="stream the program to a controller (host:port or serial device) "
+                            "instead of writing it")
+        addDncArgs(p)
+        p.set_defaults(func=cmdGenerate, kind=kind)
+    p = sub.add_parser("optimize", help="rank materials / tools / DOCs by MRR for a machine (numpy)")
+    p.add_argument("--maxHP", type=number, default=1.5, metavar="N", help="spindle HP (default 1.5)")
+    p.add_argument("--maxRPM", type=number, default=10000, metavar="N", help="(default 10000)")
+    p.add_argument("--minRPM", type=number, default=0, metavar="N", help="(default 0)")
+    p.add_argument("--maxFeed", type=number, default=100, metavar="N", help="in/min (default 100)")
+    p.add_argument("--material", action="append", choices=list(sfmtable), metavar="NAME",
+                   help="only this material (repeatable, default all)")
+    p.add_argument("--toolDiam", type=number, nargs="+", metavar="N", help="tool diameters to try")
+    p.add_argument("--flutes", type=int, nargs="+", metavar="N", help="flute counts to try")
+    p.add_argument("--docXY", type=number, nargs="+", metavar="N",
+                   help="radial DOCs to try (default fractions of each tool)")
+    p.add_argument("--top", type=int, default=10, metavar="N", help="candidates to list (default 10)")
+    p.add_argument("--manifest", default=None, metavar="PATH",
+                   help="also write the candidates as a batch manifest (.csv) on this stock")
+    p.add_argument("--kind", choices=list(gcodecore.generators), default="facing",
+                   help="generator for --manifest rows")
+    D = JobParams.defaults
+    for k in ("x1","x2","y1","y2","z1","z2","safeZ"):
+        p.add_argument("--"+k, type=number, default=D[k], metavar="N", help="stock for --manifest")
+    p.set_defaults(func=cmdOptimize)
+    p = sub.add_parser("batch", help="generate every job of a CSV / JSON manifest")
+    p.add_argument("manifest", help="jobs .csv or .json (see gcodebatch.py)")
+    p.add_argument("-o", "--outdir", default=".", help="output directory (default .)")
+    p.add_argument("-j", "--workers", type=int, default=None, metavar="N",
+                   help="worker processes (default one per cpu, 1 = no pool)")
+    p.add_argument("--engine", choices=gcodecore.ENGINES, default="auto")
+    addMotionArgs(p)
+    p.add_argument("-q", "--quiet", action="store_true", help="only print the totals")
+    addCacheArgs(p)
+    p.set_defaults(func=cmdBatch)
+    p = sub.add_parser("fixture", help="one program cutting every part of a manifest, "
+                                       "in a short rapid travel order")
+    p.add_argument("manifest", help="parts .csv or .json, one row per part (see gcodebatch.py)")
+    p.add_argument("-o", "--output", default=None,
+                   help="output .ngc path, .ngc.gz / .ngc.xz compressed (default stdout)")
+    addLevelArg(p)
+    p.add_argument("--safeZ", type=number, default=None, metavar="N",
+                   help="clearance between parts (default the highest part safeZ)")
+    p.add_argument("--keepOrder", action="store_true", help="cut the parts in manifest order")
+    p.add_argument("--modal", action="store_true",
+                   help="size optimized output: only changed words, fixed decimals")
+    p.add_argument("--decimals", type=int, default=4, metavar="N")
+    p.add_argument("--comments", action="store_true", help="keep move comments with --modal")
+    p.add_argument("--engine", choices=gcodecore.ENGINES, default="auto")
+    p.set_defaults(func=cmdFixture)
+    p = sub.add_parser("unpack", help="write a packed toolpath (.gcpk) out as gcode")
+    p.add_argument("pack", help=".gcpk file (facing / recting --pack)")
+    p.add_argument("-o", "--output", default=None,
+                   help="output .ngc path, .ngc.gz / .ngc.xz compressed (default stdout)")
+    addLevelArg(p)
+    p.add_argument("--modal", action="store_true",
+                   help="size optimized output: only changed words, fixed decimals")
+    p.add_argument("--decimals", type=int, default=4, metavar="N")
+    p.add_argument("--comments", action="store_true", help="keep move comments with --modal")
+    p.set_defaults(func=cmdUnpack)
+    p = sub.add_parser("parse", help="read a .ngc back into toolpath arrays (numpy)")
+    p.add_argument("program", help=".ngc file, any generator's (- for stdin)")
+    p.add_argument("--toolpath", default=None, metavar="PATH",
+                   help="save the toolpath arrays (Toolpath.load() reads them back)")
+    p.add_argument("--estimate", action="store_true", help="print the cycle time estimate")
+    addMotionArgs(p)
+    p.set_defaults(func=cmdParse)
+    p = sub.add_parser("send", help="stream programs to controllers, several at once")
+    p.add_argument("pairs", nargs="+", metavar="TARGET PROGRAM",
+                   help="host:port or serial device, and the .ngc to stream to it")
+    addDncArgs(p)
+    p.add_argument("--report", default=None, metavar="PATH", help="save the reports as JSON")
+    p.set_defaults(func=cmdSend)
+    p = sub.add_parser("bench", help="time generation / text / file write over a job matrix, "
+                                     "or compare two runs")
+    p.add_argument("-o", "--output", default=None, help="results .json (default stdout)")
+    p.add_argument("--quick", action="store_true", help="only the corners of the matrix")
+    p.add_argument("--kind", action="append", choices=list(gcodecore.generators),
+                   help="only this generator (repeatable, default all)")
+    p.add_argument("--plates", type=number, nargs="+", metavar="IN",
+                   help="square plate sizes (default 1 2 4 8 12 24 48)")
+    p.add_argument("--docXYs", type=number, nargs="+", metavar="N",
+                   help="radial DOCs (default 0.25 ... 0.005)")
+    p.add_argument("--docZs", type=docZText, nargs="+", metavar="1/N",
+                   help="axial DOCs from the docZ choices (default all)")
+    p.add_argument("--cutDir", action="append", choices=CUTDIRS, help="(default both)")
+    p.add_argument("--repeat", type=int, default=3, metavar="N", help="best of N (default 3)")
+    p.add_argument("--noMemory", action="store_true", help="skip the tracemalloc peak run")
+    p.add_argument("--engine", choices=gcodecore.ENGINES, default="auto")
+    p.add_argument("--engines", action="store_true",
+                   help="time the scalar against the numpy engine, exit 1 if their output differs")
+    p.add_argument("--modal", action="store_true", help="time the modal writer instead")
+    p.add_argument("-q", "--quiet", action="store_true")
+    p.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                   help="compare two result files, exit 1 on regressions")
+    p.add_argument("--threshold", type=number, default=10.0, metavar="PCT",
+                   help="slower / bigger than this counts (default 10%%)")
+    p.add_argument("--minSeconds", type=number, default=0.01, metavar="S",
+                   help="ignore timing of cases faster than this (default 0.01)")
+    p.set_defaults(func=cmdBench)
+    p = sub.add_parser("serve", help="generate programs for HTTP requests on localhost")
+    p.add_argument("--port", type=int, default=gcodecore.PORT, help="(default %d)" % gcodecore.PORT)
+    p.add_argument("-j", "--workers", type=int, default=None, metavar="N",
+                   help="worker processes (default one per cpu)")
+    p.add_argument("--maxQueued", type=int, default=None, metavar="N",
+                   help="programs being made at once before requests get 503 "
+                        "(default 4 per worker)")
+    p.add_argument("--cache", default=None, metavar="DIR",
+                   help="program cache (default $GCODE_CACHE or %s)" % gcodecache.DEFAULT_ROOT)
+    p.add_argument("--cacheSize", type=number, default=gcodecache.DEFAULT_MAXBYTES>>20,
+                   metavar="MB", help="(default %d, 0 = no limit)" % (gcodecache.DEFAULT_MAXBYTES>>20))
+    p.add_argument("--engine", choices=gcodecore.ENGINES, default="auto")
+    p.add_argument("--timeout", type=number, default=gcodecore.GENTIMEOUT, metavar="S",
+                   help="give up on a program not made in S seconds, 504 (default %g, 0 = never)"
+                        % gcodecore.GENTIMEOUT)
+    p.set_defaults(func=cmdServe)
+    p = sub.add_parser("fakecnc", help="stand-in controller to stream to (tests, dry runs)")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=0, help="(default any free one)")
+    p.add_argument("--pty", action="store_true", help="serve on a pty instead of TCP")
+    p.add_argument("--rx", type=int, default=gcodecore.RXBUFFER, metavar="N",
+                   help="receive buffer bytes (default %d)" % gcodecore.RXBUFFER)
+    p.add_argument("--planner", type=int, default=gcodecore.PLANNER, metavar="N",
+                   help="planner blocks (default %d)" % gcodecore.PLANNER)
+    p.add_argument("--lineTime", type=number, default=gcodecore.LINETIME, metavar="S",
+                   help="seconds each block runs (default %g)" % gcodecore.LINETIME)
+    p.set_defaults(func=cmdFakeCnc)
+    return parser
+
+def main(argv=None):
+    args = makeParser().parse_args(argv)
+    try:
+        return args.func(args)
+    except ValueError as e:
+        sys.stderr.write("%s: error: %s\n" % (os.path.basename(sys.argv[0]), e))
+        return 2
+    except BrokenPipeError:
+        # reader went away (| head), keep the interpreter from complaining on exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,584 @@
+#!/usr/bin/env python3
+# Toolpath engine shared by the facing and recting generators (no Qt)
+# Copyright 2017 - Michael T. Mayers
+# Licensed under the GPLV3 - see https://www.gnu.org/licenses/gpl-3.0.html
+
+import math
+from fractions import Fraction
+
+from toolpath import Toolpath, NAN, UNSET, formatFixed, ROLE_SAFEZ, ROLE_START, ROLE_RESTART, ROLE_PLUNGE, ROLE_HOP
+from gcodeemit import emitText
+
+#############################################################################
+
+def frange(start, stop, step):
+    i = 0
+    while start + i * step <= stop:
+        yield start + i * step
+        i += 1
+def invfrange(start, stop, step):
+    i = 0
+    while start + i * step >= stop:
+        yield start + i * step
+        i += 1
+
+#############################################################################
+
+sfmtable = { # mtl, sfm
+    "Aluminum, 7075": { "sfm": 300, "uhp": .25, "intooth": { "min": 0.005, "max": 0.01 } },
+    "Aluminum, 6061": { "sfm": 280, "uhp": .25, "intooth": { "min": 0.005, "max": 0.01 } },
+    "Aluminum, 2024": { "sfm": 200, "uhp": .25, "intooth": { "min": 0.005, "max": 0.01 } },
+    "Aluminum, Cast": { "sfm": 134, "uhp": .25, "intooth": { "min": 0.005, "max": 0.01 } },
+    "Brass": { "sfm": 400, "uhp": .25, "intooth": { "min": 0.005, "max": 0.01 } },
+    "Bronze": { "sfm": 150, "uhp": .25, "intooth": { "min": 0.005, "max": 0.01 } },
+    "Copper": { "sfm": 100, "uhp": .25, "intooth": { "min": 0.005, "max": 0.01 } },
+    "Cast Iron (soft)": { "uhp": .25, "sfm": 80, "intooth": { "min": 0.005, "max": 0.01 } },
+    "Cast Iron (hard)": { "uhp": .25, "sfm": 50, "intooth": { "min": 0.005, "max": 0.01 } },
+    "Copper": { "sfm": 100, "uhp": .25, "intooth": { "min": 0.005, "max": 0.01 } },
+    "Mild Steel": { "sfm": 90, "uhp": 1.4, "intooth": { "min": 0.005, "max": 0.01 } },
+    "Cast Steel": { "sfm": 80, "uhp": 2.5, "intooth": { "min": 0.005, "max": 0.01 } },
+    "Alloy Steels (hard)": { "sfm": 40, "uhp": 2.5, "intooth": { "min": 0.005, "max": 0.01 } },
+    "Tool Steel": { "sfm": 50, "uhp": 2.5, "intooth": { "min": 0.005, "max": 0.01 } },
+    "Stainless Steel": { "sfm": 60, "uhp": 2.5, "intooth": { "min": 0.005, "max": 0.01 } },
+}
+
+# axial DOC choices offered by the windows
+DOCZ_CHOICES = (
+    ("1/8", 1.0/8.0),
+    ("1/10", 1.0/10.0),
+    ("1/16", 1.0/16.0),
+    ("1/25", 1.0/25.0),
+    ("1/32", 1.0/32.0),
+    ("1/50", 1.0/50.0),
+    ("1/64", 1.0/64.0),
+    ("1/100", 1.0/100.0),
+)
+
+def number(text):
+    # accepts the docZ combo box spellings too ("1/16")
+    return float(Fraction(text)) if "/" in text else float(text)
+
+CUTDIRS = ("Climb", "Conventional")
+LAYERMODES = ("expand", "sub", "loop")
+STRATEGIES = ("rings", "spiral")  # facing: concentric rings + hops, or one spiral
+
+# bump whenever the text generated for some parameter set changes, or
+# what is cached with it (the cycle time), it is part of the gcodecache key
+GENERATOR_VERSION = 2
+
+# defaults of the streamer (gcodednc) and the HTTP service (gcodeserve),
+# kept here so the CLI can show them without importing either
+RXBUFFER = 128      # bytes, grbl's serial receive buffer
+BAUD = 115200
+PLANNER = 16        # blocks queued by the stand-in controller
+LINETIME = 0.002    # s per block run by the stand-in controller
+UNDERRUN = 0.001    # s the receive buffer has to sit empty to count
+PORT = 8017
+GENTIMEOUT = 120.0  # s to make one program
+
+#############################################################################
+# plain parameter object, attribute names match the generator windows
+#############################################################################
+
+class JobParams(object):
+
+    defaults = {
+        "x1": 0.0,
+        "x2": 1.0,
+        "y1": 0.0,
+        "y2": 1.0,
+        "z1": 1.0,
+        "z2": 1.0,
+        "safeZ": 2.0,
+        "docXY": 0.25*0.25,
+        "docZ": 1/16.0,
+        "feedRate": 6.0,
+        "toolDiam": 0.25,
+        "flutes": 2,
+        "cutDir": "Conventional",
+        "material": "Aluminum, 7075",
+        "layerMode": "expand",
+        "strategy": "rings",
+        "resolution": None,
+    }
+
+    def __init__(self, **kwargs):
+        for k in self.defaults:
+            setattr(self, k, kwargs.pop(k, self.defaults[k]))
+        if kwargs:
+            raise TypeError("unknown job parameter(s): %s" % ", ".join(sorted(kwargs)))
+        if self.cutDir not in CUTDIRS:
+            raise ValueError("cutDir must be one of %s, not <%s>" % (CUTDIRS, self.cutDir))
+        if self.layerMode not in LAYERMODES:
+            raise ValueError("layerMode must be one of %s, not <%s>" % (LAYERMODES, self.layerMode))
+        if self.strategy not in STRATEGIES:
+            raise ValueError("strategy must be one of %s, not <%s>" % (STRATEGIES, self.strategy))
+        # the layer / ring loops step by these, zero or less never ends
+        for k in ("docXY", "docZ", "feedRate"):
+            if not getattr(self, k) > 0:
+                raise ValueError("%s must be > 0, not <%s>" % (k, getattr(self, k)))
+        gridDecimals(self.resolution)
+
+    @classmethod
+    def fromObject(cls, obj):
+        return cls(**{k: getattr(obj, k) for k in cls.defaults if hasattr(obj, k)})
+
+    def asdict(self):
+        return {k: getattr(self, k) for k in self.defaults}
+
+    def replace(self, **kwargs):
+        d = self.asdict()
+        d.update(kwargs)
+        return JobParams(**d)
+
+    def normalized(self):
+        # only what the generated program depends on, in the form the
+        # generators use it (ordered corners, grid counts when a
+        # resolution is set). toolDiam/flutes/material only feed speeds()
+        g = Grid(self)
+        v = float if g.decimals is None else int
+        d = {k: v(getattr(g, k)) for k in ("xa","xb","ya","yb","za","zb","safeZ","docXY","docZ","feedRate")}
+        d.update(decimals=g.decimals, cutDir=self.cutDir, layerMode=self.layerMode,
+                 strategy=self.strategy)
+        return d
+
+    def __repr__(self):
+        return "JobParams(%s)" % ", ".join("%s=%r" % kv for kv in self.asdict().items())
+
+    ###################################
+
+    def xaxb(self):
+      xa = self.x1
+      xb = self.x2
+      if xb<xa:
+        xa, xb = xb, xa
+      return xa, xb
+
+    def yayb(self):
+      ya = self.y1
+      yb = self.y2
+      if yb<ya:
+        ya, yb = yb, ya
+      return ya, yb
+
+    def zazb(self):
+      za = self.z1
+      zb = self.z2
+      if za<zb:
+        za, zb = zb, za
+      return za, zb
+
+#############################################################################
+# geometry grid
+#
+# with resolution=None the generators work on the parameters' floats,
+# which is what the original windows did (and what they print). with a
+# machine resolution such as 1e-4 every coordinate, step and feed is
+# rounded onto that grid once and the toolpath is built from python /
+# int64 counts: `xa += docXY` can't drift, the `xb<xa` ring test and the
+# layer count are exact, and the emitters print counts with integer to
+# decimal conversion.
+#############################################################################
+
+def gridDecimals(resolution):
+    # 1e-4 -> 4, None -> None
+    if resolution is None:
+        return None
+    k = int(round(-math.log10(resolution))) if resolution > 0 else -1
+    if not 0 <= k <= 9 or abs(resolution - 10.0**-k) > 1e-12 * resolution:
+        raise ValueError("resolution must be a power of ten (1 ... 1e-9), not <%g>" % resolution)
+    return k
+
+class Grid(object):
+
+    def __init__(self, params):
+        p = params
+        self.decimals = gridDecimals(p.resolution)
+        self.unset = NAN if self.decimals is None else UNSET
+        q = self.quantize
+        self.xa, self.xb = [q(v) for v in p.xaxb()]
+        self.ya, self.yb = [q(v) for v in p.yayb()]
+        self.za, self.zb = [q(v) for v in p.zazb()]
+        self.safeZ = q(p.safeZ)
+        self.docXY = q(p.docXY)
+        self.docZ = q(p.docZ)
+        self.feedRate = q(p.feedRate)
+        if self.decimals is not None and not (self.docXY > 0 and self.docZ > 0):
+            raise ValueError("docXY and docZ must be at least one resolution step")
+
+    def quantize(self, v):
+        if self.decimals is None:
+            return v
+        return int(round(v * 10**self.decimals))
+
+    def toolpath(self, start=None):
+        return Toolpath(start, self.decimals)
+
+    def literal(self, v):
+        # a value spelled out in a literal line (o-word loop expression)
+        if self.decimals is None:
+            return repr(v)
+        return formatFixed(v, self.decimals)
+
+    def feedText(self):
+        if self.decimals is None:
+            return "%g" % self.feedRate
+        return formatFixed(self.feedRate, self.decimals)
+
+    def layerZs(self):
+        return list(invfrange(self.za,self.zb,-self.docZ))
+
+#############################################################################
+# feeds and speeds (the window indicators)
+#############################################################################
+
+# which job parameters each speeds() entry depends on
+SPEED_INPUTS = {
+    "sfm": ("material",),
+    "rpm": ("material", "toolDiam"),
+    "ipt": ("material",),
+    "ipm": ("material", "toolDiam", "flutes"),
+    "mrr": ("material", "toolDiam", "flutes", "docZ", "docXY"),
+    "uhp": ("material",),
+    "hpr": ("material", "toolDiam", "flutes", "docZ", "docXY"),
+}
+
+def speeds(params):
+    V = sfmtable[params.material]
+    SFM = V["sfm"]
+    INT = V["intooth"]
+    RPM = (SFM*12/math.pi)/params.toolDiam
+
+    IPTmin = INT["min"]
+    IPTmax = INT["max"]
+    IPMmin = RPM*IPTmin*params.flutes
+    IPMmax = RPM*IPTmax*params.flutes
+
+    MRRmin = IPMmin*params.docZ*params.docXY
+    MRRmax = IPMmax*params.docZ*params.docXY
+
+    UHP = V["uhp"]
+    HPRmin = UHP*MRRmin
+    HPRmax = UHP*MRRmax
+
+    return {
+        "sfm": SFM, "rpm": RPM,
+        "ipt": (IPTmin, IPTmax),
+        "ipm": (IPMmin, IPMmax),
+        "mrr": (MRRmin, MRRmax),
+        "uhp": UHP,
+        "hpr": (HPRmin, HPRmax),
+    }
+
+#############################################################################
+# generators
+#
+# programs are produced as Toolpath chunks: a head (pre lines, safe Z,
+# rapid over the start corner), then per Z layer a plunge chunk and the
+# layer's cuts, then a tail. every layer cuts the same XY path, so it is
+# computed once as a template (z left nan) and stamped out at each Z;
+# the stamped chunks share a key and gcodeemit formats them only once.
+#
+# layerMode "sub" and "loop" write the template only once, as a LinuxCNC
+# o-word subroutine called per layer or inside a counted while loop.
+# those chunks carry the control flow as literal lines, so they are for
+# output only - use "expand" when the toolpath itself is wanted.
+#############################################################################
+
+FACING_PRE = ["G54"]
+RECTING_PRE = ["(Generated by recting generator, yo..)", "G20", "G54", "G61 (exact path mode)"]
+
+SUB_OWORD = 100
+LOOP_OWORD = 101
+LOOP_IF_OWORD = 102
+
+def headChunk(params, pre):
+    g = Grid(params)
+    tp = g.toolpath()
+    tp.pre = list(pre)
+    tp.rapid(z=g.safeZ, role=ROLE_SAFEZ)
+    tp.rapid(x=g.xa, y=g.ya, f=g.feedRate, role=ROLE_START)
+    return tp
+
+def plungeChunk(params, z, start, FirstZ):
+    # back to the start corner (except on the first layer), then down to z
+    g = Grid(params)
+    tp = g.toolpath(start)
+    if False==FirstZ:
+        tp.feed(x=g.xa, y=g.ya, f=g.feedRate, role=ROLE_RESTART)
+    tp.feed(z=z, f=g.feedRate, role=ROLE_PLUNGE)
+    return tp
+
+def layerTemplate(params, cutLayer):
+    # the XY cuts of one layer, entered right after a plunge. cutLayer
+    # returns the rings it cut
+    g = Grid(params)
+    tp = g.toolpath((g.unset, g.unset, g.unset, g.feedRate))
+    tp.rings = cutLayer(g, params.cutDir, tp)
+    tp.key = object()
+    return tp
+
+def layeredPath(params, pre, template, tail):
+    p = params
+    if p.layerMode == "sub":
+        yield from subroutinePath(p, pre, template, tail)
+        return
+    if p.layerMode == "loop":
+        yield from loopPath(p, pre, template, tail)
+        return
+    g = Grid(p)
+    head = headChunk(p, pre)
+    yield head
+    prev = head
+    FirstZ = True
+    for z in invfrange(g.za,g.zb,-g.docZ):
+      plunge = plungeChunk(p, z, prev.cursor(), FirstZ)
+      FirstZ = False
+      yield plunge
+      prev = template.atZ(z, plunge.cursor())
+      yield prev
+    yield tail(p, prev.cursor())
+
+def subroutinePath(params, pre, template, tail):
+    p = params
+    g = Grid(p)
+    yield Toolpath.literal(pre)
+    body = template.atZ(g.unset)
+    body.pre = ["o%d sub" % SUB_OWORD]
+    body.post = ["o%d endsub" % SUB_OWORD]
+    yield body
+    head = headChunk(p, [])
+    yield head
+    prev = head
+    FirstZ = True
+    for z in g.layerZs():
+      prev = plungeChunk(p, z, prev.cursor(), FirstZ)
+      prev.post = ["o%d call" % SUB_OWORD]
+      FirstZ = False
+      yield prev
+    yield tail(p, (g.unset, g.unset, g.unset, g.feedRate))
+
+def loopPath(params, pre, template, tail):
+    # the layer Z is recomputed as za - i*docZ on the controller, the same
+    # value invfrange() yields, for a layer count fixed up front
+    p = params
+    g = Grid(p)
+    nlayers = len(g.layerZs())
+    yield Toolpath.literal(pre)
+    head = headChunk(p, [])
+    yield head
+    # z stays unknown (unset) so the restart never writes a Z word
+    restart = plungeChunk(p, g.za, (g.unset, g.unset, g.unset, g.feedRate), False)[:1]
+    restart.pre = [
+        "#<layer> = 0",
+        "o%d while [#<layer> LT %d]" % (LOOP_OWORD, nlayers),
+        "o%d if [#<layer> GT 0]" % LOOP_IF_OWORD,
+    ]
+    restart.post = [
+        "o%d endif" % LOOP_IF_OWORD,
+        "G01 Z[%s - #<layer> * %s] F%s (feed to Z)" % (g.literal(g.za), g.literal(g.docZ), g.feedText()),
+    ]
+    yield restart
+    body = template.atZ(g.unset)
+    body.post = [
+        "#<layer> = [#<layer> + 1]",
+        "o%d endwhile" % LOOP_OWORD,
+    ]
+    yield body
+    yield tail(p, (g.unset, g.unset, g.unset, g.feedRate))
+
+###################################
+
+def facingLayer(grid, cutDir, tp):
+    # concentric rings, stepping in by docXY until they cross over
+    g = grid
+    F = g.feedRate
+    xa, xb = g.xa, g.xb
+    ya, yb = g.ya, g.yb
+    done = False
+    emitStartXY = False
+    rings = 0
+    while False == done:
+      rings += 1
+      if emitStartXY:
+        tp.rapid(x=xa, y=ya, role=ROLE_HOP)
+      if cutDir == "Conventional":
+        tp.feed(x=xb, y=ya, f=F)
+        tp.feed(x=xb, y=yb, f=F)
+        tp.feed(x=xa, y=yb, f=F)
+      else:
+        tp.feed(x=xa, y=yb, f=F)
+        tp.feed(x=xb, y=yb, f=F)
+        tp.feed(x=xb, y=ya, f=F)
+      tp.feed(x=xa, y=ya, f=F)
+      xa += g.docXY
+      xb -= g.docXY
+      ya += g.docXY
+      yb -= g.docXY
+      done = (xb<xa) or (yb<ya)
+      emitStartXY = True
+    return rings
+
+def facingSpiralLayer(grid, cutDir, tp):
+    # the same rings as one unbroken rectangular spiral: the fourth side
+    # of each ring stops docXY short of closing it and the next ring
+    # carries on from there, no hops. only the last ring closes
+    g = grid
+    F = g.feedRate
+    xa, xb = g.xa, g.xb
+    ya, yb = g.ya, g.yb
+    done = False
+    rings = 0
+    while False == done:
+      rings += 1
+      nxa = xa + g.docXY
+      nxb = xb - g.docXY
+      nya = ya + g.docXY
+      nyb = yb - g.docXY
+      done = (nxb<nxa) or (nyb<nya)
+      if cutDir == "Conventional":
+        tp.feed(x=xb, y=ya, f=F)
+        tp.feed(x=xb, y=yb, f=F)
+        tp.feed(x=xa, y=yb, f=F)
+        tp.feed(x=xa, y=ya if done else nya, f=F)
+      else:
+        tp.feed(x=xa, y=yb, f=F)
+        tp.feed(x=xb, y=yb, f=F)
+        tp.feed(x=xb, y=ya, f=F)
+        tp.feed(x=xa if done else nxa, y=ya, f=F)
+      xa, xb, ya, yb = nxa, nxb, nya, nyb
+    return rings
+
+def facingTail(params, start):
+    tp = Grid(params).toolpath(start)
+    tp.post = ["M2"]
+    return tp
+
+def facingTemplate(params):
+    if params.strategy == "spiral":
+        return layerTemplate(params, facingSpiralLayer)
+    return layerTemplate(params, facingLayer)
+
+def facingPath(params, template=None):
+    # template: precomputed layer (gcodevec builds it with numpy)
+    p = params
+    if template is None:
+        template = facingTemplate(p)
+    return layeredPath(p, FACING_PRE, template, facingTail)
+
+###################################
+
+def rectingLayer(grid, cutDir, tp):
+    # one pass around the outline
+    g = grid
+    F = g.feedRate
+    xa, xb = g.xa, g.xb
+    ya, yb = g.ya, g.yb
+    tp.rapid(x=xa, y=ya, role=ROLE_HOP)
+    tp.feed(x=xa, y=ya, f=F)
+    if cutDir == "Conventional":
+      tp.feed(x=xb, y=ya, f=F)
+      tp.feed(x=xb, y=yb, f=F)
+      tp.feed(x=xa, y=yb, f=F)
+    else:
+      tp.feed(x=xa, y=yb, f=F)
+      tp.feed(x=xb, y=yb, f=F)
+      tp.feed(x=xb, y=ya, f=F)
+    return 1
+
+def rectingTail(params, start):
+    g = Grid(params)
+    tp = g.toolpath(start)
+    tp.rapid(z=g.safeZ, role=ROLE_SAFEZ)
+    tp.post = ["M2"]
+    return tp
+
+def rectingTemplate(params):
+    return layerTemplate(params, rectingLayer)
+
+def rectingPath(params, template=None):
+    p = params
+    if template is None:
+        template = rectingTemplate(p)
+    return layeredPath(p, RECTING_PRE, template, rectingTail)
+
+###################################
+# text
+
+def facingLines(params):
+    return emitText(facingPath(params))
+
+def rectingLines(params):
+    return emitText(rectingPath(params))
+
+###################################
+# whole program as one str, fine for small jobs and the GUI text view;
+# big jobs should stream the *Lines() generators through gcodeio instead
+
+def facing(params):
+    return "".join(facingLines(params))
+
+def recting(params):
+    return "".join(rectingLines(params))
+
+generators = {
+    "facing": facing,
+    "recting": recting,
+}
+
+lineGenerators = {
+    "facing": facingLines,
+    "recting": rectingLines,
+}
+
+pathGenerators = {
+    "facing": facingPath,
+    "recting": rectingPath,
+}
+
+templateGenerators = {
+    "facing": facingTemplate,
+    "recting": rectingTemplate,
+}
+
+def toolpath(kind, params):
+    # the whole program as one Toolpath
+    return Toolpath.concat(pathGenerators[kind](params))
+
+ENGINES = ("auto", "scalar", "numpy")
+
+def _vec(kind, engine):
+    # facing has a NumPy twin (gcodevec) producing the same toolpath,
+    # "auto" uses it whenever numpy is importable
+    if kind == "facing" and engine != "scalar":
+        try:
+            import gcodevec
+        except ImportError:
+            if engine == "numpy":
+                raise
+        else:
+            return gcodevec
+    return None
+
+def pathGenerator(kind, engine="auto"):
+    vec = _vec(kind, engine)
+    return vec.facingPathVec if vec else pathGenerators[kind]
+
+def machinePath(kind, engine="auto"):
+    # params -> the chunks of what the machine runs: sub / loop programs
+    # hold the layer once, estimates and simulations need every layer
+    gen = pathGenerator(kind, engine)
+    def chunks(params):
+        return gen(params.replace(layerMode="expand"))
+    return chunks
+
+def templateGenerator(kind, engine="auto"):
+    # params -> the layer template pathGenerators[kind] stamps out
+    vec = _vec(kind, engine)
+    return vec.facingLayerTemplate if vec else templateGenerators[kind]
+
+def lineGenerator(kind, engine="auto"):
+    gen = pathGenerator(kind, engine)
+    def lines(params):
+        return emitText(gen(params))
+    return lines
@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+# DNC streaming to machine controllers (asyncio)
+# Copyright 2017 - Michael T. Mayers
+# Licensed under the GPLV3 - see https://www.gnu.org/licenses/gpl-3.0.html
+#
+# a program goes out line by line over TCP (host:port) or a serial port /
+# pty (a device path) with character counting flow control: the sender
+# keeps the lengths of the lines the controller has not acknowledged yet
+# (one "ok" or "error" reply per line, in order) and sends the next line
+# as soon as it fits into the controller's receive buffer. the buffer
+# stays full, so the planner behind it never waits for a round trip.
+#
+# an underrun is the receive buffer running dry: every line sent has
+# been acknowledged but the program isn't done, the source (a generator,
+# a slow disk) or the link didn't keep up. gaps longer than UNDERRUN are
+# counted, and the time the controller sat starved in them is added up
+# (the next line mostly follows its acknowledgement right away, that is
+# no underrun).
+#
+# many machines stream from one process, a task each. program text is
+# pulled from its (blocking) source a block at a time on a thread, so a
+# slow generator holds up only its own machine.
+#
+# FakeController is the stand-in for tests and dry runs: a grbl like
+# receive buffer and planner queue running a block every lineTime
+# seconds, served on TCP or a pty. it counts its own underruns (planner
+# empty mid program) and overflows (the flow control is broken).
+
+import os, re, time, asyncio
+from collections import deque
+
+import gcodeio
+from gcodecore import RXBUFFER, BAUD, PLANNER, LINETIME, UNDERRUN
+
+COMMENT = re.compile(rb"\([^)]*\)|;.*")
+
+#############################################################################
+# program source
+
+def fileBlocks(path, blocksize=gcodeio.CHUNKSIZE):
+    with open(path, "rb") as f:
+        for block in gcodeio.readChunks(f, blocksize):
+            yield block
+
+def cleanLine(line):
+    # comments and blanks only take up receive buffer
+    return COMMENT.sub(b"", line).strip()
+
+class LineSource(object):
+    # text blocks (emitText() output, file blocks, str or bytes) -> lines
+    # as bytes without the newline. blocks come from a blocking iterable,
+    # so they are fetched on the loop's executor
+
+    def __init__(self, blocks, strip=True):
+        self.blocks = iter(blocks)
+        self.strip = strip
+        self.lines = deque()
+        self.tail = b""
+        self.done = False
+        self.waited = 0.0   # s spent waiting on the source
+
+    async def next(self):
+        # -> next line, None at the end
+        loop = asyncio.get_running_loop()
+        while not self.lines:
+            if self.done:
+                return None
+            t0 = time.perf_counter()
+            block = await loop.run_in_executor(None, next, self.blocks, None)
+            self.waited += time.perf_counter() - t0
+            if block is None:
+                self.done = True
+                block = b"\n"
+            elif isinstance(block, str):
+                block = block.encode("utf-8")
+            parts = (self.tail + block).split(b"\n")
+            self.tail = parts.pop()
+            for line in parts:
+                line = cleanLine(line) if self.strip else line.rstrip(b"\r")
+                if line:
+                    self.lines.append(line)
+        return self.lines.popleft()
+
+    def ready(self):
+        # next line if one is at hand, without waiting
+        return self.lines.popleft() if self.lines else None
+
+#############################################################################
+# connections
+
+async def connect(target, baud=BAUD):
+    # "host:port" is TCP, anything else a serial device / pty path
+    host, sep, port = target.rpartition(":")
+    if sep and port.isdigit() and not os.path.exists(target):
+        return await asyncio.open_connection(host or "127.0.0.1", int(port))
+    return await openSerial(target, baud)
+
+async def openSerial(path, baud=BAUD):
+    # raw 8N1 at baud, POSIX termios (no pyserial needed)
+    import termios, tty
+    speed = getattr(termios, "B%d" % baud, None)
+    if speed is None:
+        raise ValueError("unsupported baud rate %d" % baud)
+    fd = os.open(path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+    try:
+        tty.setraw(fd)
+        attrs = termios.tcgetattr(fd)
+        attrs[2] |= termios.CLOCAL | termios.CREAD
+        attrs[4] = attrs[5] = speed
+        termios.tcsetattr(fd, termios.TCSANOW, attrs)
+    except Exception:
+        os.close(fd)
+        raise
+    return await pipeStreams(fd)
+
+class WriteProtocol(asyncio.Protocol):
+    # flow control of a write pipe: paused while the transport's buffer
+    # is above its high water mark, done when the pipe is closed
+
+    def __init__(self):
+        loop = asyncio.get_running_loop()
+        self.resumed = None     # future while paused
+        self.closed = loop.create_future()
+
+    def pause_writing(self):
+        if self.resumed is None:
+            self.resumed = asyncio.get_running_loop().create_future()
+
+    def resume_writing(self):
+        if self.resumed is not None:
+            if not self.resumed.done():
+                self.resumed.set_result(None)
+            self.resumed = None
+
+    def connection_lost(self, exc):
+        if self.resumed is not None and not self.resumed.done():
+            self.resumed.set_exception(exc or ConnectionResetError("pipe closed"))
+            self.resumed.exception()    # nobody need be draining
+        if not self.closed.done():
+            self.closed.set_result(None)
+
+class PipeWriter(object):
+    # the StreamWriter calls the sender and the stand-in use, on a write
+    # pipe transport
+
+    def __init__(self, transport, protocol):
+        self.transport = transport
+        self.protocol = protocol
+
+    def write(self, data):
+        self.transport.write(data)
+
+    async def drain(self):
+        if self.protocol.closed.done():
+            raise ConnectionResetError("pipe closed")
+        if self.protocol.resumed is not None:
+            await asyncio.shield(self.protocol.resumed)
+
+    def close(self):
+        self.transport.close()
+
+    async def wait_closed(self):
+        await asyncio.shield(self.protocol.closed)
+
+async def pipeStreams(fd):
+    # (reader, writer) streams over one fd, it is owned by them after
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    wfd = os.dup(fd)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader),
+                                 os.fdopen(fd, "rb", 0))
+    transport, protocol = await loop.connect_write_pipe(WriteProtocol,
+                                                        os.fdopen(wfd, "wb", 0))
+    return reader, PipeWriter(transport, protocol)
+
+#############################################################################
+# sender
+
+class Sender(object):
+
+    def __init__(self, name, reader, writer, rxBuffer=RXBUFFER, timeout=None,
+                 underrun=UNDERRUN):
+        self.name = name
+        self.reader = reader
+        self.writer = writer
+        self.rxBuffer = rxBuffer
+        self.timeout = timeout      # s to wait for an acknowledgement
+        self.underrun = underrun    # s empty that count as an underrun
+        self.inflight = deque()     # (line number, bytes) not acknowledged
+        self.pending = 0            # their bytes
+        self.batch = []             # lines not written yet
+        self.room = asyncio.Event()
+        self.lines = 0
+        self.bytes = 0
+        self.acked = 0
+        self.errors = []            # (line number, reply)
+        self.messages = 0           # other replies (banner, status ...)
+        self.underruns = 0
+        self.starved = 0.0
+        self.maxPending = 0
+        self.idleSince = None
+
+    async def stream(self, source):
+        # -> report, once every line is acknowledged
+        t0 = time.perf_counter()
+        replies = asyncio.ensure_future(self.replies())
+        try:
+            line = await source.next()
+            while line is not None:
+                n = len(line) + 1
+                if n > self.rxBuffer:
+                    raise ValueError("%s: line %d is longer than the %d byte receive buffer"
+                                     % (self.name, self.lines + 1, self.rxBuffer))
+                if self.pending + n > self.rxBuffer:
+                    await self.flush()
+                    while self.pending + n > self.rxBuffer:
+                        await self.wait(replies)
+                if self.idleSince is not None:
+                    gap = time.perf_counter() - self.idleSince
+                    if gap > self.underrun:
+                        self.underruns += 1
+                        self.starved += gap
+                    self.idleSince = None
+                self.lines += 1
+                self.inflight.append((self.lines, n))
+                self.pending += n
+                self.batch.append(line)
+                # what the source has at hand goes out in one write
+                line = source.ready()
+                if line is None:
+                    await self.flush()
+                    line = await source.next()
+            await self.flush()
+            while self.inflight:
+                await self.wait(replies)
+        finally:
+            replies.cancel()
+        return self.report(time.perf_counter() - t0)
+
+    async def flush(self):
+        if self.batch:
+            data = b"\n".join(self.batch) + b"\n"
+            self.batch = []
+            self.writer.write(data)
+            self.bytes += len(data)
+            self.maxPending = max(self.maxPending, self.pending)
+            await self.writer.drain()
+
+    async def wait(self, replies):
+        # until an acknowledgement makes room, or the replies end
+        self.room.clear()
+        waiter = asyncio.ensure_future(self.room.wait())
+        done, _ = await asyncio.wait((waiter, replies), timeout=self.timeout,
+                                     return_when=asyncio.FIRST_COMPLETED)
+        waiter.cancel()
+        if replies in done:
+            replies.result()
+            raise ConnectionError("%s: replies ended" % self.name)
+        if not done:
+            raise TimeoutError("%s: no reply to line %d in %gs"
+                               % (self.name, self.inflight[0][0], self.timeout))
+
+    async def replies(self):
+        while True:
+            raw = await self.reader.readline()
+            if not raw:
+                raise ConnectionError("%s: connection closed with %d lines unacknowledged"
+                                      % (self.name, len(self.inflight)))
+            reply = raw.strip()
+            if reply != b"ok" and not reply.startswith(b"error"):
+                self.messages += 1
+                continue
+            if not self.inflight:
+                self.messages += 1   # nothing of ours
+                continue
+            number, n = self.inflight.popleft()
+            self.pending -= n
+            self.acked += 1
+            if reply != b"ok":
+                self.errors.append((number, reply.decode("ascii", "replace")))
+            if not self.inflight:
+                self.idleSince = time.perf_counter()
+            self.room.set()
+
+    def report(self, seconds):
+        return {
+            "name": self.name,
+            "lines": self.lines,
+            "bytes": self.bytes,
+            "seconds": seconds,
+            "linesPerSecond": self.lines/seconds if seconds else 0.0,
+            "bytesPerSecond": self.bytes/seconds if seconds else 0.0,
+            "underruns": self.underruns,
+            "starved": self.starved,
+            "maxPending": self.maxPending,
+            "errors": self.errors,
+            "messages": self.messages,
+        }
+
+async def streamTo(target, blocks, name=None, rxBuffer=RXBUFFER, baud=BAUD, strip=True,
+                   timeout=None, settle=0.0, underrun=UNDERRUN):
+    # one program to one controller -> report. settle: s to wait after
+    # connecting (grbl resets when a serial port opens)
+    reader, writer = await connect(target, baud)
+    try:
+        if settle:
+            await asyncio.sleep(settle)
+        source = LineSource(blocks, strip)
+        sender = Sender(name or target, reader, writer, rxBuffer, timeout, underrun)
+        report = await sender.stream(source)
+        report["sourceWait"] = source.waited
+        return report
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (OSError, ConnectionError):
+            pass
+
+async def streamAll(jobs, **kwargs):
+    # [(target, blocks)] -> reports in order, a failed machine's report
+    # holds only "name" and "failed"
+    results = await asyncio.gather(*[streamTo(target, blocks, **kwargs)
+                                     for target, blocks in jobs], return_exceptions=True)
+    out = []
+    for (target, blocks), r in zip(jobs, results):
+        if isinstance(r, BaseException):
+            if not isinstance(r, Exception):
+                raise r
+            r = {"name": target, "failed": str(r) or r.__class__.__name__}
+        out.append(r)
+    return out
+
+def sendAll(jobs, **kwargs):
+    return asyncio.run(streamAll(jobs, **kwargs))
+
+def formatReport(r):
+    if "failed" in r:
+        return "%s: FAILED %s" % (r["name"], r["failed"])
+    text = "%s: %d lines, %d bytes in %0.2fs (%0.0f lines/s, %0.0f B/s), %d underruns" % (
+        r["name"], r["lines"], r["bytes"], r["seconds"], r["linesPerSecond"],
+        r["bytesPerSecond"], r["underruns"])
+    if r["underruns"]:
+        text += " (%0.3fs starved)" % r["starved"]
+    if r["errors"]:
+        text += ", %d errors, first at line %d: %s" % ((len(r["errors"]),) + r["errors"][0])
+    return text
+
+#############################################################################
+# stand-in controller
+
+class FakeController(object):
+
+    def __init__(self, rxBuffer=RXBUFFER, planner=PLANNER, lineTime=LINETIME, banner=True):
+        self.rxBuffer = rxBuffer
+        self.planner = planner
+        self.lineTime = lineTime
+        self.banner = banner
+        self.sessions = []
+        self.fds = []
+
+    async def handle(self, reader, writer):
+        # one connection: receive buffer -> planner queue -> "run"
+        s = {"lines": 0, "bytes": 0, "overflows": 0, "maxBuffered": 0,
+             "underruns": 0, "starved": 0.0}
+        self.sessions.append(s)
+        queue = asyncio.Queue(self.planner)
+        run = asyncio.ensure_future(self.execute(queue, s))
+        if self.banner:
+            writer.write(b"\r\nGrbl 1.1f ['$' for help]\r\n")
+        rx = bytearray()
+        try:
+            while True:
+                data = await reader.read(4096)
+                if not data:
+                    break
+                rx += data
+                s["bytes"] += len(data)
+                s["maxBuffered"] = max(s["maxBuffered"], len(rx))
+                if len(rx) > self.rxBuffer:
+                    s["overflows"] += 1
+                while True:
+                    i = rx.find(b"\n")
+                    if i < 0:
+                        break
+                    line = bytes(rx[:i]).strip()
+                    del rx[:i+1]
+                    await queue.put(line)
+                    writer.write(b"ok\r\n")
+                await writer.drain()
+            await queue.put(None)
+            await run
+        except (OSError, ConnectionError):
+            run.cancel()
+        finally:
+            writer.close()
+        return s
+
+    async def execute(self, queue, s):
+        while True:
+            t0 = time.perf_counter()
+            empty = queue.empty()
+            line = await queue.get()
+            if line is None:
+                return
+            if empty and s["lines"] and self.lineTime:
+                wait = time.perf_counter() - t0
+                if wait > self.lineTime/2:
+                    s["underruns"] += 1
+                    s["starved"] += wait
+            if self.lineTime:
+                await asyncio.sleep(self.lineTime)
+            s["lines"] += 1
+
+    async def serveTcp(self, host="127.0.0.1", port=0):
+        # -> (server, "host:port")
+        server = await asyncio.start_server(self.handle, host, port)
+        host, port = server.sockets[0].getsockname()[:2]
+        return server, "%s:%d" % (host, port)
+
+    async def servePty(self):
+        # -> (task, slave path), the task ends when cancelled. the slave
+        # stays open here too, or the master reads EIO between senders
+        import tty
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        self.fds.append(slave)
+        reader, writer = await pipeStreams(master)
+        return asyncio.ensure_future(self.handle(reader, writer)), os.ttyname(slave)
+
+    def close(self):
+        for fd in self.fds:
+            os.close(fd)
+        self.fds = []
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# Toolpath -> gcode text
+# Copyright 2017 - Michael T. Mayers
+# Licensed under the GPLV3 - see https://www.gnu.org/licenses/gpl-3.0.html
+
+import re
+from operator import itemgetter
+
+from toolpath import W_X, W_Y, W_Z, W_F, ROLE_NOTES, UNSET, formatFixed
+
+#############################################################################
+# one "%" template per (motion, words, role) combination, e.g.
+#   (1, W_X|W_Y|W_F, ROLE_CUT) -> "G01 X%g Y%g F%g\n"
+
+_AXES = ((W_X, "X", 0), (W_Y, "Y", 1), (W_Z, "Z", 2), (W_F, "F", 3))
+
+_templates = {}
+
+def _template(motion, words, role):
+    key = (motion, words, role)
+    t = _templates.get(key)
+    if t is None:
+        fmt = "G%02d" % motion
+        fields = []
+        for bit, letter, index in _AXES:
+            if words & bit:
+                fmt += " %s%%g" % letter
+                fields.append(index)
+        note = ROLE_NOTES[role]
+        if note:
+            fmt += " (%s)" % note
+        fmt += "\n"
+        if len(fields) == 1:
+            index = fields[0]
+            pick = lambda v: (v[index],)
+        else:
+            pick = itemgetter(*fields)
+        t = _templates[key] = (fmt, pick, fmt.replace("%g", "%s"))
+    return t
+
+#############################################################################
+
+def chunkText(tp):
+    # the whole chunk (pre, segments, post) as one str
+    out = [line + "\n" for line in tp.pre]
+    templates = _templates
+    template = _template
+    columns = zip(tp.motion, tp.words, tp.role, tp.x, tp.y, tp.z, tp.f)
+    if tp.decimals is None:
+        for m, w, r, x, y, z, f in columns:
+            fmt, pick, sfmt = templates.get((m, w, r)) or template(m, w, r)
+            out.append(fmt % pick((x, y, z, f)))
+    else:
+        columns = zip(tp.motion, tp.words, tp.role,
+                      *[fixedColumn(col, tp.decimals) for col in (tp.x, tp.y, tp.z, tp.f)])
+        for m, w, r, x, y, z, f in columns:
+            fmt, pick, sfmt = templates.get((m, w, r)) or template(m, w, r)
+            out.append(sfmt % pick((x, y, z, f)))
+    out.extend(line + "\n" for line in tp.post)
+    return "".join(out)
+
+def emitText(chunks, cache=None):
+    # generator of text blocks, one per chunk. chunks carrying the same
+    # `key` promise identical text (a replayed layer), so that text is
+    # formatted only once. pass a dict as cache to keep it across programs
+    # built on the same template
+    if cache is None:
+        cache = {}
+    for tp in chunks:
+        if tp.key is None or tp.pre or tp.post:
+            # o-word wrapped bodies share the key but not the text
+            yield chunkText(tp)
+            continue
+        text = cache.get(tp.key)
+        if text is None:
+            text = cache[tp.key] = chunkText(tp)
+        yield text
+
+#############################################################################
+# modal writer
+#
+# smaller programs for serial/DNC transfer: the motion word, F and any
+# axis are only written when they change, zero-length moves vanish and
+# numbers are printed at a fixed number of decimals (trailing zeros
+# trimmed) instead of %g. comments are dropped unless asked for.
+#
+# literal lines (pre/post, o-word control flow) end what the writer
+# knows about the machine state, the next move is written in full.
+#############################################################################
+
+def numberFormatter(decimals):
+    # float -> text at `decimals`, None for nan (unknown)
+    fmt = "%%.%df" % decimals
+    cache = {}
+    def number(v):
+        s = cache.get(v)
+        if s is None:
+            if v != v:
+                return None
+            s = fmt % v
+            if "." in s:
+                s = s.rstrip("0").rstrip(".")
+            if s == "-0":
+                s = "0"
+            if len(cache) < 65536:
+                cache[v] = s
+        return s
+    return number
+
+def fixedColumn(counts, decimals):
+    # a whole int64 column as text (None for UNSET). every distinct count
+    # is converted once, the column itself is a C level dict lookup
+    table = {n: formatFixed(n, decimals) for n in set(counts)}
+    table[UNSET] = None
+    return list(map(table.__getitem__, counts))
+
+# a move spelled out in a literal line, e.g. loop mode's
+# "G01 Z[1.0 - #<layer> * 0.0625] F6 (feed to Z)"
+LITERAL_MOVE = re.compile(r"G0?([0-3])((?:\s+[XYZF](?:\[[^\]]*\]|[-+]?[0-9.]+))+)\s*(?:\((.*)\))?$")
+LITERAL_WORD = re.compile(r"([XYZF])(\[[^\]]*\]|[-+]?[0-9.]+)")
+
+class ModalWriter(object):
+
+    # fixed point toolpaths are printed at their own resolution, the
+    # writer's decimals only apply to float ones
+
+    def __init__(self, decimals=4, comments=False):
+        self.floatNumber = numberFormatter(decimals)
+        self.comments = comments
+        self.reset()
+
+    def number(self, tp, v):
+        # one of tp's coordinates as this writer prints it
+        if tp.decimals is None:
+            return self.floatNumber(v)
+        return None if v == UNSET else formatFixed(v, tp.decimals)
+
+    def reset(self):
+        # motion, x, y, z, f as last written (None = unknown)
+        self.state = (None, None, None, None, None)
+
+    def literalText(self, line):
+        # a pre / post line. a move is written against the modal state
+        # like a segment (an [expression] is always written and leaves its
+        # axis unknown), anything else (o-words ...) forgets the state
+        move = LITERAL_MOVE.match(line)
+        if move is None:
+            self.reset()
+            return line + "\n"
+        m = int(move.group(1))
+        state = dict(zip(("m", "X", "Y", "Z", "F"), self.state))
+        words = []
+        for letter, value in LITERAL_WORD.findall(move.group(2)):
+            if value.startswith("["):
+                words.append(letter + value)
+                state[letter] = None
+                continue
+            value = self.floatNumber(float(value))
+            if value != state[letter]:
+                words.append(letter + value)
+                state[letter] = value
+        if m != state["m"]:
+            words.insert(0, "G%d" % m)
+            state["m"] = m
+        self.state = tuple(state[k] for k in ("m", "X", "Y", "Z", "F"))
+        if self.comments and move.group(3):
+            words.append("(%s)" % move.group(3))
+        return " ".join(words) + "\n" if words else ""
+
+    def chunkText(self, tp):
+        out = []
+        for line in tp.pre:
+            out.append(self.literalText(line))
+        if tp.decimals is None:
+            number = self.floatNumber
+            columns = [list(map(number, col)) for col in (tp.x, tp.y, tp.z, tp.f)]
+        else:
+            columns = [fixedColumn(col, tp.decimals) for col in (tp.x, tp.y, tp.z, tp.f)]
+        m0, x0, y0, z0, f0 = self.state
+        for m, r, x, y, z, f in zip(tp.motion, tp.role, *columns):
+            words = []
+            if x is not None and x != x0:
+                words.append("X" + x)
+                x0 = x
+            if y is not None and y != y0:
+                words.append("Y" + y)
+                y0 = y
+            if z is not None and z != z0:
+                words.append("Z" + z)
+                z0 = z
+            if not words:
+                continue
+            if m == 1 and f is not None and f != f0:
+                words.append("F" + f)
+                f0 = f
+            if m != m0:
+                words.insert(0, "G%d" % m)
+                m0 = m
+            if self.comments and ROLE_NOTES[r]:
+                words.append("(%s)" % ROLE_NOTES[r])
+            out.append(" ".join(words) + "\n")
+        self.state = (m0, x0, y0, z0, f0)
+        for line in tp.post:
+            out.append(self.literalText(line))
+        return "".join(out)
+
+def emitModal(chunks, decimals=4, comments=False):
+    # like emitText(). a keyed chunk that stays at the Z it was entered at
+    # (a stamped layer) never writes Z, so its text only depends on the
+    # rest of the entry state and is cached on that
+    writer = ModalWriter(decimals, comments)
+    cache = {}
+    for tp in chunks:
+        if tp.key is None or tp.pre or tp.post or not _flatAt(tp, writer):
+            yield writer.chunkText(tp)
+            continue
+        m, x, y, z, f = writer.state
+        ck = (tp.key, m, x, y, f)
+        hit = cache.get(ck)
+        if hit is None:
+            hit = cache[ck] = (writer.chunkText(tp), writer.state)
+        else:
+            m, x, y, unused, f = hit[1]
+            writer.state = (m, x, y, z, f)
+        yield hit[0]
+
+def _flatAt(tp, writer):
+    z = tp.z
+    if len(z) == 0:
+        return True
+    return z.count(z[0]) == len(z) and writer.state[3] == writer.number(tp, z[0])
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# Multi-part fixture programs
+# Copyright 2017 - Michael T. Mayers
+# Licensed under the GPLV3 - see https://www.gnu.org/licenses/gpl-3.0.html
+#
+# N blanks on one fixture plate, each with its own rectangle, Z range
+# and kind (a gcodebatch manifest, one row per part), cut by one program:
+#
+#   pre lines once, then per part: retract to the shared safe Z, rapid
+#   to its start corner, its layers, ... and M2 at the very end
+#
+# the part order is planned to keep the XY rapids between parts short:
+# a nearest neighbour tour (over a grid bucket index of the part start
+# corners) from the machine origin, improved by 2-opt. a part is left
+# where its last layer ends, not where it started, so the tour is
+# asymmetric; 2-opt keeps running sums of the forward and the reversed
+# leg lengths so every candidate reversal is priced in O(1).
+
+import math, time
+
+import gcodecore
+from gcodecore import Grid, JobParams
+from toolpath import Toolpath
+
+FIXTURE_PRE = ["(Generated by fixture mode, %d parts)", "G20", "G54"]
+
+#############################################################################
+
+class Part(object):
+
+    def __init__(self, name, kind, params, engine="auto"):
+        self.name = name
+        self.kind = kind
+        # parts are always written out layer by layer, o-word subs would
+        # collide between parts
+        self.params = params.replace(layerMode="expand")
+        g = Grid(self.params)
+        self.template = gcodecore.templateGenerator(kind, engine)(self.params)
+        self.entry = (g.xa, g.ya)
+        self.exit = self.template.cursor()[:2]
+        if g.decimals is not None:
+            self.entry = tuple(self.template.value(v) for v in self.entry)
+            self.exit = tuple(self.template.value(v) for v in self.exit)
+
+    def chunks(self, safeZ):
+        p = self.params.replace(safeZ=safeZ)
+        return gcodecore.pathGenerators[self.kind](p, self.template)
+
+def partsFromJobs(jobs, engine="auto"):
+    # gcodebatch.readManifest() rows -> Parts
+    return [Part(job["name"] or "part%d" % job["index"], job["kind"],
+                 JobParams(**job["params"]), engine) for job in jobs]
+
+#############################################################################
+# ordering
+
+def dist(a, b):
+    return math.hypot(a[0]-b[0], a[1]-b[1])
+
+class GridIndex(object):
+    # uniform bucket grid over points, nearest remaining point queries
+
+    def __init__(self, points):
+        self.points = points
+        xs = [p[0] for p in points]
+        ys = [p[1] for p in points]
+        self.x0 = min(xs)
+        self.y0 = min(ys)
+        span = max(max(xs)-self.x0, max(ys)-self.y0, 1e-9)
+        self.size = span/max(1, int(math.sqrt(len(points))))
+        self.cells = {}
+        for i, p in enumerate(points):
+            self.cells.setdefault(self.cell(p), set()).add(i)
+        self.ncells = int(span/self.size) + 2
+        self.count = len(points)
+
+    def cell(self, p):
+        return (int((p[0]-self.x0)//self.size), int((p[1]-self.y0)//self.size))
+
+    def remove(self, i):
+        c = self.cell(self.points[i])
+        self.cells[c].discard(i)
+        if not self.cells[c]:
+            del self.cells[c]
+        self.count -= 1
+
+    def nearest(self, q):
+        # search square rings of cells outward; once something is found,
+        # anything closer has to be within the ring that covers its distance
+        if self.count == 0:
+            return None
+        # only the part of each ring on the grid is looked at, q may be
+        # far outside it (the machine origin, one part's tiny grid)
+        cx, cy = self.cell(q)
+        n = self.ncells
+        best = None
+        bestd = float("inf")
+        for r in range(max(0, -cx, cx-n+1, -cy, cy-n+1), max(cx, n-1-cx, cy, n-1-cy)+1):
+            for x in range(max(cx-r, 0), min(cx+r, n-1)+1):
+                if x in (cx-r, cx+r):
+                    ys = range(max(cy-r, 0), min(cy+r, n-1)+1)
+                else:
+                    ys = [y for y in (cy-r, cy+r) if 0 <= y < n]
+                for y in ys:
+                    for i in self.cells.get((x, y), ()):
+                        d = dist(q, self.points[i])
+                        if d < bestd or (d == bestd and i < best):
+                            best, bestd = i, d
+            # every cell within r rings is done: nothing unseen is closer
+            # than r*size from q
+            if best is not None and bestd <= r*self.size:
+                return best
+        return best
+
+def tourLength(order, cost, first):
+    if not order:
+        return 0.0
+    return first[order[0]] + sum(cost[a][b] for a, b in zip(order, order[1:]))
+
+def nearestNeighbour(parts, home=(0.0, 0.0)):
+    index = GridIndex([p.entry for p in parts])
+    order = []
+    at = home
+    while index.count:
+        i = index.nearest(at)
+        index.remove(i)
+        order.append(i)
+        at = parts[i].exit
+    return order
+
+def twoOpt(order, cost, first, maxPasses=50):
+    # reverse order[i..j] while that shortens the tour. forward/backward
+    # prefix sums of the leg costs price a reversal in O(1)
+    order = list(order)
+    n = len(order)
+    for npass in range(maxPasses):
+        improved = False
+        i = 0
+        while i < n-1:
+            F = [0.0]
+            R = [0.0]
+            for a, b in zip(order, order[1:]):
+                F.append(F[-1] + cost[a][b])
+                R.append(R[-1] + cost[b][a])
+            ti = order[i]
+            into = first if i == 0 else cost[order[i-1]]
+            for j in range(i+1, n):
+                tj = order[j]
+                old = into[ti] + F[j] - F[i]
+                new = into[tj] + R[j] - R[i]
+                if j+1 < n:
+                    nxt = order[j+1]
+                    old += cost[tj][nxt]
+                    new += cost[ti][nxt]
+                if new < old - 1e-9:
+                    order[i:j+1] = order[i:j+1][::-1]
+                    improved = True
+                    break
+            else:
+                i += 1
+        if not improved:
+            break
+    return order
+
+def planOrder(parts, home=(0.0, 0.0)):
+    # -> (order, report). report compares the XY rapid travel of the
+    # manifest order with the planned one
+    t0 = time.perf_counter()
+    cost = [[dist(a.exit, b.entry) for b in parts] for a in parts]
+    first = [dist(home, p.entry) for p in parts]
+    order = twoOpt(nearestNeighbour(parts, home), cost, first)
+    given = tourLength(list(range(len(parts))), cost, first)
+    planned = tourLength(order, cost, first)
+    return order, {
+        "parts": len(parts),
+        "rapidGiven": given,
+        "rapidPlanned": planned,
+        "rapidSaved": given - planned,
+        "percent": 100.0*(given - planned)/given if given else 0.0,
+        "seconds": time.perf_counter() - t0,
+    }
+
+#############################################################################
+# program
+
+def fixturePath(parts, order=None, safeZ=None):
+    # Toolpath chunks of one program over all parts, safe Z is the
+    # highest any part asks for unless given
+    if order is None:
+        order = range(len(parts))
+    if safeZ is None:
+        safeZ = max(p.params.safeZ for p in parts)
+    pre = list(FIXTURE_PRE)
+    pre[0] = pre[0] % len(parts)
+    yield Toolpath.literal(pre)
+    high = False
+    for n, i in enumerate(order):
+        part = parts[i]
+        chunks = list(part.chunks(safeZ))
+        head = chunks[0]
+        if high:
+            # the last part's tail already went up to safe Z
+            head = head[1:]
+        head.pre = ["(part %d: %s)" % (n+1, part.name)]
+        chunks[0] = head
+        tail = chunks[-1]
+        tail.post = []
+        high = len(tail) > 0 and tail.value(tail.z[-1]) == float(safeZ)
+        for tp in chunks:
+            yield tp
+    yield Toolpath.literal(["M2"])
@@ -0,0 +1,651 @@
+#!/usr/bin/env python3
+# Qt front-end shared by the facing and recting generators
+# Copyright 2017 - Michael T. Mayers
+# Licensed under the GPLV3 - see https://www.gnu.org/licenses/gpl-3.0.html
+
+import os,sys, string, math, logging
+
+from PyQt5.QtCore import QSize, Qt, QTimer
+from PyQt5.QtWidgets import QApplication, QGridLayout, QLabel, QWidget, QComboBox, QCheckBox
+from PyQt5.QtWidgets import QLineEdit, QPushButton, QFileDialog, QProgressBar, QSpinBox
+from PyQt5.QtWidgets import QDialog, QPlainTextEdit, QVBoxLayout
+from PyQt5.QtGui import (QPalette, QPixmap)
+
+import json
+import gcodecore, gcodeio, cycletime, gcodeprof
+from gcodeworker import BackgroundGenerator
+from gcodeview import ProgramView, BackplotView
+from gcodecore import sfmtable, JobParams
+from gcodeemit import emitText
+
+log = logging.getLogger("gcodegen")
+
+REFRESH_DELAY = 150 # ms of quiet after the last edit before recomputing
+
+#############################################################################
+
+class GeneratorWindow(QWidget):
+
+    # subclasses set these
+    title = "GCode Generator"
+    kind = None
+
+    ###################################
+
+    def __init__(self):
+        super(GeneratorWindow, self).__init__()
+        mainLayout = QGridLayout()
+        #####################
+        self.z1 = 1.0
+        self.z2 = 1.0
+        self.safeZ = 2.0
+        self.x1 = 0.0
+        self.x2 = 1.0
+        self.y1 = 0.0
+        self.y2 = 1.0
+        self.docZ = 1/16.0
+        self.docXY = 0.1
+        self.feedRate = 6.0
+        self.toolDiam = 0.25
+        self.flutes = 2
+        self.row = 0
+        self.mrr = 0
+        self.cutDir = "Conventional"
+        self.layerMode = "expand"
+        self.strategy = "rings"
+        self.genParams = None
+        self.genJob = 0
+        self.shown = {}
+        # window side counters / timings (edits, refreshes, render, write),
+        # the worker's come with each generation
+        self.uiProf = gcodeprof.Profiler()
+        self.uiProf.start()
+        self.renderProf = gcodeprof.Profiler()
+        self.lastProfile = None
+        self.writeProfile = None
+
+        # edits only restart this timer, refresh() runs once they pause
+        self.refreshTimer = QTimer(self)
+        self.refreshTimer.setSingleShot(True)
+        self.refreshTimer.setInterval(REFRESH_DELAY)
+        self.refreshTimer.timeout.connect(self.refresh)
+        self.generator = BackgroundGenerator(self.kind, parent=self)
+        self.generator.worker.chunk.connect(self.genChunk)
+        self.generator.worker.progress.connect(self.genProgress)
+        self.generator.worker.finished.connect(self.genFinished)
+        self.generator.worker.estimated.connect(self.genEstimated)
+        self.generator.worker.simulated.connect(self.genSimulated)
+        self.generator.worker.plotted.connect(self.genPlotted)
+        self.generator.worker.profiled.connect(self.genProfiled)
+        self.generator.worker.failed.connect(self.genFailed)
+
+        self.docXY = self.toolDiam*0.25
+
+        #####################
+        def rowpp():
+            rv = self.row
+            self.row = self.row+1
+            return rv
+        #####################
+        def makeNumEdit(var,label,bgcolor):
+            row = rowpp()
+            numlabl = QLabel(label)
+            numedit = QLineEdit( )
+            numedit.setMaxLength(10)
+            numedit.setText("%g"%getattr(self,var))
+            numedit.setStyleSheet("background-color: %s; color: rgb(255,255,128); "%bgcolor)
+            def numeditchanged(text):
+              self.uiProf.note("edits", "labl<%s> var<%s> val<%s>", label, var, text)
+              try:
+                if var=="toolDiam":
+                  self.docXY = float(text)*0.25
+                setattr(self,var,float(text))
+              except:
+                None
+              self.scheduleRefresh()
+            numedit.textChanged.connect(numeditchanged)
+            mainLayout.addWidget(numlabl, row, 0)
+            mainLayout.addWidget(numedit, row, 1, 1, 1)
+            return numedit
+        #####################
+
+        makeNumEdit("x1","x1","rgb(64,0,0)")
+        makeNumEdit("x2","x2","rgb(64,0,0)")
+        makeNumEdit("y1","y1","rgb(64,0,0)")
+        makeNumEdit("y2","y2","rgb(64,0,0)")
+        makeNumEdit("z1","z1","rgb(64,0,0)")
+        makeNumEdit("z2","z2","rgb(64,0,0)")
+        makeNumEdit("safeZ","safeZ","rgb(96,0,0)")
+        makeNumEdit("flutes","flutes","rgb(0,64,0)")
+        makeNumEdit("feedRate","Feed Rate (in/min)","rgb(0,64,0)")
+        makeNumEdit("toolDiam","Tool Diam (in)","rgb(0,64,0)")
+
+        self.docXYedit = makeNumEdit("docXY","Radial(XY) DOC (in)","rgb(0,64,96)")
+
+        docZrow = rowpp()
+        self.cbox_docZ = QComboBox()
+        for text, value in gcodecore.DOCZ_CHOICES:
+          self.cbox_docZ.addItem(text, value)
+        self.cbox_docZ.setCurrentIndex(0)
+        self.cbox_docZ.setStyleSheet("background-color: rgb(0,64,96); border: rgb(255,255,255); color: rgb(255,255,128); ")
+        doczlabl = QLabel("Axial(Z) DOC (in)")
+        def docZchanged():
+            data = self.cbox_docZ.itemData(self.cbox_docZ.currentIndex())
+            setattr(self,"docZ",data)
+            self.scheduleRefresh()
+        self.cbox_docZ.activated.connect(docZchanged)
+        mainLayout.addWidget(doczlabl, docZrow, 0, 1, 1)
+        mainLayout.addWidget(self.cbox_docZ, docZrow, 1, 1, 1)
+
+        #####################
+        cutdirrow = rowpp()
+        cutdirbox = QComboBox()
+        cutdirbox.setStyleSheet("background-color: rgb(96,96,96); border: rgb(255,255,255); color: rgb(255,255,128); ")
+        cutdirbox.addItem("Climb", "Climb")
+        cutdirbox.addItem("Conventional", "Conventional")
+        cutdirbox.setCurrentIndex(1)
+        cutdirlabl = QLabel("CutDirection")
+        def cutDirChanged():
+            data = cutdirbox.itemData(cutdirbox.currentIndex())
+            setattr(self,"cutDir",data)
+            self.scheduleRefresh()
+        cutdirbox.activated.connect(cutDirChanged)
+        mainLayout.addWidget(cutdirlabl, cutdirrow, 0, 1, 1)
+        mainLayout.addWidget(cutdirbox, cutdirrow, 1, 1, 1)
+
+        #####################
+        layerrow = rowpp()
+        layerbox = QComboBox()
+        layerbox.setStyleSheet("background-color: rgb(96,96,96); border: rgb(255,255,255); color: rgb(255,255,128); ")
+        layerbox.addItem("Expand", "expand")
+        layerbox.addItem("Subroutine (o-word)", "sub")
+        layerbox.addItem("While loop (o-word)", "loop")
+        layerbox.setCurrentIndex(0)
+        layerlabl = QLabel("Z Layers")
+        def layerModeChanged():
+            data = layerbox.itemData(layerbox.currentIndex())
+            setattr(self,"layerMode",data)
+            self.scheduleRefresh()
+        layerbox.activated.connect(layerModeChanged)
+        mainLayout.addWidget(layerlabl, layerrow, 0, 1, 1)
+        mainLayout.addWidget(layerbox, layerrow, 1, 1, 1)
+
+        #####################
+        if self.kind == "facing":
+          stratrow = rowpp()
+          stratbox = QComboBox()
+          stratbox.setStyleSheet("background-color: rgb(96,96,96); border: rgb(255,255,255); color: rgb(255,255,128); ")
+          stratbox.addItem("Concentric rings", "rings")
+          stratbox.addItem("Continuous spiral", "spiral")
+          stratbox.setCurrentIndex(0)
+          stratlabl = QLabel("Facing Path")
+          def strategyChanged():
+              data = stratbox.itemData(stratbox.currentIndex())
+              setattr(self,"strategy",data)
+              self.scheduleRefresh()
+          stratbox.activated.connect(strategyChanged)
+          mainLayout.addWidget(stratlabl, stratrow, 0, 1, 1)
+          mainLayout.addWidget(stratbox, stratrow, 1, 1, 1)
+
+        #####################
+
+        mtlrow = rowpp()
+        self.cbox_mtl = QComboBox()
+        self.cbox_mtl.setStyleSheet("background-color: rgb(96,96,96); border: rgb(255,255,255); color: rgb(255,255,128); ")
+
+        for k in sfmtable:
+            v = sfmtable[k]
+            sfm = v["sfm"]
+            self.cbox_mtl.addItem(k, v)
+
+        self.cbox_mtl.activated.connect(self.scheduleRefresh)
+
+        sfmlabl = QLabel("Material (SFM)")
+        mainLayout.addWidget(sfmlabl, mtlrow, 0, 1, 1)
+        mainLayout.addWidget(self.cbox_mtl, mtlrow, 1, 1, 1)
+        self.cbox_mtl.setCurrentIndex(0)
+
+        #####################
+
+        def makeindic(labltext):
+            row = rowpp()
+            labl = QLabel(labltext)
+            valu = QLineEdit()
+            valu.readOnly = True
+            valu.setStyleSheet("background-color: rgb(32,32,32); color: rgb(160,160,192); ")
+            mainLayout.addWidget(labl, row, 0, 1, 1)
+            mainLayout.addWidget(valu, row, 1, 1, 1)
+            return row,valu
+
+        #####################
+
+        sfmrow, self.sfmvalu = makeindic("Material SFM (Surface-Ft/Min)")
+        rpmrow, self.rpmvalu = makeindic("Material RPM (SFM * DIA * 12 / \N{GREEK SMALL LETTER PI} )")
+        iptrow, self.iptvalu = makeindic("Material FEED (in-tooth)")
+        ipmrow, self.ipmvalu = makeindic("Material FEED (in/min)")
+        mrrrow, self.mrrvalu = makeindic("Material RR (in^3/min)")
+        uhprow, self.uhpvalu = makeindic("Material UHP (unit-hp)")
+        hprrow, self.hprvalu = makeindic("Material HP (required)")
+        cycrow, self.cycvalu = makeindic("Cycle time (min, %g in/s\N{SUPERSCRIPT TWO} accel)" % cycletime.ACCEL)
+        if self.kind == "facing":
+            simrow, self.simvalu = makeindic("Face coverage (simulated)")
+
+        # speeds() entry -> (indicator, format)
+        self.indicators = {
+            "sfm": (self.sfmvalu, "%d"),
+            "rpm": (self.rpmvalu, "%d"),
+            "ipt": (self.iptvalu, "%g ... %g"),
+            "ipm": (self.ipmvalu, "%0.1f ... %0.1f"),
+            "mrr": (self.mrrvalu, "%0.1f ... %0.1f"),
+            "uhp": (self.uhpvalu, "%f"),
+            "hpr": (self.hprvalu, "%0.3f ... %0.3f"),
+        }
+
+        #####################
+
+        # only the lines in view are ever materialized
+        self.outedit = ProgramView( )
+        mainLayout.addWidget(self.outedit, 0, 2, cycrow-1, 1)
+
+        # toolpath preview, fed by the worker (needs numpy)
+        self.backplot = BackplotView()
+        mainLayout.addWidget(self.backplot, 0, 3, cycrow-1, 2)
+        self.plotview = QComboBox()
+        self.plotview.setStyleSheet("background-color: rgb(96,96,96); color: rgb(255,255,128); ")
+        self.plotview.addItem("Top view", "top")
+        self.plotview.addItem("Iso view", "iso")
+        self.plotview.activated.connect(
+            lambda i: self.backplot.setProjection(self.plotview.itemData(i)))
+        self.plotfirst = QSpinBox()
+        self.plotlast = QSpinBox()
+        for spin, prefix in ((self.plotfirst, "layers "), (self.plotlast, "to ")):
+            spin.setStyleSheet("background-color: rgb(96,96,96); color: rgb(255,255,128); ")
+            spin.setPrefix(prefix)
+            spin.setRange(1, 1)
+            spin.valueChanged.connect(self.plotLayers)
+        mainLayout.addWidget(self.plotview, cycrow-1, 3, 1, 2)
+        mainLayout.setColumnStretch(3, 1)
+        mainLayout.setColumnStretch(4, 1)
+        mainLayout.addWidget(self.plotfirst, cycrow, 3, 1, 1)
+        mainLayout.addWidget(self.plotlast, cycrow, 4, 1, 1)
+
+        outgen = QPushButton("Generate GCode" )
+        outgen.setStyleSheet("background-color: rgb(192, 184, 192); border-radius: 1; ")
+        mainLayout.addWidget(outgen, cycrow-1, 2, 1, 1)
+        outgen.pressed.connect(self.generate)
+
+        outwri = QPushButton("Write GCode" )
+        outwri.setStyleSheet("background-color: rgb(208, 176, 208); border-radius: 2; ")
+        mainLayout.addWidget(outwri, cycrow, 2, 1, 1)
+        outwri.pressed.connect(self.write)
+
+        progrow = rowpp()
+        self.genprog = QProgressBar()
+        self.genprog.setStyleSheet("background-color: rgb(32,32,32); color: rgb(160,160,192); ")
+        self.genprog.setFormat("idle")
+        self.genprog.setValue(0)
+        mainLayout.addWidget(self.genprog, progrow, 2, 1, 1)
+
+        outcan = QPushButton("Cancel" )
+        outcan.setStyleSheet("background-color: rgb(192, 160, 160); border-radius: 2; ")
+        mainLayout.addWidget(outcan, progrow, 1, 1, 1)
+        outcan.pressed.connect(self.cancel)
+
+        # regenerates on the refresh throttle, never per keystroke
+        self.autogen = QCheckBox("Auto generate")
+        self.autogen.toggled.connect(self.scheduleRefresh)
+        mainLayout.addWidget(self.autogen, progrow, 0, 1, 1)
+
+        gotorow = rowpp()
+        gotolabl = QLabel("Go to line / layer")
+        gotoline = QLineEdit()
+        gotoline.setStyleSheet("background-color: rgb(96,96,96); color: rgb(255,255,128); ")
+        def gotoLine():
+            try:
+              self.outedit.gotoLine(int(gotoline.text()))
+            except:
+              None
+        gotoline.returnPressed.connect(gotoLine)
+        self.gotolayer = QSpinBox()
+        self.gotolayer.setStyleSheet("background-color: rgb(96,96,96); color: rgb(255,255,128); ")
+        self.gotolayer.setPrefix("layer ")
+        self.gotolayer.setRange(1, 1)
+        self.gotolayer.valueChanged.connect(self.outedit.gotoLayer)
+        mainLayout.addWidget(gotolabl, gotorow, 0, 1, 1)
+        mainLayout.addWidget(gotoline, gotorow, 1, 1, 1)
+        mainLayout.addWidget(self.gotolayer, gotorow, 2, 1, 1)
+
+        profrow = rowpp()
+        self.deepprof = QCheckBox("Deep profile (cProfile, tracemalloc)")
+        self.deepprof.toggled.connect(self.setDeepProfile)
+        profbut = QPushButton("Profile report")
+        profbut.setStyleSheet("background-color: rgb(176, 184, 208); border-radius: 2; ")
+        profbut.pressed.connect(self.showProfile)
+        mainLayout.addWidget(self.deepprof, profrow, 0, 1, 2)
+        mainLayout.addWidget(profbut, profrow, 2, 1, 1)
+
+        # .ngc.gz / .ngc.xz writes, and .gcpk archives read back in
+        packrow = rowpp()
+        levellabl = QLabel("Compression level")
+        self.level = QSpinBox()
+        self.level.setStyleSheet("background-color: rgb(96,96,96); color: rgb(255,255,128); ")
+        self.level.setRange(-1, 9)
+        self.level.setSpecialValueText("default")
+        self.level.setValue(-1)
+        openpack = QPushButton("Open packed toolpath")
+        openpack.setStyleSheet("background-color: rgb(176, 208, 184); border-radius: 2; ")
+        openpack.pressed.connect(self.openPack)
+        mainLayout.addWidget(levellabl, packrow, 0, 1, 1)
+        mainLayout.addWidget(self.level, packrow, 1, 1, 1)
+        mainLayout.addWidget(openpack, packrow, 2, 1, 1)
+
+        #####################
+
+        self.setLayout(mainLayout)
+        self.setWindowTitle(self.title)
+        self.refresh()
+
+    ###################################
+
+    @property
+    def gcode(self):
+        # the program text as one str, built on demand from the viewer's store
+        return self.outedit.text()
+
+    @property
+    def material(self):
+        return self.cbox_mtl.currentText()
+
+    def params(self):
+        return JobParams.fromObject(self)
+
+    ###################################
+
+    def scheduleRefresh(self, *unused):
+        self.refreshTimer.start()
+
+    def refresh(self):
+        self.refreshTimer.stop()
+        with self.uiProf.stage("refresh"):
+            self.refreshBody()
+
+    def refreshBody(self):
+        try:
+          P = self.params()
+          S = None
+          for name, (valu, fmt) in self.indicators.items():
+            inputs = tuple(getattr(P, k) for k in gcodecore.SPEED_INPUTS[name])
+            if self.shown.get(name) == inputs:
+              continue
+            if S is None:
+              S = gcodecore.speeds(P)
+              setattr(self,"sfm",S["sfm"])
+            valu.setText(fmt % S[name])
+            self.shown[name] = inputs
+
+          # setting the text would come straight back through textChanged
+          try:
+            current = float(self.docXYedit.text())
+          except ValueError:
+            current = None
+          if current != self.docXY:
+            self.docXYedit.blockSignals(True)
+            self.docXYedit.setText("%g"%self.docXY)
+            self.docXYedit.blockSignals(False)
+
+          self.uiProf.note("refreshes", "cutdir<%s>", self.cutDir)
+
+          if self.autogen.isChecked() and (self.genParams is None
+                                           or P.asdict() != self.genParams.asdict()):
+            self.generate()
+
+        except:
+          None
+
+    ###################################
+
+    def xaxb(self):
+      return self.params().xaxb()
+
+    def yayb(self):
+      return self.params().yayb()
+
+    def zazb(self):
+      return self.params().zazb()
+
+    ###################################
+
+    def generate(self):
+        # runs on the window's worker thread, text streams in through
+        # genChunk(). a generate while one is running replaces it
+        try:
+            params = self.params()
+        except ValueError as e:
+            # e.g. a zero DOC typed in, the last program stays up
+            self.status("%s" % e)
+            return
+        self.genParams = params
+        self.outedit.clear()
+        self.backplot.clear()
+        self.cycvalu.setText("")
+        if self.kind == "facing":
+            self.simvalu.setText("")
+        self.genprog.setRange(0, 0)
+        self.genprog.setFormat("generating")
+        self.renderProf = gcodeprof.Profiler()
+        self.genJob = self.generator.start(self.genParams)
+
+    def cancel(self):
+        self.generator.cancel()
+        self.genJob = 0
+        self.genprog.setRange(0, 1)
+        self.genprog.setValue(0)
+        self.genprog.setFormat("cancelled")
+
+    def genChunk(self, job, text):
+        if job != self.genJob:
+            return
+        with self.renderProf.stage("render"):
+            self.outedit.append(text)
+
+    def genProgress(self, job, layers, nlayers, rings, nrings):
+        if job != self.genJob:
+            return
+        self.genprog.setRange(0, max(nrings, 1))
+        self.genprog.setValue(rings)
+        self.genprog.setFormat("layer %d/%d  ring %d/%d" % (layers, nlayers, rings, nrings))
+
+    def genFinished(self, job, nlines):
+        if job != self.genJob:
+            return
+        self.gotolayer.setRange(1, max(1, len(self.outedit.layers())))
+        self.genprog.setFormat("%d lines" % nlines)
+
+    def genEstimated(self, job, steady, accel):
+        if job != self.genJob:
+            return
+        self.cycvalu.setText("%0.1f ... %0.1f" % (steady, accel))
+
+    def genSimulated(self, job, report):
+        if job != self.genJob:
+            return
+        import gcodesim
+        self.simvalu.setText(gcodesim.formatReport(report))
+
+    def genPlotted(self, job, data):
+        if job != self.genJob:
+            return
+        self.showPlot(data)
+
+    def showPlot(self, data):
+        n = data.layers()
+        for spin in (self.plotfirst, self.plotlast):
+            spin.blockSignals(True)
+            spin.setRange(1, n)
+        self.plotfirst.setValue(1)
+        self.plotlast.setValue(n)
+        for spin in (self.plotfirst, self.plotlast):
+            spin.blockSignals(False)
+        self.backplot.setData(data)
+
+    def plotLayers(self, *unused):
+        first = self.plotfirst.value()
+        last = max(first, self.plotlast.value())
+        self.backplot.setLayers(first - 1, last - 1)
+
+    def genProfiled(self, job, prof):
+        if job != self.genJob:
+            return
+        # the text still arriving is queued ahead of this signal
+        prof.merge(self.renderProf)
+        self.lastProfile = prof.report()
+
+    def setDeepProfile(self, on):
+        self.generator.worker.deep = on
+
+    def profileReport(self):
+        # -> JSON-able: the last generation, the last write, the window
+        return {"generate": self.lastProfile, "write": self.writeProfile,
+                "window": self.uiProf.report()}
+
+    def showProfile(self):
+        report = self.profileReport()
+        parts = []
+        for name in ("generate", "write", "window"):
+            if report[name] is not None:
+                parts.append("%s:\n%s" % (name, gcodeprof.formatReport(report[name])))
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Profile report")
+        text = QPlainTextEdit()
+        text.setReadOnly(True)
+        text.setLineWrapMode(QPlainTextEdit.NoWrap)
+        text.setPlainText("\n\n".join(parts) or "nothing measured yet")
+        save = QPushButton("Save JSON")
+        def saveJson():
+            options = QFileDialog.Options()
+            options |= QFileDialog.DontUseNativeDialog
+            name = QFileDialog.getSaveFileName(dialog, "Save profile", "", "JSON Files (*.json)", options=options)[0]
+            if not name:
+                return
+            try:
+                with open(name, "w") as f:
+                    json.dump(report, f, indent=1)
+            except OSError as e:
+                log.warning("profile not saved: %s", e)
+        save.pressed.connect(saveJson)
+        layout = QVBoxLayout()
+        layout.addWidget(text)
+        layout.addWidget(save)
+        dialog.setLayout(layout)
+        dialog.resize(720, 480)
+        dialog.exec_()
+
+    def genFailed(self, job, message):
+        if job != self.genJob:
+            return
+        self.status("failed: %s" % message)
+
+    def closeEvent(self, event):
+        self.generator.shutdown()
+        super(GeneratorWindow, self).closeEvent(event)
+
+    def write(self):
+        options = QFileDialog.Options()
+        options |= QFileDialog.DontUseNativeDialog
+        savename = QFileDialog.getSaveFileName(self,"QFileDialog.getSaveFileName()","",
+                                               "GCode Files (*.ngc);;Compressed GCode (*.ngc.gz *.ngc.xz);;"
+                                               "Packed toolpath (*.gcpk)", options=options )
+        self.uiProf.note("writes", "save<%s>", savename[0])
+        if not savename[0] or self.genParams is None:
+          return
+        level = self.level.value() if self.level.value() >= 0 else None
+        # regenerate straight into the file rather than encoding self.gcode
+        prof = gcodeprof.Profiler(self.deepprof.isChecked())
+        prof.start()
+        try:
+          if savename[0].lower().endswith(".gcpk"):
+            import gcodepack
+            chunks = prof.wrap("generate", gcodecore.pathGenerator(self.kind)(self.genParams))
+            with prof.stage("pack"):
+              n, bodies, segments, nbytes = gcodepack.savePack(chunks, savename[0])
+            prof.count("segments", segments)
+          else:
+            lines = prof.wrap("generate", gcodecore.lineGenerator(self.kind)(self.genParams))
+            nlines, nbytes = gcodeprof.writeProgramFile(lines, savename[0], prof, level)
+            prof.count("lines", nlines)
+          prof.count("bytes", nbytes)
+          # view the written file (mmap) instead of the in-memory copy
+          if gcodeio.compression(savename[0]) is None and not savename[0].lower().endswith(".gcpk"):
+            self.outedit.openFile(savename[0])
+        except OSError as e:
+          self.status("failed: %s" % e)
+          return
+        finally:
+          prof.stop()
+        self.writeProfile = prof.report()
+        self.status("wrote %s" % os.path.basename(savename[0]))
+
+    def status(self, text):
+        # one line in the progress bar, it is idle
+        self.genprog.setRange(0, 1)
+        self.genprog.setValue(0)
+        self.genprog.setFormat(text)
+
+    def openPack(self):
+        # a .gcpk archive into the text view and backplot, nothing parsed.
+        # the window's job settings are not in it, write needs a generate
+        options = QFileDialog.Options()
+        options |= QFileDialog.DontUseNativeDialog
+        name = QFileDialog.getOpenFileName(self, "Open packed toolpath", "",
+                                           "Packed toolpath (*.gcpk)", options=options)[0]
+        if not name:
+          return
+        import gcodepack
+        self.generator.cancel()
+        self.genJob = 0
+        self.genParams = None
+        self.outedit.clear()
+        self.backplot.clear()
+        self.cycvalu.setText("")
+        if self.kind == "facing":
+            self.simvalu.setText("")
+        try:
+          with self.uiProf.stage("open"):
+            pack = gcodepack.Pack(name)
+            try:
+              chunks = list(pack.chunks())
+            finally:
+              pack.close()
+            nlines = 0
+            for text in emitText(chunks):
+              self.outedit.append(text)
+              nlines += text.count("\n")
+            try:
+              import gcodeplot
+            except ImportError:
+              gcodeplot = None
+            if gcodeplot is not None:
+              data = gcodeplot.PlotData()
+              for tp in chunks:
+                data.add(tp)
+              data.prepare()
+              self.showPlot(data)
+        except (OSError, ValueError) as e:
+          self.status("failed: %s" % e)
+          return
+        self.gotolayer.setRange(1, max(1, len(self.outedit.layers())))
+        self.genprog.setRange(0, 1)
+        self.genprog.setValue(1)
+        self.genprog.setFormat("%d lines from %s" % (nlines, os.path.basename(name)))
+
+#############################################################################
+
+def runGui(windowclass):
+    # GCODE_LOG=DEBUG shows every edit and refresh (they are counted in
+    # the profile report either way)
+    logging.basicConfig(level=getattr(logging, os.environ.get("GCODE_LOG", "WARNING").upper(), logging.WARNING))
+    app = QApplication(sys.argv)
+    win = windowclass()
+    win.setStyleSheet("background: rgb(160,160,174)")
+    win.show()
+    return app.exec_()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# Streaming gcode output
+# Copyright 2017 - Michael T. Mayers
+# Licensed under the GPLV3 - see https://www.gnu.org/licenses/gpl-3.0.html
+#
+# programs are produced as line generators (gcodecore.facingLines() etc),
+# these helpers batch them into fixed size byte chunks so a whole program
+# never has to exist in memory as one str.
+#
+# a path ending in .gz or .xz is compressed on the way out, chunk by
+# chunk, at the given level (gzip 0-9, xz preset 0-9, None = default).
+
+import os, sys, mmap
+from bisect import bisect_left, bisect_right
+
+CHUNKSIZE = 1<<16
+
+#############################################################################
+
+def iterChunks(lines, chunksize=CHUNKSIZE):
+    # utf-8 byte chunks of roughly chunksize, the first chunk goes out
+    # as soon as it fills, long before the toolpath is finished.
+    # items may be single lines or multi-line blocks
+    pending = []
+    size = 0
+    for line in lines:
+        pending.append(line)
+        size += len(line)
+        if size >= chunksize:
+            yield "".join(pending).encode("utf-8")
+            pending = []
+            size = 0
+    if pending:
+        yield "".join(pending).encode("utf-8")
+
+###################################
+
+def writeProgram(lines, dest, chunksize=CHUNKSIZE):
+    # dest: anything with write() (binary file, sys.stdout.buffer, BytesIO)
+    # or sendall() (socket). returns (lines, bytes) written
+    return writeChunks(iterChunks(lines, chunksize), dest)
+
+def writeChunks(chunks, dest):
+    # already encoded chunks (a stored program read back in blocks)
+    send = dest.sendall if hasattr(dest, "sendall") else dest.write
+    nlines = 0
+    nbytes = 0
+    for chunk in chunks:
+        send(chunk)
+        nlines += chunk.count(b"\n")
+        nbytes += len(chunk)
+    flush = getattr(dest, "flush", None)
+    if flush is not None:
+        flush()
+    return nlines, nbytes
+
+def readChunks(f, chunksize=CHUNKSIZE):
+    return iter(lambda: f.read(chunksize), b"")
+
+def writeProgramFile(lines, path, chunksize=CHUNKSIZE, level=None):
+    # (lines, bytes) are of the text, before any compression
+    if path in (None, "-"):
+        return writeProgram(lines, sys.stdout.buffer, chunksize)
+    with openOutput(path, level) as f:
+        return writeProgram(lines, f, chunksize)
+
+COMPRESSED = (".gz", ".xz")
+
+def compression(path):
+    # -> ".gz", ".xz" or None
+    ext = os.path.splitext(path or "")[1].lower()
+    return ext if ext in COMPRESSED else None
+
+def openOutput(path, level=None):
+    # binary file to write a program to, compressing by extension
+    ext = compression(path)
+    if ext == ".gz":
+        import gzip
+        return gzip.open(path, "wb", compresslevel=9 if level is None else level)
+    if ext == ".xz":
+        import lzma
+        return lzma.open(path, "wb", preset=6 if level is None else level)
+    return open(path, "wb")
+
+def openInput(path):
+    ext = compression(path)
+    if ext == ".gz":
+        import gzip
+        return gzip.open(path, "rb")
+    if ext == ".xz":
+        import lzma
+        return lzma.open(path, "rb")
+    return open(path, "rb")
+
+#############################################################################
+# line addressed program storage
+#
+# a LineStore holds a program as byte blocks: appended while a program
+# streams in, or slices of an mmap()ed file. per block only its start
+# offset and the number of newlines before it are kept, so finding line
+# n is a bisect plus one block split and nothing is ever held as one
+# line per object. 10M lines of file cost a few hundred index entries.
+#############################################################################
+
+FILEBLOCK = 1<<18
+
+class LineStore(object):
+
+    def __init__(self):
+        self.blocks = []
+        self.starts = []     # byte offset of each block
+        self.before = []     # newlines before each block
+        self.size = 0
+        self.newlines = 0
+        self.split = (None, None)  # (block index, line start offsets) of the last lookup
+        self.mm = None
+
+    def append(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if not data:
+            return
+        self.blocks.append(data)
+        self.starts.append(self.size)
+        self.before.append(self.newlines)
+        self.size += len(data)
+        self.newlines += data.count(b"\n")
+
+    @classmethod
+    def fromFile(cls, path, blocksize=FILEBLOCK):
+        # mmap the file, blocks are zero copy slices of it
+        store = cls()
+        with open(path, "rb") as f:
+            if f.seek(0, 2) == 0:
+                return store
+            store.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(store.mm)
+        for a in range(0, len(store.mm), blocksize):
+            block = view[a:a+blocksize]
+            store.blocks.append(block)
+            store.starts.append(a)
+            store.before.append(store.newlines)
+            store.size += len(block)
+            store.newlines += store.mm[a:a+blocksize].count(b"\n")
+        return store
+
+    def close(self):
+        self.blocks = []
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+
+    ###################################
+
+    def lineCount(self):
+        if self.size == 0:
+            return 0
+        last = self.blocks[-1]
+        return self.newlines + (0 if last[len(last)-1:] == b"\n" else 1)
+
+    def blockLines(self, i):
+        # start offsets (within block i) of the lines that start in it
+        if self.split[0] != i:
+            block = bytes(self.blocks[i])
+            offsets = [0] if i == 0 else []
+            p = block.find(b"\n")
+            while p >= 0:
+                offsets.append(p+1)
+                p = block.find(b"\n", p+1)
+            self.split = (i, offsets)
+        return self.split[1]
+
+    def lineOffset(self, n):
+        # byte offset where line n starts
+        if n <= 0:
+            return 0
+        # line n starts right after newline number n (1 based)
+        i = bisect_left(self.before, n) - 1
+        return self.starts[i] + self.blockLines(i)[n - self.before[i] - (1 if i else 0)]
+
+    def read(self, offset, size):
+        out = []
+        i = bisect_right(self.starts, offset) - 1
+        while size > 0 and 0 <= i < len(self.blocks):
+            a = offset - self.starts[i]
+            piece = bytes(self.blocks[i][a:a+size])
+            out.append(piece)
+            size -= len(piece)
+            offset += len(piece)
+            i += 1
+        return b"".join(out)
+
+    def lines(self, first, count):
+        # lines first ... first+count-1 as str (no newlines)
+        n = self.lineCount()
+        last = min(first + count, n)
+        if first >= last:
+            return []
+        a = self.lineOffset(first)
+        b = self.lineOffset(last) if last < n else self.size
+        return self.read(a, b - a).decode("utf-8", "replace").splitlines()
+
+    def findLines(self, pattern):
+        # line numbers of every line containing pattern (bytes)
+        out = []
+        for i, block in enumerate(self.blocks):
+            data = bytes(block)
+            # a match may straddle into the following block(s)
+            data += self.read(self.starts[i] + len(block), len(pattern)-1)
+            p = data.find(pattern)
+            while 0 <= p < len(block):
+                n = self.before[i] + data.count(b"\n", 0, p)
+                if not out or out[-1] != n: # a line running over from the last block
+                    out.append(n)
+                p = data.find(b"\n", p)
+                if p < 0:
+                    break
+                p = data.find(pattern, p)
+        return out
+
+    def text(self):
+        return b"".join(bytes(b) for b in self.blocks).decode("utf-8")
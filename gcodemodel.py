@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# Incremental program rebuilds
+# Copyright 2017 - Michael T. Mayers
+# Licensed under the GPLV3 - see https://www.gnu.org/licenses/gpl-3.0.html
+#
+# the expensive part of a program is its layer template (rings / the
+# rectangle at one Z), everything else - head, one plunge per layer,
+# tail, o-word wrapping - is a handful of lines. a ProgramModel keeps the
+# template of the last program and only rebuilds it when a parameter it
+# depends on changes:
+#
+#   template   x1 x2 y1 y2 docXY cutDir strategy resolution (+ kind, engine)
+#   feed       feedRate: the cached template is re-fed (f column patched)
+#   layers     z1 z2 docZ safeZ layerMode: new chunks around the same
+#              template, whose text is reused as is
+#
+# toolDiam, flutes and material only change the speeds indicators.
+
+import math
+
+import gcodecore
+from gcodecore import Grid
+from gcodeemit import emitText
+
+TEMPLATE_PARAMS = ("x1", "x2", "y1", "y2", "docXY", "cutDir", "strategy", "resolution")
+
+#############################################################################
+
+class ProgramModel(object):
+
+    def __init__(self, kind, engine="auto"):
+        self.kind = kind
+        self.engine = engine
+        self.template = None
+        self.geometry = None
+        self.textCache = {}
+        self.rebuilds = 0
+        self.refeeds = 0
+        self.reuses = 0
+
+    def geometryOf(self, params):
+        # what the template depends on, as the generators see it (-0.0 is
+        # not 0.0 here, %g writes it as -0)
+        g = Grid(params)
+        corners = [(v, math.copysign(1.0, v)) for v in (g.xa, g.xb, g.ya, g.yb)]
+        return (g.decimals, corners, g.docXY, params.cutDir, params.strategy)
+
+    def layerTemplate(self, params):
+        geometry = self.geometryOf(params)
+        feed = Grid(params).feedRate
+        if geometry != self.geometry:
+            self.template = gcodecore.templateGenerator(self.kind, self.engine)(params)
+            self.geometry = geometry
+            self.textCache = {}
+            self.rebuilds += 1
+        elif feed != self.template.start[3]:
+            self.template = self.template.withFeed(feed)
+            self.textCache = {}
+            self.refeeds += 1
+        else:
+            self.reuses += 1
+        return self.template
+
+    def invalidate(self):
+        self.template = None
+        self.geometry = None
+        self.textCache = {}
+
+    ###################################
+
+    def chunks(self, params):
+        template = self.layerTemplate(params)
+        return gcodecore.pathGenerators[self.kind](params, template)
+
+    def lines(self, params):
+        return emitText(self.chunks(params), self.textCache)
+
+    def text(self, params):
+        return "".join(self.lines(params))
+
+    def stats(self):
+        return {"rebuilds": self.rebuilds, "refeeds": self.refeeds, "reuses": self.reuses}
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# Packed toolpath archives
+# Copyright 2017 - Michael T. Mayers
+# Licensed under the GPLV3 - see https://www.gnu.org/licenses/gpl-3.0.html
+#
+# a .gcpk file keeps a program as its Toolpath chunks, for archiving and
+# for loading back without parsing any text:
+#
+#   header   magic "GCPK", u32 version, u64 index offset, u32 index length
+#   columns  per body: motion / words / role as bytes, x y z f packed,
+#            every column 8 byte aligned
+#   index    json: byteorder, decimals, per body its segment count and
+#            columns ([typecode, offset] or [const value]), per chunk its
+#            pre / post lines, which body it is and its start (left
+#            out when it is where the chunk before ended)
+#
+# a body is the segments of a chunk. a chunk stamped from a layer
+# template (same key, same XY, one Z) refers to the body of the first
+# chunk with that key plus its Z, so every Z layer after the first costs
+# a few bytes. coordinate columns are packed as
+#
+#   const    one value in the index (a layer's Z, the feed rate)
+#   float32  when every value is exactly a float32
+#   int32    fixed point toolpaths, when the counts fit (UNSET -> INT32_MIN)
+#   float64 / int64 otherwise
+#
+# so a pack holds the very values it was made from, and whatever writer
+# (any precision) makes the same text from it.
+# chunks are written as they are generated (the index goes last), Pack
+# mmap()s the file and column() hands out zero copy memoryviews.
+
+import sys, json, mmap, struct
+from array import array
+
+from toolpath import Toolpath, FIELDS, UNSET
+
+MAGIC = b"GCPK"
+VERSION = 1
+HEADER = struct.Struct("<4sIQI")
+ALIGN = 8
+
+NAMES = [name for name, code in FIELDS]
+INT32_MIN = -(1<<31)
+
+#############################################################################
+# writing
+
+def packColumn(col, decimals):
+    # -> (typecode, bytes) or ("const", value)
+    if col.typecode not in ("d", "q"):
+        return col.typecode, col.tobytes()
+    if len(col):
+        c = col[0]
+        if c == c and col.count(c) == len(col):
+            return "const", c
+        if c != c and all(v != v for v in col):
+            return "const", None
+    if decimals is None:
+        small = array("f", col)
+        if array("d", small) == col:
+            return "f", small.tobytes()
+        return "d", col.tobytes()
+    values = col
+    if col.count(UNSET):
+        values = [INT32_MIN if v == UNSET else v for v in col]
+    try:
+        if col.count(INT32_MIN):
+            raise OverflowError
+        return "i", array("i", values).tobytes()
+    except OverflowError:
+        return "q", col.tobytes()
+
+def startValues(position):
+    return [None if v != v or v == UNSET else v for v in position]
+
+def stamped(tp, body):
+    # z of tp when it is body at one height, else None
+    if len(tp) != len(body) or len(tp) == 0:
+        return None
+    z = tp.z[0]
+    if z != z or tp.z.count(z) != len(tp):
+        return None
+    for name, code in FIELDS:
+        if name != "z" and getattr(tp, name) != getattr(body, name):
+            return None
+    return z
+
+class PackWriter(object):
+
+    def __init__(self, f):
+        self.f = f
+        self.bodies = []
+        self.chunks = []
+        self.keys = {}      # chunk key -> (body index, its toolpath)
+        self.decimals = None
+        self.segments = 0
+        self.cursor = None
+        f.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+
+    def add(self, tp):
+        if not self.chunks:
+            self.decimals = tp.decimals
+        elif tp.decimals != self.decimals:
+            raise ValueError("can't mix toolpaths with different resolutions")
+        record = {}
+        start = startValues(tp.start)
+        if start != self.cursor:
+            record["start"] = start
+        self.cursor = startValues(tp.cursor())
+        if tp.pre:
+            record["pre"] = tp.pre
+        if tp.post:
+            record["post"] = tp.post
+        self.segments += len(tp)
+        known = self.keys.get(tp.key) if tp.key is not None else None
+        z = stamped(tp, known[1]) if known is not None else None
+        if z is not None:
+            record["body"] = known[0]
+            record["z"] = None if z == UNSET else z
+        else:
+            record["body"] = self.addBody(tp)
+            if tp.key is not None:
+                record["keyed"] = True
+                if known is None:
+                    self.keys[tp.key] = (record["body"], tp)
+        self.chunks.append(record)
+
+    def addBody(self, tp):
+        columns = []
+        for name, code in FIELDS:
+            kind, data = packColumn(getattr(tp, name), tp.decimals)
+            if kind == "const":
+                columns.append([data])
+                continue
+            pad = -self.f.tell() % ALIGN
+            self.f.write(b"\0"*pad)
+            columns.append([kind, self.f.tell()])
+            self.f.write(data)
+        self.bodies.append([len(tp), columns])
+        return len(self.bodies) - 1
+
+    def close(self):
+        index = json.dumps({
+            "byteorder": sys.byteorder, "decimals": self.decimals,
+            "segments": self.segments, "bodies": self.bodies, "chunks": self.chunks,
+        }, separators=(",", ":")).encode("utf-8")
+        pad = -self.f.tell() % ALIGN
+        self.f.write(b"\0"*pad)
+        offset = self.f.tell()
+        self.f.write(index)
+        self.f.seek(0)
+        self.f.write(HEADER.pack(MAGIC, VERSION, offset, len(index)))
+        self.f.seek(0, 2)
+
+def packing(chunks, path):
+    # pass chunks through, packing them into path on the way
+    with open(path, "wb") as f:
+        w = PackWriter(f)
+        for tp in chunks:
+            w.add(tp)
+            yield tp
+        w.close()
+
+def savePack(chunks, path):
+    # -> (chunks, bodies, segments, bytes) of the file written
+    with open(path, "wb") as f:
+        w = PackWriter(f)
+        for tp in chunks:
+            w.add(tp)
+        w.close()
+        return len(w.chunks), len(w.bodies), w.segments, f.tell()
+
+#############################################################################
+# reading
+
+class Pack(object):
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, offset, size = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("not a packed toolpath file")
+        if version != VERSION:
+            self.close()
+            raise ValueError("unsupported packed toolpath version <%d>" % version)
+        index = json.loads(self.map[offset:offset+size].decode("utf-8"))
+        self.swap = index["byteorder"] != sys.byteorder
+        self.decimals = index["decimals"]
+        self.segments = index["segments"]
+        self.bodies = index["bodies"]
+        self.records = index["chunks"]
+        self.view = memoryview(self.map)
+        self.loaded = {}    # body index -> Toolpath
+
+    def close(self):
+        if getattr(self, "view", None) is not None:
+            self.view.release()
+            self.view = None
+        self.map.close()
+
+    def __len__(self):
+        return len(self.records)
+
+    ###################################
+
+    def column(self, body, name):
+        # zero copy memoryview of a packed column (in the file's byte
+        # order), or the value of a const one
+        n, columns = self.bodies[body]
+        col = columns[NAMES.index(name)]
+        if len(col) == 1:
+            return col[0]
+        code, offset = col
+        return self.view[offset:offset + n*struct.calcsize(code)].cast(code)
+
+    def body(self, i):
+        # body i as a Toolpath (the same one every time, keyed so the
+        # chunks made from it format once)
+        tp = self.loaded.get(i)
+        if tp is not None:
+            return tp
+        tp = Toolpath(None, self.decimals)
+        n = self.bodies[i][0]
+        unset = tp.unset
+        for name, code in tp.fields():
+            target = getattr(tp, name)
+            values = self.column(i, name)
+            if not isinstance(values, memoryview):
+                target.extend([unset if values is None else values]*n)
+                continue
+            packed = array(values.format, values)
+            if self.swap:
+                packed.byteswap()
+            if packed.typecode == "i":
+                packed = [UNSET if v == INT32_MIN else v for v in packed]
+            elif packed.typecode != code:
+                packed = array(code, packed)
+            target.extend(packed)
+        tp.key = object()
+        self.loaded[i] = tp
+        return tp
+
+    def chunks(self):
+        # the program's Toolpath chunks, as they were packed
+        cursor = None
+        for record in self.records:
+            body = self.body(record["body"])
+            start = cursor
+            if "start" in record:
+                start = tuple(body.unset if v is None else v for v in record["start"])
+            if "z" in record:
+                tp = body.atZ(body.unset if record["z"] is None else record["z"], start)
+            else:
+                tp = Toolpath(start, self.decimals)
+                for name, code in FIELDS:
+                    setattr(tp, name, getattr(body, name)[:])
+                if record.get("keyed"):
+                    tp.key = body.key
+            tp.pre = list(record.get("pre", ()))
+            tp.post = list(record.get("post", ()))
+            cursor = tp.cursor()
+            yield tp
+
+def loadPack(path):
+    # -> list of chunks, the file is closed again
+    pack = Pack(path)
+    try:
+        return list(pack.chunks())
+    finally:
+        pack.close()
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+# Gcode text -> Toolpath (NumPy)
+# Copyright 2017 - Michael T. Mayers
+# Licensed under the GPLV3 - see https://www.gnu.org/licenses/gpl-3.0.html
+#
+# reads .ngc files (ours or anyone's) back into toolpath columns. the
+# file is mmap()ed and worked in blocks that end on a newline, every
+# block as whole byte arrays - no str, no object per line or word:
+#
+#   comments ( ) and ; are masked, blanks dropped, letters upper cased
+#   (but the e of a %g exponent, those few words go through float())
+#   every letter starts a word, the numbers of all words are read as
+#   one matrix, a column (digit position) at a time
+#   per line the last G0/G1/G2/G3 and X Y Z F words, carried forward
+#   modally across lines and blocks
+#
+# every line with an X, Y or Z word becomes a segment; arcs (G2/G3) as
+# their chord. the move comments gcodeemit writes bring the segment
+# roles back, so a parsed program emits the same motion lines again.
+# not interpreted: o-word flow, parameters / expressions (counted as bad
+# words), G90/G91 (absolute assumed) and the non motion axis words of
+# G10 G28 G30 G92 lines.
+
+import mmap, time, traceback
+
+import numpy as np
+
+from toolpath import Toolpath, RAPID, FEED, W_X, W_Y, W_Z, W_F, ROLE_NOTES
+
+PARSEBLOCK = 1<<18     # small enough that a block's temporaries stay in cache
+
+NONMOTION = (10, 28, 30, 92)
+
+# comment (length, first, last byte) -> role, for gcodeemit's own notes
+NOTEROLES = {(len(note), ord(note[0]), ord(note[-1])): role
+             for role, note in enumerate(ROLE_NOTES) if note}
+
+#############################################################################
+
+class Column(object):
+    # growable numpy array, doubles when full
+
+    def __init__(self, dtype, capacity=1024):
+        self.data = np.empty(max(capacity, 16), dtype=dtype)
+        self.n = 0
+
+    def extend(self, values):
+        need = self.n + len(values)
+        if need > len(self.data):
+            grown = np.empty(max(need, 2*len(self.data)), dtype=self.data.dtype)
+            grown[:self.n] = self.data[:self.n]
+            self.data = grown
+        self.data[self.n:need] = values
+        self.n = need
+
+    def values(self):
+        return self.data[:self.n]
+
+class Parser(object):
+
+    def __init__(self, capacity=1024):
+        self.columns = {name: Column(dtype, capacity) for name, dtype in
+                        (("motion", np.int8), ("words", np.uint8), ("role", np.uint8),
+                         ("x", np.float64), ("y", np.float64), ("z", np.float64),
+                         ("f", np.float64), ("line", np.int64))}
+        # modal state carried from block to block
+        self.state = {"motion": RAPID, "x": np.nan, "y": np.nan, "z": np.nan, "f": np.nan}
+        self.lines = 0
+        self.bytes = 0
+        self.arcs = 0
+        self.badWords = 0
+        self.seconds = 0.0
+
+    ###################################
+
+    def feed(self, data):
+        # one block of whole lines (a missing last newline is supplied)
+        t0 = time.perf_counter()
+        buf = np.frombuffer(data, dtype=np.uint8)
+        if len(buf) and buf[-1] != 10:
+            buf = np.append(buf, np.uint8(10))
+        if len(buf):
+            self.parse(buf)
+        self.bytes += len(data)
+        self.seconds += time.perf_counter() - t0
+
+    def parse(self, buf):
+        n = len(buf)
+        nlpos = np.flatnonzero(buf == 10)
+        nlines = len(nlpos)
+        opens = np.flatnonzero(buf == 40)
+        closes = np.flatnonzero(buf == 41)
+        roles = self.noteRoles(buf, nlpos, opens, closes)
+        # comments as [start, end) ranges: ( to the next ) or, unclosed, to
+        # the end of its line; ; to the newline
+        j = np.searchsorted(closes, opens)
+        cend = np.full(len(opens), n, dtype=np.int64)
+        closed = j < len(closes)
+        cend[closed] = closes[j[closed]] + 1
+        cend = np.minimum(cend, nlpos[np.searchsorted(nlpos, opens)])
+        semi = np.flatnonzero(buf == 59)
+        if len(semi) and len(opens):
+            k = np.searchsorted(opens, semi, side="right") - 1
+            semi = semi[(k < 0) | (semi >= cend[np.maximum(k, 0)])]
+        send = nlpos[np.searchsorted(nlpos, semi)]
+        keep = buf > 32
+        if len(opens) or len(semi):
+            keep &= ~spans(np.concatenate((opens, semi)), np.concatenate((cend, send)), n)
+        keep |= buf == 10
+        c = buf[keep]
+        # %g exponents ("6.4e-05") are no E words
+        e = np.flatnonzero(c[1:-1] == 101) + 1
+        e = e[(((c[e-1] >= 48) & (c[e-1] <= 57)) | (c[e-1] == 46)) &
+              ((c[e+1] == 45) | (c[e+1] == 43))]
+        u = c | 32
+        letter = (u >= 97) & (u <= 122)
+        letter[e] = False
+        nl = c == 10
+        bounds = np.flatnonzero(letter | nl)
+        at = np.flatnonzero(letter[bounds])
+        starts = bounds[at]
+        ends = bounds[at + 1]
+        lineOf = at - np.arange(len(at))   # newlines among the bounds before
+        value, bad = numbers(c, starts + 1, ends)
+        for k in np.unique(np.searchsorted(starts, e) - 1):
+            try:
+                value[k] = float(c[starts[k]+1:ends[k]].tobytes())
+                bad[k] = False
+            except ValueError:
+                pass
+        self.badWords += int(np.count_nonzero(bad))
+        self.collect(c[starts] & 0xdf, value, lineOf, nlines, roles)
+
+    def noteRoles(self, buf, nlpos, opens, closes):
+        # role per line from the first comment on it, if it is one of
+        # gcodeemit's move notes
+        roles = np.zeros(len(nlpos), dtype=np.uint8)
+        if len(opens) == 0 or len(closes) == 0:
+            return roles
+        lineOf = np.searchsorted(nlpos, opens)
+        lines, i = np.unique(lineOf, return_index=True)
+        opens = opens[i]
+        j = np.searchsorted(closes, opens)
+        ok = j < len(closes)
+        lines, opens = lines[ok], opens[ok]
+        closes = closes[j[ok]]
+        ok = (np.searchsorted(nlpos, closes) == lines) & (closes - opens > 1)
+        lines, opens, closes = lines[ok], opens[ok], closes[ok]
+        length = closes - opens - 1
+        firstc = buf[opens + 1]
+        lastc = buf[closes - 1]
+        for (n, a, z), role in NOTEROLES.items():
+            roles[lines[(length == n) & (firstc == a) & (lastc == z)]] = role
+        return roles
+
+    def collect(self, letters, values, lineOf, nlines, roles):
+        # word arrays -> segments, modal across lines
+        ok = ~np.isnan(values)
+        g = ok & (letters == 71)
+        gline = lineOf[g]
+        gval = values[g]
+        motion = np.full(nlines, -1, dtype=np.int64)
+        moving = np.isin(gval, (0, 1, 2, 3))
+        motion[gline[moving]] = gval[moving]
+        self.arcs += int(np.count_nonzero(moving & (gval >= 2)))
+        skip = np.zeros(nlines, dtype=bool)
+        skip[gline[np.isin(gval, NONMOTION)]] = True
+        words = np.zeros(nlines, dtype=np.uint8)
+        state = self.state
+        cols = {}
+        ok &= ~skip[lineOf]
+        for name, bit, code in (("x", W_X, 88), ("y", W_Y, 89), ("z", W_Z, 90), ("f", W_F, 70)):
+            sel = ok & (letters == code)
+            col = np.full(nlines + 1, np.nan)
+            col[0] = state[name]
+            col[lineOf[sel] + 1] = values[sel]
+            words[lineOf[sel]] |= bit
+            cols[name] = ffill(col)[1:]
+            state[name] = cols[name][-1]
+        motion = np.concatenate(([state["motion"]], motion))
+        at = np.where(motion >= 0, np.arange(nlines + 1), 0)
+        motion = motion[np.maximum.accumulate(at)][1:]
+        state["motion"] = int(motion[-1])
+        seg = np.flatnonzero((words & (W_X|W_Y|W_Z)).astype(bool) & ~skip)
+        C = self.columns
+        C["motion"].extend(np.where(motion[seg] == RAPID, RAPID, FEED))
+        C["words"].extend(words[seg])
+        C["role"].extend(roles[seg])
+        for name in ("x", "y", "z", "f"):
+            C[name].extend(cols[name][seg])
+        C["line"].extend(seg + self.lines)
+        self.lines += nlines
+
+    ###################################
+
+    def toolpath(self):
+        C = self.columns
+        return Toolpath.fromArrays(*[C[name].values() for name in
+                                     ("motion", "words", "role", "x", "y", "z", "f")])
+
+    def lineNumbers(self):
+        # 0 based source line of every segment
+        return self.columns["line"].values()
+
+    def stats(self):
+        return {
+            "lines": self.lines,
+            "bytes": self.bytes,
+            "segments": self.columns["motion"].n,
+            "arcs": self.arcs,
+            "badWords": self.badWords,
+            "seconds": self.seconds,
+            "mbps": self.bytes/self.seconds/1e6 if self.seconds else 0.0,
+        }
+
+#############################################################################
+
+def spans(starts, ends, n):
+    # bool mask of the union of [start, end) ranges
+    order = np.argsort(starts, kind="stable")
+    starts = starts[order]
+    reach = np.maximum.accumulate(ends[order])
+    new = np.ones(len(starts), dtype=bool)
+    new[1:] = starts[1:] >= reach[:-1]
+    first = np.flatnonzero(new)
+    a = starts[first]
+    b = np.minimum(reach[np.append(first[1:] - 1, len(starts) - 1)], n)
+    # alternating runs out / in / out ... as one repeat
+    edges = np.empty(2*len(a) + 2, dtype=np.int64)
+    edges[0] = 0
+    edges[1:-1:2] = a
+    edges[2:-1:2] = b
+    edges[-1] = n
+    flags = np.zeros(len(edges) - 1, dtype=bool)
+    flags[1::2] = True
+    return np.repeat(flags, np.diff(edges))
+
+def numbers(c, a, b, width=24):
+    # the numbers in c[a:b] of all words at once, one digit position
+    # (column) at a time, longest words first so column j only looks at
+    # the words that long: -> (value, bad)
+    n = len(a)
+    length = np.minimum(b - a, width).astype(np.uint8)
+    order = np.argsort(~length, kind="stable")
+    longer = n - np.cumsum(np.bincount(length, minlength=width + 1))
+    at = a[order]
+    length = length[order]
+    mant = np.zeros(n)
+    ok = np.ones(n, dtype=bool)
+    dots = np.zeros(n, dtype=np.uint8)
+    dotAt = np.zeros(n, dtype=np.uint8)
+    neg = np.zeros(n, dtype=bool)
+    sign = np.zeros(n, dtype=bool)
+    for j in range(width):
+        m = longer[j]
+        if m == 0:
+            break
+        ch = c[at[:m] + j]
+        d = ch - np.uint8(48)
+        digit = d <= 9  # uint8: below "0" wraps around
+        part = mant[:m]
+        np.copyto(part, part*10.0 + d, where=digit)
+        isdot = ch == 46
+        dots[:m] += isdot
+        np.copyto(dotAt[:m], j, where=isdot)
+        if j == 0:
+            neg[:m] = ch == 45
+            sign[:m] = neg[:m] | (ch == 43)
+            ok[:m] = digit | isdot | sign[:m]
+        else:
+            ok[:m] &= digit | isdot
+    ok &= (dots <= 1) & (length > dots + sign)
+    frac = np.where(dots > 0, length - dotAt - 1, 0)
+    mant /= 10.0**frac
+    mant[neg] *= -1.0
+    value = np.empty(n)
+    value[order] = mant
+    bad = np.empty(n, dtype=bool)
+    bad[order] = ~ok
+    bad |= (b - a) > width
+    value[bad] = np.nan
+    return value, bad
+
+def ffill(col):
+    # nan -> the last value before it
+    at = np.where(np.isnan(col), 0, np.arange(len(col)))
+    return col[np.maximum.accumulate(at)]
+
+def blocks(view, blocksize=PARSEBLOCK):
+    # slices of whole lines, about blocksize each
+    a = 0
+    n = len(view)
+    while a < n:
+        b = a + blocksize
+        while b < n:
+            cut = bytes(view[b-1:b+4095]).find(b"\n")
+            if cut >= 0:
+                b += cut
+                break
+            b += 4096
+        b = min(b, n)
+        yield view[a:b]
+        a = b
+
+def parseBytes(data, blocksize=PARSEBLOCK):
+    p = Parser(len(data)//24)
+    for block in blocks(memoryview(data), blocksize):
+        p.feed(block)
+    return p
+
+def parseFile(path, blocksize=PARSEBLOCK):
+    with open(path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return Parser()
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mm)
+    try:
+        p = Parser(len(mm)//24)
+        for block in blocks(view, blocksize):
+            try:
+                p.feed(block)
+            finally:
+                block.release()
+    except BaseException as e:
+        # the frames of the traceback still hold arrays over the map
+        traceback.clear_frames(e.__traceback__)
+        raise
+    finally:
+        view.release()
+        mm.close()
+    return p
+
+def readToolpath(path):
+    return parseFile(path).toolpath()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# Backplot data: segment buffers and their levels of detail (NumPy)
+# Copyright 2017 - Michael T. Mayers
+# Licensed under the GPLV3 - see https://www.gnu.org/licenses/gpl-3.0.html
+#
+# built from Toolpath chunks, never from text. a layer template stamped
+# at every Z is one buffer plus a list of (z, layer) instances, the few
+# other moves (head, plunges, tail) one more buffer, so a 1000 layer
+# program costs about one layer here too.
+#
+# a buffer is drawn projected onto a plane (top or iso). per projection
+# it keeps LEVELS decimated copies: endpoints snapped to a square grid,
+# the cell doubling from one level to the next, duplicate segments
+# dropped. a view picks the level whose cell is about a pixel, so what
+# gets drawn is bounded by the pixels it covers, not by the program.
+# every copy is sorted along u and cut into blocks with bounding boxes
+# so a zoomed in view skips what is off screen.
+
+import math
+
+import numpy as np
+
+from toolpath import RAPID
+
+LEVELS = 10
+FINEST = 1.0/8192   # level 0 cell, of the plot's extent
+BLOCK = 1<<14       # segments per culling block
+
+COS30 = math.cos(math.radians(30))
+
+# world (x, y, z) -> plane (u, v), v up
+PROJECTIONS = {
+    "top": ((1.0, 0.0, 0.0), (0.0, 1.0, 0.0)),
+    "iso": ((COS30, -COS30, 0.0), (0.5, 0.5, 1.0)),
+}
+
+#############################################################################
+
+class Lod(object):
+    # one level of one buffer: feed and rapid segments as (n, 4) u0 v0 u1 v1
+    # rows, each in blocks: (first, last, umin, vmin, umax, vmax)
+
+    def __init__(self, feeds, rapids):
+        self.feeds, self.feedBlocks = blocks(feeds)
+        self.rapids, self.rapidBlocks = blocks(rapids)
+
+    def __len__(self):
+        return len(self.feeds) + len(self.rapids)
+
+def blocks(S):
+    # -> (S sorted along u, its blocks)
+    S = np.ascontiguousarray(S[np.argsort(S[:,0], kind="stable")])
+    out = []
+    for a in range(0, len(S), BLOCK):
+        B = S[a:a+BLOCK]
+        out.append((a, a + len(B),
+                    float(np.minimum(B[:,0], B[:,2]).min()), float(np.minimum(B[:,1], B[:,3]).min()),
+                    float(np.maximum(B[:,0], B[:,2]).max()), float(np.maximum(B[:,1], B[:,3]).max())))
+    return S, out
+
+class Buffer(object):
+
+    def __init__(self, S, rapid):
+        self.S = S          # (n, 6) x0 y0 z0 x1 y1 z1
+        self.rapid = rapid  # (n,) bool
+        self.cache = {}
+        if len(S):
+            E = np.vstack((S[:,:3], S[:,3:]))
+            self.lo, self.hi = np.nanmin(E, axis=0), np.nanmax(E, axis=0)
+
+    def __len__(self):
+        return len(self.S)
+
+    def projected(self, projection):
+        (a, b, c), (d, e, f) = PROJECTIONS[projection]
+        S = self.S
+        return np.column_stack((a*S[:,0] + b*S[:,1] + c*S[:,2], d*S[:,0] + e*S[:,1] + f*S[:,2],
+                                a*S[:,3] + b*S[:,4] + c*S[:,5], d*S[:,3] + e*S[:,4] + f*S[:,5]))
+
+    def lod(self, projection, level, cell):
+        # level -1 is every segment
+        ck = (projection, level)
+        out = self.cache.get(ck)
+        if out is None:
+            P = self.projected(projection)
+            if level >= 0:
+                out = Lod(snap(P[~self.rapid], cell), snap(P[self.rapid], cell))
+            else:
+                out = Lod(P[~self.rapid], P[self.rapid])
+            self.cache[ck] = out
+        return out
+
+def snap(P, cell):
+    # endpoints to cell centres, each segment once whichever way round
+    if len(P) == 0:
+        return P
+    Q = np.floor(P/cell).astype(np.int64)
+    swap = (Q[:,0] > Q[:,2]) | ((Q[:,0] == Q[:,2]) & (Q[:,1] > Q[:,3]))
+    Q[swap] = Q[swap][:,[2,3,0,1]]
+    Q = np.unique(Q, axis=0)
+    return (Q + 0.5)*cell
+
+#############################################################################
+
+class PlotData(object):
+
+    def __init__(self):
+        self.templates = {}  # key -> Buffer, z = 0
+        self.instances = []  # (key, z, layer)
+        self.free = []       # (segments, rapid, layer) of the other chunks
+        self.layer = 0
+        self.filtered = {}
+        self.lo = None
+        self.hi = None
+
+    ###################################
+
+    def add(self, tp):
+        if tp.key is not None:
+            # a stamped layer: only its Z is new
+            if len(tp) == 0:
+                return
+            z = tp.value(tp.z[0])
+            if z != z:
+                return  # o-word body, no Z of its own
+            buf = self.templates.get(tp.key)
+            if buf is None:
+                S, rapid = segments(tp)
+                S[:,[2,5]] -= z
+                buf = self.templates[tp.key] = Buffer(S, rapid)
+            self.grow(buf, z)
+            self.instances.append((tp.key, z, self.layer))
+            self.layer += 1
+            return
+        S, rapid = segments(tp)
+        if len(S):
+            self.free.append((S, rapid, self.layer))
+            self.grow(Buffer(S, rapid), 0.0)
+
+    def tap(self, chunks):
+        for tp in chunks:
+            self.add(tp)
+            yield tp
+
+    def grow(self, buf, z):
+        lo = buf.lo + (0, 0, z)
+        hi = buf.hi + (0, 0, z)
+        self.lo = lo if self.lo is None else np.minimum(self.lo, lo)
+        self.hi = hi if self.hi is None else np.maximum(self.hi, hi)
+
+    @classmethod
+    def fromToolpath(cls, tp):
+        # one flat toolpath (a parsed file): a new layer starts wherever
+        # the cut goes deeper than it has been
+        data = cls()
+        S, rapid = segments(tp)
+        if len(S):
+            z = np.fmin(S[:,2], S[:,5])
+            z[rapid] = np.inf
+            deepest = np.fmin.accumulate(np.where(np.isnan(z), np.inf, z))
+            layer = np.concatenate(([0], np.cumsum(deepest[1:] < deepest[:-1])))
+            data.free.append((S, rapid, layer))
+            data.grow(Buffer(S, rapid), 0.0)
+            data.layer = int(layer[-1]) + 1
+        return data
+
+    ###################################
+
+    def layers(self):
+        return max(self.layer, 1)
+
+    def extent(self, projection):
+        # (umin, vmin, umax, vmax) of everything
+        if self.lo is None:
+            return (0.0, 0.0, 1.0, 1.0)
+        corners = np.array([(x, y, z) for x in (self.lo[0], self.hi[0])
+                            for y in (self.lo[1], self.hi[1]) for z in (self.lo[2], self.hi[2])])
+        M = np.array(PROJECTIONS[projection])
+        UV = corners @ M.T
+        return tuple(UV.min(axis=0)) + tuple(UV.max(axis=0))
+
+    def cell(self, projection, level):
+        u0, v0, u1, v1 = self.extent(projection)
+        return max(u1 - u0, v1 - v0, 1e-9)*FINEST*2**level
+
+    def level(self, projection, pixel):
+        # coarsest level whose cell is still below a pixel, -1 = exact
+        base = self.cell(projection, 0)
+        if pixel < base:
+            return -1
+        return min(LEVELS - 1, int(math.log2(pixel/base)))
+
+    def freeLayers(self, first, last):
+        # the other chunks' segments of layers first..last as one Buffer
+        ck = (first, last)
+        out = self.filtered.get(ck)
+        if out is None:
+            S = []
+            R = []
+            for seg, rapid, layer in self.free:
+                if isinstance(layer, np.ndarray):
+                    keep = (layer >= first) & (layer <= last)
+                    seg, rapid = seg[keep], rapid[keep]
+                elif not first <= min(layer, self.layers() - 1) <= last:
+                    # the tail comes after the last layer
+                    continue
+                S.append(seg)
+                R.append(rapid)
+            out = Buffer(np.vstack(S) if S else np.zeros((0, 6)),
+                         np.concatenate(R) if R else np.zeros(0, dtype=bool))
+            self.filtered = {ck: out}  # only the last range is kept
+        return out
+
+    def prepare(self, projection="top"):
+        # build every level up front (on a worker thread), so the first
+        # draws of the whole program don't have to
+        buffers = list(self.templates.values()) + [self.freeLayers(0, self.layers() - 1)]
+        for level in range(-1, LEVELS):
+            cell = self.cell(projection, max(level, 0))
+            for buf in buffers:
+                buf.lod(projection, level, cell)
+
+    def draws(self, projection, pixel, first=0, last=None):
+        # -> [(Lod, du, dv)] covering layers first..last at this pixel size
+        if last is None:
+            last = self.layers() - 1
+        level = self.level(projection, pixel)
+        cell = self.cell(projection, max(level, 0))
+        (a, b, c), (d, e, f) = PROJECTIONS[projection]
+        out = []
+        seen = set()
+        for key, z, layer in self.instances:
+            if first <= layer <= last and (key, z*c, z*f) not in seen:
+                # layers on top of each other (top view) draw once
+                seen.add((key, z*c, z*f))
+                out.append((self.templates[key].lod(projection, level, cell), z*c, z*f))
+        free = self.freeLayers(first, last)
+        if len(free):
+            out.append((free.lod(projection, level, cell), 0.0, 0.0))
+        return out
+
+#############################################################################
+
+def segments(tp):
+    # (n, 6) x0 y0 z0 x1 y1 z1 rows and the rapid mask, moves from an
+    # unknown position left out
+    if len(tp) == 0:
+        return np.zeros((0, 6)), np.zeros(0, dtype=bool)
+    A = tp.arrays()
+    P = np.column_stack((A["x"], A["y"], A["z"]))
+    P0 = np.vstack((np.array([tp.value(v) for v in tp.start[:3]], dtype=np.float64)[None,:], P[:-1]))
+    P1 = np.where(np.isnan(P), P0, P)
+    P0 = np.where(np.isnan(P0), P1, P0)
+    known = ~np.isnan(P0).any(axis=1) & ~np.isnan(P1).any(axis=1)
+    return np.hstack((P0[known], P1[known])), (A["motion"] == RAPID)[known]
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# Pipeline instrumentation: stage timers, counters, optional profilers
+# Copyright 2017 - Michael T. Mayers
+# Licensed under the GPLV3 - see https://www.gnu.org/licenses/gpl-3.0.html
+#
+# a Profiler is handed along a generation and collects:
+#
+#   stages     seconds and calls per named stage. stages nest (the text
+#              stage pulls chunks through the geometry stage) and every
+#              stage only gets its own time, so they add up to the wall
+#              time of what was measured
+#   counters   layers, rings, lines, bytes, chunks ... whatever is count()ed
+#   deep       cProfile of the thread that start()s it plus tracemalloc
+#              peak / top allocations, off unless asked for (slow)
+#
+# wrap(name, iterable) times a generator pipeline stage by stage: every
+# next() on it runs inside `name`. report() is plain JSON-able data.
+#
+# note() is for the chatty GUI events (edits, refreshes): counted, and
+# logged at debug level only, never printed.
+
+import sys, time, logging, threading
+
+import gcodeio
+
+log = logging.getLogger("gcodegen")
+
+TOP = 25    # functions / allocation sites in a deep report
+
+#############################################################################
+
+class Profiler(object):
+
+    def __init__(self, deep=False):
+        self.deep = deep
+        self.stages = {}    # name -> [seconds, calls]
+        self.counters = {}
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.profile = None
+        self.snapshot = None
+        self.peak = None
+        self.tracing = False    # tracemalloc started by this profiler
+        self.t0 = None
+        self.wall = 0.0
+
+    ###################################
+
+    def start(self):
+        self.t0 = time.perf_counter()
+        if self.deep:
+            import cProfile, tracemalloc
+            # someone else's tracing (python -X tracemalloc, a test) is
+            # used as is and left running
+            self.tracing = not tracemalloc.is_tracing()
+            if self.tracing:
+                tracemalloc.start()
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def stop(self):
+        if self.t0 is None:
+            return
+        self.wall += time.perf_counter() - self.t0
+        self.t0 = None
+        if self.profile is not None:
+            import tracemalloc
+            self.profile.disable()
+            self.peak = tracemalloc.get_traced_memory()[1]
+            self.snapshot = tracemalloc.take_snapshot()
+            if self.tracing:
+                tracemalloc.stop()
+                self.tracing = False
+
+    ###################################
+
+    def enter(self, name):
+        now = time.perf_counter()
+        stack = self.stack()
+        if stack:
+            parent = stack[-1]
+            self.add(parent[0], now - parent[1], 0)
+        stack.append([name, now])
+
+    def leave(self):
+        now = time.perf_counter()
+        stack = self.stack()
+        name, t = stack.pop()
+        self.add(name, now - t, 1)
+        if stack:
+            stack[-1][1] = now
+
+    def stack(self):
+        # per thread, the worker and the window time their own stages
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def add(self, name, seconds, calls=1):
+        with self.lock:
+            s = self.stages.get(name)
+            if s is None:
+                s = self.stages[name] = [0.0, 0]
+            s[0] += seconds
+            s[1] += calls
+
+    def stage(self, name):
+        return Stage(self, name)
+
+    def wrap(self, name, iterable):
+        it = iter(iterable)
+        while True:
+            self.enter(name)
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            finally:
+                self.leave()
+            yield item
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def tally(self, chunks):
+        # chunks / segments going by, and the rings of a layer template
+        # (once per template)
+        seen = set()
+        for tp in chunks:
+            self.count("chunks")
+            self.count("segments", len(tp))
+            if tp.rings is not None and tp.key not in seen:
+                seen.add(tp.key)
+                self.count("rings", tp.rings)
+            yield tp
+
+    def note(self, name, fmt, *args):
+        self.count(name)
+        log.debug(fmt, *args)
+
+    def merge(self, other):
+        # another profiler's stages and counters (the window's render
+        # time into the worker's generation)
+        for name, (seconds, calls) in other.stages.items():
+            self.add(name, seconds, calls)
+        for name, n in other.counters.items():
+            self.count(name, n)
+
+    ###################################
+
+    def report(self, top=TOP):
+        wall = self.wall
+        if self.t0 is not None:
+            wall += time.perf_counter() - self.t0
+        staged = sum(s[0] for s in self.stages.values())
+        total = staged or 1.0
+        out = {
+            "wall": wall,
+            "unstaged": max(0.0, wall - staged),    # imports, setup, between stages
+            "stages": {name: {"seconds": s, "calls": n, "percent": 100.0*s/total}
+                       for name, (s, n) in self.stages.items()},
+            "counters": dict(self.counters),
+        }
+        if self.profile is not None:
+            out["functions"] = functions(self.profile, top)
+        if self.snapshot is not None:
+            out["peakBytes"] = self.peak
+            out["allocations"] = [{"where": "%s:%d" % (s.traceback[0].filename, s.traceback[0].lineno),
+                                   "bytes": s.size, "count": s.count}
+                                  for s in self.snapshot.statistics("lineno")[:top]]
+        return out
+
+class Stage(object):
+    # with profiler.stage("write"): ...
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler.enter(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.leave()
+        return False
+
+class TimedWriter(object):
+    # file / stream whose write() calls are a stage, for gcodeio.writeProgram()
+
+    def __init__(self, dest, profiler, name="write"):
+        self.dest = dest
+        self.profiler = profiler
+        self.name = name
+
+    def write(self, data):
+        with self.profiler.stage(self.name):
+            return self.dest.write(data)
+
+    def flush(self):
+        with self.profiler.stage(self.name):
+            self.dest.flush()
+
+def writeProgramFile(lines, path, profiler, level=None):
+    # gcodeio.writeProgramFile(), with the encoding and writing (and
+    # compressing) timed
+    chunks = profiler.wrap("encode", gcodeio.iterChunks(lines))
+    if path in (None, "-"):
+        return gcodeio.writeChunks(chunks, TimedWriter(sys.stdout.buffer, profiler))
+    with gcodeio.openOutput(path, level) as f:
+        return gcodeio.writeChunks(chunks, TimedWriter(f, profiler))
+
+#############################################################################
+
+def functions(profile, top=TOP):
+    # the top functions by own time
+    import pstats
+    stats = pstats.Stats(profile).stats
+    rows = sorted(stats.items(), key=lambda kv: -kv[1][2])[:top]
+    return [{"function": "%s:%d(%s)" % key, "calls": nc, "seconds": tt, "cumulative": ct}
+            for key, (cc, nc, tt, ct, callers) in rows]
+
+def formatReport(report):
+    lines = ["wall %0.4fs (%0.4fs outside the stages)" % (report["wall"], report["unstaged"])]
+    for name, s in sorted(report["stages"].items(), key=lambda kv: -kv[1]["seconds"]):
+        lines.append("  %-10s %9.4fs %5.1f%% %8d calls" % (name, s["seconds"], s["percent"], s["calls"]))
+    if report["counters"]:
+        lines.append("  " + ", ".join("%s %d" % kv for kv in sorted(report["counters"].items())))
+    if "peakBytes" in report:
+        lines.append("peak %0.2f MB, top allocations:" % (report["peakBytes"]/1e6))
+        for a in report["allocations"][:10]:
+            lines.append("  %10d B %7d x  %s" % (a["bytes"], a["count"], a["where"]))
+    if "functions" in report:
+        lines.append("top functions (own time):")
+        for f in report["functions"][:10]:
+            lines.append("  %9.4fs %9d calls  %s" % (f["seconds"], f["calls"], f["function"]))
+    return "\n".join(lines)
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# Program generation over HTTP on localhost (asyncio)
+# Copyright 2017 - Michael T. Mayers
+# Licensed under the GPLV3 - see https://www.gnu.org/licenses/gpl-3.0.html
+#
+#   POST /facing   {"x2": 4, "y2": 3, "z2": 0.5, "material": "Mild Steel"}
+#   POST /recting  same, JobParams names plus modal / decimals / comments
+#   GET  /metrics  counters and per request timings (JSON)
+#   GET  /health
+#
+# the body is a gcodebatch manifest row as a JSON object, missing values
+# take the defaults ("compress": "gz" sends it gzip Content-Encoded, at
+# "level"). the answer is the program, sent chunked straight off
+# disk with drain() between chunks, so a slow terminal only holds up its
+# own connection and no program is ever held in memory whole.
+#
+# programs are made by a pool of worker processes into a gcodecache
+# ProgramCache (the same content addressed entries gcodecli --cache and
+# gcodebatch use), a repeat is a cache hit served without the pool.
+# identical requests while one is being made wait for that one
+# (coalesced) instead of making it again. past maxQueued programs being
+# made, new ones are turned away with 503 and Retry-After rather than
+# queued without bound. a program not made within genTimeout seconds
+# gets 504, and (where there is SIGALRM) the worker gives up on it too
+# so the pool doesn't lose the process.
+#
+# listens on 127.0.0.1 only, there is no authentication.
+
+import os, json, time, zlib, signal, asyncio, multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import gcodecore, gcodeio
+from gcodecore import JobParams, PORT, GENTIMEOUT
+from gcodeemit import emitText, emitModal
+from gcodecache import ProgramCache, cacheKey
+from gcodebatch import makeJob
+from cycletime import Estimator, estimate
+
+HOST = "127.0.0.1"
+MAXBODY = 1<<16         # bytes of request JSON
+READTIMEOUT = 10.0      # s for a client to send its request
+RECENT = 1000           # requests kept for the timing percentiles
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           408: "Request Timeout", 413: "Payload Too Large", 500: "Internal Server Error",
+           503: "Service Unavailable", 504: "Gateway Timeout"}
+
+class HttpError(Exception):
+
+    def __init__(self, status, message, headers=None):
+        super(HttpError, self).__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+#############################################################################
+# worker side
+
+def timedOut(signum, frame):
+    raise TimeoutError("program not made in time")
+
+def generateJob(job, engine, cache, timeout=None):
+    # one program into the cache -> its meta (path, lines, bytes, minutes
+    # ...) plus when the worker started and finished (time.time(), the
+    # pool is other processes)
+    started = time.time()
+    alarm = timeout and hasattr(signal, "setitimer")
+    if alarm:
+        signal.signal(signal.SIGALRM, timedOut)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        meta = makeProgram(job, engine, cache)
+    finally:
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    meta.update(started=started, finished=time.time())
+    return meta
+
+def makeProgram(job, engine, cache):
+    pc = ProgramCache(*cache)
+    params = JobParams(**job["params"])
+    key = cacheKey(job["kind"], params, job["modal"], job["decimals"], job["comments"])
+    est = Estimator()
+    expanded = params.layerMode == "expand"
+    def lines():
+        chunks = gcodecore.pathGenerator(job["kind"], engine)(params)
+        if expanded:
+            chunks = est.tap(chunks)
+        if job["modal"]:
+            return emitModal(chunks, job["decimals"], job["comments"])
+        return emitText(chunks)
+    def summary():
+        if not expanded:
+            # o-word programs hold the layer once, time every layer
+            return estimate(gcodecore.machinePath(job["kind"], engine)(params))
+        return est.summary()
+    meta, hit = pc.fetch(key, lines, summary)
+    return meta
+
+#############################################################################
+
+class Service(object):
+
+    def __init__(self, workers=None, cacheRoot=None, cacheBytes=None, maxQueued=None,
+                 engine="auto", genTimeout=GENTIMEOUT):
+        self.workers = workers or os.cpu_count() or 1
+        # forked workers would inherit the open client sockets, and a
+        # connection we close would stay open in them
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else None)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        self.cache = ProgramCache(cacheRoot, cacheBytes)
+        self.cacheArgs = (self.cache.root, cacheBytes)
+        self.maxQueued = maxQueued or 4*self.workers
+        self.engine = engine
+        self.genTimeout = genTimeout
+        self.making = {}    # cache key -> future of the program being made
+        self.counts = {"requests": 0, "errors": 0, "rejected": 0, "hits": 0,
+                       "generated": 0, "coalesced": 0, "timeouts": 0, "bytes": 0}
+        self.recent = deque(maxlen=RECENT)
+        self.started = time.time()
+        self.server = None
+
+    async def start(self, port=PORT):
+        self.server = await asyncio.start_server(self.handle, HOST, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        # don't wait on programs nobody is going to be sent
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    ###################################
+
+    async def handle(self, reader, writer):
+        # one request per connection
+        t0 = time.perf_counter()
+        timing = {"path": None, "status": 200, "sent": False}
+        try:
+            try:
+                method, path, body = await asyncio.wait_for(readRequest(reader), READTIMEOUT)
+            except asyncio.TimeoutError:
+                raise HttpError(408, "request not received in %gs" % READTIMEOUT)
+            timing["path"] = path
+            self.counts["requests"] += 1
+            if path == "/health":
+                await respond(writer, 200, b"ok\n", "text/plain")
+            elif path == "/metrics":
+                await respond(writer, 200, json.dumps(self.metrics(), indent=1).encode("utf-8"),
+                              "application/json")
+            elif path.strip("/") in gcodecore.generators:
+                if method != "POST":
+                    raise HttpError(405, "POST the job parameters as JSON", {"Allow": "POST"})
+                await self.generate(path.strip("/"), body, writer, timing)
+            else:
+                raise HttpError(404, "no such path <%s>" % path)
+        except HttpError as e:
+            timing["status"] = e.status
+            self.counts["errors" if e.status != 503 else "rejected"] += 1
+            await self.fail(writer, timing, e.status, str(e), e.headers)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            timing["status"] = 499  # client went away
+            self.counts["errors"] += 1
+        except Exception as e:
+            timing["status"] = 500
+            self.counts["errors"] += 1
+            await self.fail(writer, timing, 500, "%s: %s" % (e.__class__.__name__, e))
+        finally:
+            timing["total"] = time.perf_counter() - t0
+            if timing["path"] is not None:
+                self.recent.append(timing)
+            writer.close()
+
+    async def fail(self, writer, timing, status, message, headers=None):
+        if timing["sent"]:
+            # part of a program is out, a short chunked body is all the
+            # client can be told
+            writer.transport.abort()
+            return
+        await respond(writer, status, (message + "\n").encode("utf-8"), "text/plain", headers)
+
+    async def generate(self, kind, body, writer, timing):
+        try:
+            row = json.loads(body.decode("utf-8") or "{}")
+            if not isinstance(row, dict):
+                raise ValueError("expected a JSON object")
+            row["kind"] = kind
+            job = makeJob(1, row)
+            params = JobParams(**job["params"])
+        except (ValueError, TypeError) as e:
+            # there is just the one job
+            raise HttpError(400, str(e).replace("job 1: ", "", 1))
+        if job["compress"] == "xz":
+            raise HttpError(400, "compress: only gz over http")
+        key = cacheKey(kind, params, job["modal"], job["decimals"], job["comments"])
+        meta = self.cache.lookup(key)
+        if meta is not None:
+            timing.update(cache="hit", queue=0.0, generate=0.0)
+            self.counts["hits"] += 1
+        else:
+            meta = await self.make(key, job, timing)
+        t0 = time.perf_counter()
+        try:
+            f = open(meta["path"], "rb")
+        except FileNotFoundError:
+            # evicted since it was made, once more
+            meta = await self.make(key, job, timing)
+            f = open(meta["path"], "rb")
+        z = None
+        if job["compress"] == "gz":
+            z = zlib.compressobj(9 if job["level"] is None else job["level"], zlib.DEFLATED, 31)
+        with f:
+            headers = {
+                "Transfer-Encoding": "chunked",
+                "X-Program-Lines": str(meta["lines"]),
+                "X-Program-Bytes": str(meta["bytes"]),
+                "X-Cycle-Minutes": "%0.2f" % meta.get("minutes", 0.0),
+                "X-Cache": timing["cache"],
+                "Server-Timing": "queue;dur=%0.1f, generate;dur=%0.1f" % (
+                    1000*timing["queue"], 1000*timing["generate"]),
+            }
+            if z is not None:
+                headers["Content-Encoding"] = "gzip"
+            writer.write(head(200, "text/plain; charset=utf-8", headers))
+            timing["sent"] = True
+            loop = asyncio.get_running_loop()
+            while True:
+                data = await loop.run_in_executor(None, f.read, gcodeio.CHUNKSIZE)
+                chunk = data
+                if z is not None:
+                    chunk = z.compress(data) if data else z.flush()
+                if chunk:
+                    writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                    await writer.drain()
+                if not data:
+                    break
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        timing.update(stream=time.perf_counter() - t0, lines=meta["lines"], bytes=meta["bytes"])
+        self.counts["bytes"] += meta["bytes"]
+
+    async def make(self, key, job, timing):
+        # the program into the cache on the pool, or wait for the same
+        # one already being made
+        submitted = time.time()
+        future = self.making.get(key)
+        if future is not None:
+            timing["cache"] = "coalesced"
+            self.counts["coalesced"] += 1
+            meta = await self.result(future)
+        else:
+            if len(self.making) >= self.maxQueued:
+                raise HttpError(503, "%d programs are being made, try again" % len(self.making),
+                                {"Retry-After": "1"})
+            timing["cache"] = "miss"
+            self.counts["generated"] += 1
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.pool, generateJob, job, self.engine, self.cacheArgs,
+                                          self.genTimeout)
+            self.making[key] = future
+            try:
+                meta = await self.result(future)
+            finally:
+                del self.making[key]
+        timing["queue"] = max(0.0, meta["started"] - submitted)
+        timing["generate"] = meta["finished"] - max(meta["started"], submitted)
+        return meta
+
+    async def result(self, future):
+        # the future's program meta, 504 past genTimeout (a little over, the
+        # worker's own alarm should go first)
+        timeout = self.genTimeout + 1.0 if self.genTimeout else None
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except (asyncio.TimeoutError, TimeoutError):
+            self.counts["timeouts"] += 1
+            raise HttpError(504, "program not made in %gs" % self.genTimeout)
+
+    ###################################
+
+    def metrics(self):
+        out = dict(self.counts, uptime=time.time() - self.started, workers=self.workers,
+                   making=len(self.making), maxQueued=self.maxQueued, cache=self.cache.stats())
+        done = [t for t in self.recent if t["status"] == 200 and "stream" in t]
+        out["timing"] = {name: percentiles([t[name] for t in done])
+                         for name in ("queue", "generate", "stream", "total")}
+        out["recent"] = list(self.recent)[-20:]
+        return out
+
+def percentiles(values):
+    # s, over the recent requests
+    if not values:
+        return {}
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(q*len(values)))]
+    return {"n": len(values), "p50": pick(0.5), "p95": pick(0.95), "max": values[-1]}
+
+#############################################################################
+# http
+
+async def readRequest(reader):
+    # -> (method, path, body)
+    line = await reader.readline()
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(400, "bad request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        n = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise HttpError(400, "bad Content-Length")
+    if n > MAXBODY:
+        raise HttpError(413, "request body over %d bytes" % MAXBODY)
+    body = await reader.readexactly(n) if n > 0 else b""
+    return method.upper(), target.split("?")[0], body
+
+def head(status, ctype, headers=None):
+    lines = ["HTTP/1.1 %d %s" % (status, REASONS.get(status, "")),
+             "Content-Type: %s" % ctype, "Connection: close"]
+    lines.extend("%s: %s" % kv for kv in (headers or {}).items())
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+async def respond(writer, status, body, ctype, headers=None):
+    headers = dict(headers or {}, **{"Content-Length": str(len(body))})
+    try:
+        writer.write(head(status, ctype, headers) + body)
+        await writer.drain()
+    except ConnectionError:
+        pass
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# Heightmap material removal check (NumPy)
+# Copyright 2017 - Michael T. Mayers
+# Licensed under the GPLV3 - see https://www.gnu.org/licenses/gpl-3.0.html
+#
+# the stock top face as a grid of heights (one per cell centre, starting
+# at the stock top). every G01 sweeps the flat end mill's disk along the
+# segment and lowers the cells it passes over to the lowest Z the tool
+# reaches above them. what is left answers:
+#
+#   islands   connected patches still above z2 (the ring loop stopping
+#             early, docXY too wide for the tool ...)
+#   scallop   the highest material left anywhere on the face, above z2
+#   gouge     cells cut below z2
+#
+# the face is worked tile by tile, so only one tile of heights is ever
+# held (plus one byte per cell for the uncut mask). level cuts are
+# stamped per Z as cell rectangles into a difference array, so a tile
+# costs about its cells plus a few runs per segment, not the cells under
+# every sweep (48x48in at docXY 0.005: ~0.7s). stamped layers of
+# the same template only count at their lowest Z - a layer higher up
+# over the same path can't cut anything the lowest one doesn't - so a
+# program costs about one layer, however many layers it has.
+
+import time
+
+import numpy as np
+
+from toolpath import FEED
+
+TILE = 512            # cells per tile side
+CELLS = 16            # default cells per tool diameter
+MAXCELLS = 1<<24      # the cell grows on big plates to stay below this
+TOL = 1e-5            # in, heights within this of z2 are on size
+
+#############################################################################
+
+class Simulator(object):
+
+    def __init__(self, params, cell=None):
+        self.params = params
+        self.radius = params.toolDiam/2.0
+        self.x0, self.x1 = params.xaxb()
+        self.y0, self.y1 = params.yayb()
+        self.top, self.bottom = params.zazb()
+        w = self.x1 - self.x0
+        h = self.y1 - self.y0
+        if cell is None:
+            cell = max(params.toolDiam/CELLS, (w*h/MAXCELLS)**0.5)
+        self.cell = cell
+        self.nx = max(1, int(np.ceil(w/cell)))
+        self.ny = max(1, int(np.ceil(h/cell)))
+        self.free = []     # segment arrays of chunks without a key
+        self.layers = {}   # (key, entry xy) -> (z, chunk) of the lowest so far
+
+    ###################################
+
+    def add(self, tp):
+        if len(tp) == 0:
+            return
+        if tp.key is None:
+            self.free.append(feedSegments(tp))
+            return
+        # stamped layers: keep the lowest, its segments are made in run()
+        ck = (tp.key, tp.start[0], tp.start[1])
+        z = tp.value(tp.z[0])
+        old = self.layers.get(ck)
+        if old is None or z < old[0]:
+            self.layers[ck] = (z, tp)
+
+    def tap(self, chunks):
+        for tp in chunks:
+            self.add(tp)
+            yield tp
+
+    def segments(self):
+        # (x0, y0, z0, x1, y1, z1) rows
+        S = self.free + [feedSegments(tp) for z, tp in self.layers.values()]
+        if not S:
+            return np.zeros((0, 6))
+        return np.vstack(S)
+
+    ###################################
+
+    def run(self):
+        t0 = time.perf_counter()
+        S = self.segments()
+        r = self.radius
+        lo = np.minimum(S[:,[0,1]], S[:,[3,4]]) - r
+        hi = np.maximum(S[:,[0,1]], S[:,[3,4]]) + r
+        uncut = np.zeros((self.ny, self.nx), dtype=bool)
+        maxHeight = -np.inf
+        minHeight = np.inf
+        gouged = 0
+        for ty in range(0, self.ny, TILE):
+            for tx in range(0, self.nx, TILE):
+                H = self.tile(S, lo, hi, tx, ty)
+                maxHeight = max(maxHeight, float(H.max()))
+                minHeight = min(minHeight, float(H.min()))
+                gouged += int(np.count_nonzero(H < self.bottom - TOL))
+                uncut[ty:ty+H.shape[0], tx:tx+H.shape[1]] = H > self.bottom + TOL
+        islands = self.islands(uncut)
+        area = self.cell*self.cell
+        return {
+            "cell": self.cell,
+            "nx": self.nx,
+            "ny": self.ny,
+            "segments": len(S),
+            "islands": islands,
+            "uncutArea": sum(i["area"] for i in islands),
+            "maxScallop": max(0.0, maxHeight - self.bottom),
+            "gouge": max(0.0, self.bottom - minHeight),
+            "gougeArea": gouged*area,
+            "seconds": time.perf_counter() - t0,
+        }
+
+    def tile(self, S, lo, hi, tx, ty):
+        # heights of one tile: every segment whose swept box reaches it.
+        # level segments (all of a layer's cuts) are stamped per Z at once,
+        # as the cell runs each one covers row by row; the few others
+        # (plunges, ramps) are swept one at a time
+        c = self.cell
+        nx = min(TILE, self.nx - tx)
+        ny = min(TILE, self.ny - ty)
+        X = self.x0 + (tx + np.arange(nx) + 0.5)*c
+        Y = self.y0 + (ty + np.arange(ny) + 0.5)*c
+        H = np.full((ny, nx), self.top)
+        near = np.flatnonzero((lo[:,0] <= X[-1]) & (hi[:,0] >= X[0]) &
+                              (lo[:,1] <= Y[-1]) & (hi[:,1] >= Y[0]))
+        level = S[near,2] == S[near,5]
+        flat = S[near[level]]
+        for z in np.unique(flat[:,2]):
+            covered = coverage(flat[flat[:,2] == z], X, Y, self.radius)
+            H[covered] = np.minimum(H[covered], z)
+        for k in near[~level]:
+            i0, i1 = np.searchsorted(Y, (lo[k,1], hi[k,1]))
+            j0, j1 = np.searchsorted(X, (lo[k,0], hi[k,0]))
+            if i0 < i1 and j0 < j1:
+                win = H[i0:i1, j0:j1]
+                np.minimum(win, sweep(S[k], X[j0:j1], Y[i0:i1], self.radius), out=win)
+        return H
+
+    def islands(self, uncut):
+        # 4-connected components of the uncut mask, from row runs
+        parent = {}
+        def find(a):
+            while parent[a] != a:
+                parent[a] = parent[parent[a]]
+                a = parent[a]
+            return a
+        runs = []
+        prev = []
+        for i in np.flatnonzero(uncut.any(axis=1)):
+            row = np.concatenate(([0], uncut[i].view(np.int8), [0]))
+            edges = np.flatnonzero(np.diff(row))
+            cur = []
+            for a, b in zip(edges[0::2], edges[1::2]):
+                n = len(runs)
+                runs.append((i, a, b))
+                parent[n] = n
+                for m in prev:
+                    pi, pa, pb = runs[m]
+                    if pi == i-1 and pa < b and a < pb:
+                        parent[find(n)] = find(m)
+                cur.append(n)
+            prev = cur
+        groups = {}
+        for n, (i, a, b) in enumerate(runs):
+            g = groups.setdefault(find(n), [0, i, i, a, b])
+            g[0] += b - a
+            g[1], g[2] = min(g[1], i), max(g[2], i)
+            g[3], g[4] = min(g[3], a), max(g[4], b)
+        c = self.cell
+        out = [{
+            "area": float(cells*c*c),
+            "x": (float(self.x0 + a*c), float(self.x0 + b*c)),
+            "y": (float(self.y0 + i0*c), float(self.y0 + (i1+1)*c)),
+        } for cells, i0, i1, a, b in groups.values()]
+        out.sort(key=lambda d: -d["area"])
+        return out
+
+#############################################################################
+
+def sweep(seg, X, Y, r):
+    # lowest Z a flat end mill of radius r reaches over the cells (Y rows,
+    # X columns) going along one segment, inf where it doesn't pass. the
+    # cell is under the tool for the parameter interval around the point
+    # of closest approach, z is linear so its minimum is at an end of it
+    x0, y0, z0, x1, y1, z1 = seg
+    dx, dy = x1 - x0, y1 - y0
+    L2 = dx*dx + dy*dy
+    PX = (X - x0)[None,:]
+    PY = (Y - y0)[:,None]
+    d2 = PX*PX + PY*PY
+    if L2 == 0.0:
+        return np.where(d2 <= r*r, min(z0, z1), np.inf)
+    t = (PX*dx + PY*dy)/L2
+    perp = np.maximum(d2 - t*t*L2, 0.0)
+    half = np.sqrt(np.maximum(r*r - perp, 0.0)/L2)
+    ta = np.maximum(t - half, 0.0)
+    tb = np.minimum(t + half, 1.0)
+    z = np.minimum(z0 + (z1 - z0)*ta, z0 + (z1 - z0)*tb)
+    return np.where((perp <= r*r) & (ta <= tb), z, np.inf)
+
+def interval(a, b, lo, hi):
+    # the x with lo <= a*x + b <= hi, as (left, right), empty: left > right
+    with np.errstate(divide="ignore", invalid="ignore"):
+        u = (lo - b)/a
+        v = (hi - b)/a
+    inside = (lo <= b) & (b <= hi)
+    left = np.where(a == 0, np.where(inside, -np.inf, np.inf), np.minimum(u, v))
+    right = np.where(a == 0, np.where(inside, np.inf, -np.inf), np.maximum(u, v))
+    return left, right
+
+def disk(cx, cy, y, r):
+    # x interval of the disk around (cx, cy) on the row y
+    s2 = r*r - (y - cy)**2
+    s = np.sqrt(np.maximum(s2, 0.0))
+    return np.where(s2 >= 0, cx - s, np.inf), np.where(s2 >= 0, cx + s, -np.inf)
+
+def rowRuns(cy0, cy1, Y, r):
+    # (index into cy0, row) for every row within r of the y ranges
+    i0 = np.searchsorted(Y, cy0 - r)
+    i1 = np.searchsorted(Y, cy1 + r, side="right")
+    n = np.maximum(i1 - i0, 0)
+    k = np.repeat(np.arange(len(i0)), n)
+    return k, np.arange(len(k)) - np.repeat(np.cumsum(n) - n, n) + i0[k]
+
+def coverage(S, X, Y, r):
+    # bool mask (Y rows, X columns) of the cells within r of any of the
+    # segments S. the tool's sweep along a segment is its two end disks
+    # plus the band between them; every piece is a set of cell
+    # rectangles (a band along X or Y is one, a disk or a slanted band a
+    # run per row) counted into one 2D difference array, so a long cut
+    # costs no more than a short one
+    x0, y0, x1, y1 = S[:,0], S[:,1], S[:,3], S[:,4]
+    dx, dy = x1 - x0, y1 - y0
+    L2 = dx*dx + dy*dy
+    rects = []
+    # bands along X / Y
+    straight = (L2 > 0) & ((dx == 0) | (dy == 0))
+    w = np.where(dx == 0, r, 0.0)[straight]
+    h = np.where(dy == 0, r, 0.0)[straight]
+    xa, xb = np.minimum(x0, x1)[straight] - w, np.maximum(x0, x1)[straight] + w
+    ya, yb = np.minimum(y0, y1)[straight] - h, np.maximum(y0, y1)[straight] + h
+    rects.append((np.searchsorted(Y, ya), np.searchsorted(Y, yb, side="right"),
+                  np.searchsorted(X, xa), np.searchsorted(X, xb, side="right")))
+    # slanted bands, a run per row: across |(p - p0) x d| <= r |d|,
+    # along 0 <= (p - p0).d <= |d|^2
+    slant = np.flatnonzero((L2 > 0) & ~straight)
+    k, row = rowRuns(np.minimum(y0, y1)[slant], np.maximum(y0, y1)[slant], Y, r)
+    k = slant[k]
+    y = Y[row] - y0[k]
+    l1, r1 = interval(dy[k], -y*dx[k], -r*np.sqrt(L2[k]), r*np.sqrt(L2[k]))
+    l2, r2 = interval(dx[k], y*dy[k], 0.0, L2[k])
+    rects.append((row, row + 1, np.searchsorted(X, np.maximum(l1, l2) + x0[k]),
+                  np.searchsorted(X, np.minimum(r1, r2) + x0[k], side="right")))
+    # end disks, a run per row
+    for cx, cy in ((x0, y0), (x1, y1)):
+        k, row = rowRuns(cy, cy, Y, r)
+        left, right = disk(cx[k], cy[k], Y[row], r)
+        rects.append((row, row + 1, np.searchsorted(X, left),
+                      np.searchsorted(X, right, side="right")))
+    i0, i1, j0, j1 = [np.concatenate(v) for v in zip(*rects)]
+    keep = (i0 < i1) & (j0 < j1)
+    i0, i1, j0, j1 = i0[keep], i1[keep], j0[keep], j1[keep]
+    ny, nx = len(Y), len(X)
+    size = (ny + 1)*(nx + 1)
+    def at(i, j):
+        return np.bincount(i*(nx + 1) + j, minlength=size)
+    edges = at(i0, j0) - at(i0, j1) - at(i1, j0) + at(i1, j1)
+    edges = edges.reshape(ny + 1, nx + 1).cumsum(axis=0).cumsum(axis=1)
+    return edges[:ny,:nx] > 0
+
+def feedSegments(tp):
+    # (x0, y0, z0, x1, y1, z1) rows of the G01 moves
+    A = tp.arrays()
+    start = [tp.value(v) for v in tp.start[:3]]
+    P = np.column_stack((A["x"], A["y"], A["z"]))
+    P0 = np.vstack((np.array(start, dtype=np.float64)[None,:], P[:-1]))
+    # carry unknown (unset) axes forward like the control would
+    P1 = np.where(np.isnan(P), P0, P)
+    feed = (A["motion"] == FEED) & ~np.isnan(P0).any(axis=1) & ~np.isnan(P1).any(axis=1)
+    return np.hstack((P0[feed], P1[feed]))
+
+def simulate(params, chunks, cell=None):
+    sim = Simulator(params, cell)
+    for tp in chunks:
+        sim.add(tp)
+    return sim.run()
+
+def formatReport(report):
+    if report["islands"]:
+        text = "%d uncut island(s), %0.4f in\N{SUPERSCRIPT TWO}" % (
+            len(report["islands"]), report["uncutArea"])
+    else:
+        text = "face cleared"
+    text += ", scallop %0.4f" % report["maxScallop"]
+    if report["gouge"] > TOL:
+        text += ", GOUGE %0.4f" % report["gouge"]
+    return text
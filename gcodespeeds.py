@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# Feeds and speeds sweep / MRR optimizer (NumPy)
+# Copyright 2017 - Michael T. Mayers
+# Licensed under the GPLV3 - see https://www.gnu.org/licenses/gpl-3.0.html
+#
+# gcodecore.speeds() for every sfmtable material x tool diameter x
+# flutes x docXY x docZ at once, as one broadcast array expression, then
+# the best feed each combination can run at on a given machine:
+#
+#   rpm   sfm*12/(pi*D), capped at the machine's maxRPM
+#   ipm   rpm*ipt(max)*flutes, cut back to the machine's maxFeed and to
+#         what its spindle HP can drive at this docXY*docZ
+#   ok    the cut back feed still gives at least the material's minimum
+#         chip load, and docXY fits the tool
+#
+# candidates are ranked by MRR and come with the JobParams keys, ready
+# for JobParams.replace() or a gcodebatch manifest.
+
+import numpy as np
+
+from gcodecore import sfmtable, DOCZ_CHOICES
+
+#############################################################################
+
+class MachineProfile(object):
+
+    defaults = {
+        "maxHP": 1.5,       # spindle power available for cutting
+        "maxRPM": 10000.0,
+        "minRPM": 0.0,
+        "maxFeed": 100.0,   # in/min
+    }
+
+    def __init__(self, **kwargs):
+        for k in self.defaults:
+            setattr(self, k, kwargs.pop(k, self.defaults[k]))
+        if kwargs:
+            raise TypeError("unknown machine parameter(s): %s" % ", ".join(sorted(kwargs)))
+
+    def asdict(self):
+        return {k: getattr(self, k) for k in self.defaults}
+
+TOOLDIAMS = (0.125, 0.1875, 0.25, 0.375, 0.5, 0.625, 0.75, 1.0)
+FLUTES = (2, 3, 4)
+DOCXY_FRACTIONS = (0.1, 0.25, 0.4, 0.5, 0.75) # of the tool diameter
+DOCZS = tuple(v for text, v in DOCZ_CHOICES)
+
+#############################################################################
+
+class Sweep(object):
+
+    # every array is shaped (material, toolDiam, flutes, docXY, docZ)
+
+    def __init__(self, machine=None, materials=None, toolDiams=TOOLDIAMS, flutes=FLUTES,
+                 docXYs=None, docZs=DOCZS):
+        self.machine = machine or MachineProfile()
+        self.materials = list(materials or sfmtable)
+        self.toolDiams = np.asarray(toolDiams, dtype=np.float64)
+        self.flutes = np.asarray(flutes, dtype=np.float64)
+        self.docZs = np.asarray(docZs, dtype=np.float64)
+        # docXY either absolute values or, by default, fractions of each tool
+        if docXYs is None:
+            self.fractions = np.asarray(DOCXY_FRACTIONS, dtype=np.float64)
+            docXY = self.toolDiams[:,None] * self.fractions[None,:]
+        else:
+            self.fractions = None
+            docXY = np.broadcast_to(np.asarray(docXYs, dtype=np.float64),
+                                    (len(self.toolDiams), len(docXYs)))
+        self.docXY = docXY[None,:,None,:,None]
+        self.compute()
+
+    def compute(self):
+        m = self.machine
+        mat = [sfmtable[k] for k in self.materials]
+        col = lambda values: np.asarray(values, dtype=np.float64)[:,None,None,None,None]
+        sfm = col([v["sfm"] for v in mat])
+        uhp = col([v["uhp"] for v in mat])
+        iptMin = col([v["intooth"]["min"] for v in mat])
+        iptMax = col([v["intooth"]["max"] for v in mat])
+        D = self.toolDiams[None,:,None,None,None]
+        F = self.flutes[None,None,:,None,None]
+        Z = self.docZs[None,None,None,None,:]
+        XY = self.docXY
+
+        rpm = np.minimum((sfm*12/np.pi)/D, m.maxRPM)
+        area = XY*Z
+        with np.errstate(divide="ignore"):
+            hpFeed = np.where(area > 0, m.maxHP/(uhp*area), np.inf)
+        ipm = np.minimum(np.minimum(rpm*iptMax*F, m.maxFeed), hpFeed)
+        ipt = ipm/(rpm*F)
+        mrr = ipm*area
+        shape = np.broadcast(sfm, D, F, XY, Z).shape
+        self.rpm = np.broadcast_to(rpm, shape)
+        self.ipm = np.broadcast_to(ipm, shape)
+        self.ipt = np.broadcast_to(ipt, shape)
+        self.mrr = np.broadcast_to(mrr, shape)
+        self.hp = np.broadcast_to(uhp*mrr, shape)
+        # chip load can't drop below the material's minimum, docXY can't
+        # exceed the tool, the spindle has to reach minRPM
+        self.ok = np.broadcast_to((ipt >= iptMin*(1-1e-9)) & (XY <= D) & (rpm >= m.minRPM), shape)
+
+    ###################################
+
+    def best(self, n=10, material=None, toolDiam=None):
+        # the n highest MRR feasible candidates, optionally for one
+        # material / tool diameter only
+        score = np.where(self.ok, self.mrr, -np.inf)
+        if material is not None:
+            keep = np.zeros(len(self.materials), bool)
+            keep[self.materials.index(material)] = True
+            score = np.where(keep[:,None,None,None,None], score, -np.inf)
+        if toolDiam is not None:
+            keep = np.isclose(self.toolDiams, toolDiam)
+            score = np.where(keep[None,:,None,None,None], score, -np.inf)
+        flat = score.ravel()
+        feasible = np.flatnonzero(np.isfinite(flat))
+        if n <= 0 or len(feasible) == 0:
+            return []
+        # HP limited candidates tie on MRR, the smaller tool and the
+        # lighter radial engagement win those
+        mrr = np.round(flat[feasible], 9)
+        diam = np.broadcast_to(self.toolDiams[None,:,None,None,None], score.shape).ravel()[feasible]
+        docXY = np.broadcast_to(self.docXY, score.shape).ravel()[feasible]
+        top = feasible[np.lexsort((docXY, diam, -mrr))[:n]]
+        return [self.candidate(np.unravel_index(i, score.shape)) for i in top]
+
+    def candidate(self, index):
+        mi, di, fi, xi, zi = index
+        return {
+            "material": self.materials[mi],
+            "toolDiam": float(self.toolDiams[di]),
+            "flutes": int(self.flutes[fi]),
+            "docXY": float(self.docXY[0,di,0,xi,0]),
+            "docZ": float(self.docZs[zi]),
+            "feedRate": float(self.ipm[index]),
+            "rpm": float(self.rpm[index]),
+            "ipt": float(self.ipt[index]),
+            "mrr": float(self.mrr[index]),
+            "hp": float(self.hp[index]),
+        }
+
+    def size(self):
+        return self.mrr.size
+
+#############################################################################
+
+PARAM_KEYS = ("material", "toolDiam", "flutes", "docXY", "docZ", "feedRate")
+
+def candidateParams(candidate, base):
+    # a ranked candidate applied to a JobParams (stock, Z range ...)
+    return base.replace(**{k: candidate[k] for k in PARAM_KEYS})
+
+def optimize(machine=None, n=10, **kwargs):
+    return Sweep(machine, **kwargs).best(n)
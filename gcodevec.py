@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# NumPy facing generator
+# Copyright 2017 - Michael T. Mayers
+# Licensed under the GPLV3 - see https://www.gnu.org/licenses/gpl-3.0.html
+#
+# Same program as gcodecore.facingLines(), byte for byte, but the ring
+# loop is worked out up front as arrays: ring corners come from a running
+# sum (the same sequential float additions the scalar `xa += docXY` loop
+# performs). The ring arrays become the layer template that gcodecore
+# stamps out at every Z. On a fixed point grid (resolution set) the ring
+# count is a closed form and the corners plain int64 arithmetic.
+
+import numpy as np
+
+import gcodecore
+from toolpath import Toolpath, RAPID, FEED, W_X, W_Y, W_F, ROLE_CUT, ROLE_HOP
+from gcodeemit import emitText
+
+#############################################################################
+
+def facingRings(params):
+    # -> xa, xb, ya, yb arrays, one entry per ring that the scalar loop emits
+    g = gcodecore.Grid(params)
+    d = g.docXY
+    if not d > 0:
+        raise ValueError("docXY must be > 0, not <%g>" % d)
+    xa, xb = g.xa, g.xb
+    ya, yb = g.ya, g.yb
+    if g.decimals is not None:
+        # on the integer grid ring k exists while xb-xa and yb-ya both
+        # still cover 2*k*docXY, no stepping needed
+        nrings = min((xb-xa)//(2*d), (yb-ya)//(2*d)) + 1
+        k = np.arange(nrings, dtype=np.int64) * d
+        return xa + k, xb - k, ya + k, yb - k
+    n = int(min(xb-xa, yb-ya)/(2.0*d)) + 2
+    while True:
+        # start value goes into the sum so every partial sum rounds
+        # exactly like the repeated += / -= of the scalar loop
+        XA, XB, YA, YB = [np.cumsum(np.concatenate(([v0], np.full(n, step))))
+                          for v0, step in ((xa, d), (xb, -d), (ya, d), (yb, -d))]
+        # ring 0 is always cut, after that the loop stops at the first
+        # ring where (xb<xa) or (yb<ya)
+        stop = (XB < XA) | (YB < YA)
+        stop[0] = False
+        if stop.any():
+            nrings = int(np.argmax(stop))
+            return XA[:nrings], XB[:nrings], YA[:nrings], YB[:nrings]
+        n *= 2
+
+#############################################################################
+
+def facingTemplate(params, rings=None):
+    # one layer of rings as (motion, words, role, x, y) arrays. ring 0 is
+    # its 4 cuts, every later ring a hop to its start corner plus 4 cuts
+    p = params
+    XA, XB, YA, YB = facingRings(p) if rings is None else rings
+    if p.strategy == "spiral":
+        return spiralTemplate(p, XA, XB, YA, YB)
+    if p.cutDir == "Conventional":
+        X = np.stack((XA, XB, XB, XA, XA), axis=1)
+        Y = np.stack((YA, YA, YB, YB, YA), axis=1)
+    else:
+        X = np.stack((XA, XA, XB, XB, XA), axis=1)
+        Y = np.stack((YA, YB, YB, YA, YA), axis=1)
+    n = len(XA)
+    motion = np.tile(np.array([RAPID, FEED, FEED, FEED, FEED], np.int8), n)
+    words = np.tile(np.array([W_X|W_Y] + [W_X|W_Y|W_F]*4, np.uint8), n)
+    role = np.tile(np.array([ROLE_HOP] + [ROLE_CUT]*4, np.uint8), n)
+    return motion[1:], words[1:], role[1:], X.ravel()[1:], Y.ravel()[1:]
+
+def spiralTemplate(params, XA, XB, YA, YB):
+    # gcodecore.facingSpiralLayer(): 4 feeds per ring, the 4th ends on the
+    # next ring's corner (the last ring closes on its own)
+    nextXA = np.append(XA[1:], XA[-1])
+    nextYA = np.append(YA[1:], YA[-1])
+    if params.cutDir == "Conventional":
+        X = np.stack((XB, XB, XA, XA), axis=1)
+        Y = np.stack((YA, YB, YB, nextYA), axis=1)
+    else:
+        X = np.stack((XA, XB, XB, nextXA), axis=1)
+        Y = np.stack((YB, YB, YA, YA), axis=1)
+    n = X.size
+    motion = np.full(n, FEED, np.int8)
+    words = np.full(n, W_X|W_Y|W_F, np.uint8)
+    role = np.full(n, ROLE_CUT, np.uint8)
+    return motion, words, role, X.ravel(), Y.ravel()
+
+def facingLayerTemplate(params):
+    # the Toolpath version of facingTemplate(), same as
+    # gcodecore.facingTemplate() builds with the scalar loop
+    p = params
+    g = gcodecore.Grid(p)
+    rings = facingRings(p)
+    motion, words, role, X, Y = facingTemplate(p, rings)
+    n = len(motion)
+    template = Toolpath.fromArrays(motion, words, role, X, Y, np.full(n, g.unset),
+                                   np.full(n, g.feedRate),
+                                   start=(g.unset, g.unset, g.unset, g.feedRate),
+                                   decimals=g.decimals)
+    template.key = object()
+    template.rings = len(rings[0])
+    return template
+
+def facingPathVec(params):
+    return gcodecore.facingPath(params, facingLayerTemplate(params))
+
+def facingLinesVec(params):
+    return emitText(facingPathVec(params))
+
+def facingVec(params):
+    return "".join(facingLinesVec(params))
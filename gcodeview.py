@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# Virtualized gcode viewer
+# Copyright 2017 - Michael T. Mayers
+# Licensed under the GPLV3 - see https://www.gnu.org/licenses/gpl-3.0.html
+#
+# paints only the lines in view, straight out of a gcodeio.LineStore
+# (the streamed program or an mmap()ed .ngc), with line numbers. the
+# scroll bar counts lines, so 10M+ line programs scroll and jump as
+# fast as small ones and nothing is laid out up front.
+#
+# BackplotView draws a gcodeplot.PlotData (built from the toolpath
+# chunks, numpy): feeds and rapids in their own colours, a range of
+# layers, top or iso view, wheel zoom, drag to pan, double click to fit.
+# it only draws the level of detail the zoom asks for, block by block,
+# out of QPolygonF vertex buffers filled straight from the arrays.
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QAbstractScrollArea, QWidget
+from PyQt5.QtGui import QPainter, QFont, QFontMetrics, QColor, QPen, QPolygonF, QTransform
+
+from gcodeio import LineStore
+
+LAYER_MARK = b"(feed to Z)"
+
+#############################################################################
+
+class ProgramView(QAbstractScrollArea):
+
+    def __init__(self, parent=None):
+        super(ProgramView, self).__init__(parent)
+        font = QFont("Monospace")
+        font.setStyleHint(QFont.TypeWriter)
+        self.viewport().setFont(font)
+        self.metrics = QFontMetrics(font)
+        self.background = QColor(96, 32, 96)
+        self.foreground = QColor(255, 255, 255)
+        self.gutter = QColor(160, 160, 192)
+        self.current = QColor(128, 64, 128)
+        self.marked = -1
+        self.layerLines = None
+        self.setStore(LineStore())
+
+    ###################################
+
+    def setStore(self, store):
+        old = getattr(self, "store", None)
+        if old is not None and old is not store:
+            old.close()
+        self.store = store
+        self.layerLines = None
+        self.marked = -1
+        self.verticalScrollBar().setValue(0)
+        self.updateRange()
+
+    def clear(self):
+        self.setStore(LineStore())
+
+    def openFile(self, path):
+        self.setStore(LineStore.fromFile(path))
+
+    def append(self, text):
+        # streamed program text, repaints only if the new lines are in view
+        first = self.store.lineCount()
+        self.store.append(text)
+        self.layerLines = None
+        self.updateRange()
+        top = self.verticalScrollBar().value()
+        if first <= top + self.pageLines():
+            self.viewport().update()
+
+    ###################################
+
+    def lineHeight(self):
+        return self.metrics.lineSpacing()
+
+    def pageLines(self):
+        return max(1, self.viewport().height() // self.lineHeight())
+
+    def updateRange(self):
+        bar = self.verticalScrollBar()
+        bar.setRange(0, max(0, self.store.lineCount() - self.pageLines()))
+        bar.setPageStep(self.pageLines())
+        bar.setSingleStep(1)
+        self.viewport().update()
+
+    def resizeEvent(self, event):
+        super(ProgramView, self).resizeEvent(event)
+        self.updateRange()
+
+    def scrollContentsBy(self, dx, dy):
+        self.viewport().update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self.viewport())
+        rect = self.viewport().rect()
+        painter.fillRect(rect, self.background)
+        top = self.verticalScrollBar().value()
+        h = self.lineHeight()
+        lines = self.store.lines(top, self.pageLines() + 1)
+        width = self.metrics.width("%d" % max(self.store.lineCount(), 1)) + 8
+        ascent = self.metrics.ascent()
+        for i, line in enumerate(lines):
+            y = i*h
+            if top + i == self.marked:
+                painter.fillRect(0, y, rect.width(), h, self.current)
+            painter.setPen(self.gutter)
+            painter.drawText(4, y + ascent, "%d" % (top + i + 1))
+            painter.setPen(self.foreground)
+            painter.drawText(width + 4, y + ascent, line)
+        painter.end()
+
+    ###################################
+
+    def lineCount(self):
+        return self.store.lineCount()
+
+    def gotoLine(self, n):
+        # n is 1 based like the gutter, the line ends up a few lines
+        # from the top and highlighted
+        n = max(0, min(n - 1, self.store.lineCount() - 1))
+        self.marked = n
+        self.verticalScrollBar().setValue(max(0, n - 3))
+        self.viewport().update()
+
+    def layers(self):
+        # 0 based line numbers of the layer plunges
+        if self.layerLines is None:
+            self.layerLines = self.store.findLines(LAYER_MARK)
+        return self.layerLines
+
+    def gotoLayer(self, k):
+        # k is 1 based
+        layers = self.layers()
+        if layers:
+            self.gotoLine(layers[max(1, min(k, len(layers))) - 1] + 1)
+
+    def lines(self, first, count):
+        return self.store.lines(first, count)
+
+    def text(self):
+        return self.store.text()
+
+#############################################################################
+
+class BackplotView(QWidget):
+
+    def __init__(self, parent=None):
+        super(BackplotView, self).__init__(parent)
+        self.background = QColor(32, 16, 32)
+        self.feedPen = QPen(QColor(255, 255, 128), 0)
+        self.rapidPen = QPen(QColor(96, 192, 255), 0)
+        self.data = None
+        self.projection = "top"
+        self.first = 0
+        self.last = None
+        self.scale = 1.0
+        self.center = (0.0, 0.0)
+        self.drag = None
+        self.polys = {}
+        self.setMinimumSize(240, 240)
+
+    ###################################
+
+    def setData(self, data):
+        self.data = data
+        self.polys = {}
+        self.first = 0
+        self.last = None
+        self.fit()
+
+    def clear(self):
+        self.setData(None)
+
+    def setProjection(self, projection):
+        self.projection = projection
+        self.polys = {}
+        self.fit()
+
+    def setLayers(self, first, last):
+        # 0 based, inclusive
+        self.first = first
+        self.last = last
+        self.polys = {}
+        self.update()
+
+    def fit(self):
+        if self.data is not None:
+            u0, v0, u1, v1 = self.data.extent(self.projection)
+            self.center = ((u0 + u1)/2.0, (v0 + v1)/2.0)
+            self.scale = 0.9*min(self.width()/max(u1 - u0, 1e-9), self.height()/max(v1 - v0, 1e-9))
+        self.update()
+
+    ###################################
+
+    def toPlane(self, x, y):
+        return (self.center[0] + (x - self.width()/2.0)/self.scale,
+                self.center[1] - (y - self.height()/2.0)/self.scale)
+
+    def wheelEvent(self, event):
+        # zoom about the point under the cursor
+        pos = event.pos()
+        u, v = self.toPlane(pos.x(), pos.y())
+        self.scale *= 1.25**(event.angleDelta().y()/120.0)
+        nu, nv = self.toPlane(pos.x(), pos.y())
+        self.center = (self.center[0] + u - nu, self.center[1] + v - nv)
+        self.update()
+
+    def mousePressEvent(self, event):
+        self.drag = (event.pos(), self.center)
+
+    def mouseMoveEvent(self, event):
+        if self.drag is not None:
+            pos, center = self.drag
+            d = event.pos() - pos
+            self.center = (center[0] - d.x()/self.scale, center[1] + d.y()/self.scale)
+            self.update()
+
+    def mouseReleaseEvent(self, event):
+        self.drag = None
+
+    def mouseDoubleClickEvent(self, event):
+        self.fit()
+
+    def resizeEvent(self, event):
+        super(BackplotView, self).resizeEvent(event)
+        self.fit()
+
+    ###################################
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), self.background)
+        if self.data is None:
+            painter.end()
+            return
+        umin, vmax = self.toPlane(0, 0)
+        umax, vmin = self.toPlane(self.width(), self.height())
+        view = QTransform(self.scale, 0, 0, -self.scale,
+                          self.width()/2.0 - self.center[0]*self.scale,
+                          self.height()/2.0 + self.center[1]*self.scale)
+        draws = self.data.draws(self.projection, 1.0/self.scale, self.first, self.last)
+        # every feed first, so rapids stay on top where they share a path
+        for rapid, pen in ((False, self.feedPen), (True, self.rapidPen)):
+            painter.setPen(pen)
+            for lod, du, dv in draws:
+                painter.setTransform(QTransform.fromTranslate(du, dv) * view)
+                S, blocks = (lod.rapids, lod.rapidBlocks) if rapid else (lod.feeds, lod.feedBlocks)
+                for a, b, bu0, bv0, bu1, bv1 in blocks:
+                    if bu1 + du < umin or bu0 + du > umax or bv1 + dv < vmin or bv0 + dv > vmax:
+                        continue
+                    painter.drawLines(self.polygon(S, a, b))
+        painter.end()
+
+    def polygon(self, S, a, b):
+        # rows a..b of an (n, 4) segment array as point pairs, kept
+        import numpy as np
+        hit = self.polys.get((id(S), a))
+        if hit is not None and hit[0] is S:
+            return hit[1]
+        poly = QPolygonF(2*(b - a))
+        ptr = poly.data()
+        ptr.setsize(32*(b - a))
+        np.frombuffer(ptr, dtype=np.float64)[:] = S[a:b].ravel()
+        self.polys[(id(S), a)] = (S, poly)
+        return poly
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# Background program generation for the Qt windows
+# Copyright 2017 - Michael T. Mayers
+# Licensed under the GPLV3 - see https://www.gnu.org/licenses/gpl-3.0.html
+#
+# one worker thread per window runs ProgramModel generations and streams
+# the text back in blocks, with layer / ring progress. every request gets
+# a job number; starting a new one (or cancel()) makes the running job
+# stale and it stops at its next chunk, so a queue of edits never builds
+# up behind a long program.
+#
+# facing programs are checked with gcodesim once they are out (when
+# numpy is there), the window shows whether the face is cleared. the
+# backplot data (gcodeplot) is collected from the same chunks.
+#
+# every generation is timed stage by stage with a gcodeprof.Profiler,
+# handed to the window with profiled() at the end (deep = cProfile and
+# tracemalloc as well, set from the window).
+
+import time
+
+import gcodeprof
+from PyQt5.QtCore import QObject, QThread, pyqtSignal, pyqtSlot
+
+from gcodecore import Grid
+from gcodemodel import ProgramModel
+from gcodeemit import emitText
+from cycletime import Estimator, ACCEL
+
+BLOCKSIZE = 1<<18   # chars per text block sent to the window
+BLOCKTIME = 0.05    # or whatever was made in this many seconds
+
+#############################################################################
+
+class GenerateWorker(QObject):
+
+    chunk = pyqtSignal(int, str)                   # job, text block
+    progress = pyqtSignal(int, int, int, int, int) # job, layers done/total, rings done/total
+    finished = pyqtSignal(int, int)                # job, lines
+    estimated = pyqtSignal(int, float, float)      # job, minutes at constant speed / accelerating
+    simulated = pyqtSignal(int, object)            # job, gcodesim report
+    plotted = pyqtSignal(int, object)              # job, gcodeplot.PlotData
+    profiled = pyqtSignal(int, object)             # job, gcodeprof.Profiler
+    cancelled = pyqtSignal(int)
+    failed = pyqtSignal(int, str)
+
+    def __init__(self, kind, engine="auto"):
+        super(GenerateWorker, self).__init__()
+        self.model = ProgramModel(kind, engine)
+        self.current = 0  # set by the window's thread, newest job number
+        self.deep = False # cProfile / tracemalloc the next generations
+
+    @pyqtSlot(int, object)
+    def run(self, job, params):
+        if job != self.current:
+            self.cancelled.emit(job)
+            return
+        try:
+            self.generate(job, params)
+        except Exception as e:
+            self.failed.emit(job, "%s" % e)
+
+    def generate(self, job, params):
+        prof = gcodeprof.Profiler(self.deep)
+        prof.start()
+        try:
+            self.generateProfiled(job, params, prof)
+        finally:
+            prof.stop()
+        self.profiled.emit(job, prof)
+
+    def generateProfiled(self, job, params, prof):
+        chunks = prof.tally(prof.wrap("geometry", self.model.chunks(params)))
+        template = self.model.template
+        nlayers = len(Grid(params).layerZs())
+        rings = template.rings
+        prof.count("layers", nlayers)
+        steady = Estimator()
+        accel = Estimator(accel=ACCEL)
+        sim = self.simulator(params)
+        plot = self.plotter()
+        expanded = params.layerMode == "expand"
+        if expanded:
+            chunks = prof.wrap("estimate", steady.tap(accel.tap(chunks)))
+            if sim is not None:
+                chunks = prof.wrap("simulate", sim.tap(chunks))
+            if plot is not None:
+                chunks = prof.wrap("plot", plot.tap(chunks))
+        done = [0]
+        def counted(chunks):
+            for tp in chunks:
+                yield tp
+                if tp.key is template.key:
+                    done[0] += 1
+        pending = []
+        size = 0
+        nlines = 0
+        t0 = time.perf_counter()
+        nbytes = 0
+        for text in prof.wrap("format", emitText(counted(chunks), self.model.textCache)):
+            if job != self.current:
+                self.cancelled.emit(job)
+                return
+            pending.append(text)
+            size += len(text)
+            nbytes += len(text)
+            if size >= BLOCKSIZE or time.perf_counter() - t0 >= BLOCKTIME:
+                with prof.stage("emit"):
+                    nlines += self.flush(job, pending)
+                pending = []
+                size = 0
+                t0 = time.perf_counter()
+                self.progress.emit(job, done[0], nlayers, done[0]*rings, nlayers*rings)
+        with prof.stage("emit"):
+            nlines += self.flush(job, pending)
+        prof.count("lines", nlines)
+        prof.count("bytes", nbytes)   # chars, the text is ascii
+        # o-word modes write the layer once for all of them
+        self.progress.emit(job, nlayers, nlayers, nlayers*rings, nlayers*rings)
+        if expanded:
+            self.estimated.emit(job, steady.minutes, accel.minutes)
+        self.finished.emit(job, nlines)
+        if not expanded and job == self.current:
+            # o-word programs hold the layer once, time / check / plot every one
+            for tp in prof.wrap("geometry", self.model.chunks(params.replace(layerMode="expand"))):
+                for user, name in ((steady, "estimate"), (accel, "estimate"), (sim, "simulate"),
+                                   (plot, "plot")):
+                    if user is not None:
+                        with prof.stage(name):
+                            user.add(tp)
+            self.estimated.emit(job, steady.minutes, accel.minutes)
+        if plot is not None and job == self.current:
+            with prof.stage("plot"):
+                plot.prepare()
+            self.plotted.emit(job, plot)
+        if sim is not None and job == self.current:
+            with prof.stage("simulate"):
+                report = sim.run()
+            self.simulated.emit(job, report)
+
+    def plotter(self):
+        try:
+            import gcodeplot
+        except ImportError:
+            return None
+        return gcodeplot.PlotData()
+
+    def simulator(self, params):
+        if self.model.kind != "facing":
+            return None
+        try:
+            import gcodesim
+        except ImportError:
+            return None
+        return gcodesim.Simulator(params)
+
+    def flush(self, job, pending):
+        if not pending:
+            return 0
+        text = "".join(pending)
+        self.chunk.emit(job, text)
+        return text.count("\n")
+
+#############################################################################
+
+class BackgroundGenerator(QObject):
+
+    requested = pyqtSignal(int, object)
+
+    def __init__(self, kind, engine="auto", parent=None):
+        super(BackgroundGenerator, self).__init__(parent)
+        self.job = 0
+        self.thread = QThread()
+        self.worker = GenerateWorker(kind, engine)
+        self.worker.moveToThread(self.thread)
+        self.requested.connect(self.worker.run)
+        self.thread.start()
+
+    def start(self, params):
+        # -> job number; whatever was running goes stale
+        self.job += 1
+        self.worker.current = self.job
+        self.requested.emit(self.job, params)
+        return self.job
+
+    def cancel(self):
+        self.worker.current = 0
+
+    def shutdown(self):
+        self.cancel()
+        self.thread.quit()
+        self.thread.wait()
@@ -0,0 +1,4 @@
+# the modules live flat in the repository root
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
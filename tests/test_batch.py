@@ -0,0 +1,37 @@
+import os, sys, subprocess
+
+import pytest
+
+import gcodebatch
+
+@pytest.mark.parametrize("row", [
+    {"kind": "facing", "x2": "4", "y2": "3", "docZ": "0"},
+    {"kind": "facing", "docXY": "0"},
+    {"kind": "recting", "docXY": "-0.1"},
+    {"kind": "facing", "toolDiam": "0"},    # docXY defaults to a quarter of it
+    {"kind": "facing", "feedRate": "0"},
+])
+def test_bad_steps_are_rejected_up_front(row):
+    with pytest.raises(ValueError, match="^job 3: "):
+        gcodebatch.makeJob(3, row)
+
+def test_runs_batch_with_a_pool(tmp_path):
+    jobs = [gcodebatch.makeJob(i+1, {"kind": kind, "x2": "2", "y2": "2"})
+            for i, kind in enumerate(("facing", "recting"))]
+    results = gcodebatch.runBatch(jobs, str(tmp_path), workers=2)
+    assert [r["index"] for r in results] == [1, 2]
+    assert all(r["lines"] > 0 for r in results)
+
+def test_library_does_not_import_the_cli():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.check_output([sys.executable, "-c",
+                                   "import sys, gcodebatch; print('gcodecli' in sys.modules)"], cwd=root)
+    assert out.strip() == b"False"
+
+def test_cli_parser_imports_no_subcommand_modules():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.check_output([sys.executable, "-c",
+                                   "import sys, gcodecli; gcodecli.makeParser().parse_args(['facing']); "
+                                   "print([m for m in ('gcodednc', 'gcodeserve', 'asyncio') if m in sys.modules])"],
+                                  cwd=root)
+    assert out.strip() == b"[]"
@@ -0,0 +1,128 @@
+import os, time, threading
+
+import pytest
+
+import gcodecore, gcodecache, gcodecli
+from gcodecache import ProgramCache, cacheKey
+from gcodecore import JobParams
+
+@pytest.fixture(autouse=True)
+def fresh(monkeypatch):
+    # every test starts without a running size
+    monkeypatch.setattr(gcodecache, "sizes", {})
+
+def program(n):
+    return ["G01 X%d\n" % i for i in range(n)]
+
+def age(cache, key, seconds):
+    t = time.time() - seconds
+    os.utime(cache.path(key), (t, t))
+
+def test_key():
+    params = JobParams(x1=0.0, x2=2.0, y1=0.0, y2=1.0)
+    key = cacheKey("facing", params)
+    assert key == cacheKey("facing", JobParams(x1=2.0, x2=0.0, y1=1.0, y2=0.0))
+    assert key != cacheKey("recting", params)
+    assert key != cacheKey("facing", params.replace(feedRate=7.0))
+    assert key != cacheKey("facing", params, modal=True)
+    assert cacheKey("facing", params, modal=True) != cacheKey("facing", params, modal=True, decimals=3)
+    # output options only count for modal programs
+    assert key == cacheKey("facing", params, decimals=3, comments=True)
+
+def test_hit_and_miss(tmp_path):
+    cache = ProgramCache(str(tmp_path))
+    made = []
+    def lines():
+        made.append(1)
+        return program(10)
+    meta, hit = cache.fetch("ab12", lines)
+    assert not hit and meta["lines"] == 10
+    meta, hit = cache.fetch("ab12", lines)
+    assert hit and meta["lines"] == 10 and len(made) == 1
+    with open(meta["path"]) as f:
+        assert f.read() == "".join(program(10))
+    assert cache.lookup("cd34") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+def test_least_recently_used_go_first(tmp_path):
+    cache = ProgramCache(str(tmp_path), maxBytes=None)
+    for i, key in enumerate(("aa01", "bb02", "cc03", "dd04")):
+        cache.store(key, program(100))
+        age(cache, key, 100 - i)
+    size = os.path.getsize(cache.path("aa01"))
+    cache.lookup("aa01")    # used again, the newest now
+    assert cache.evict(maxBytes=2*size) == 2
+    assert [cache.lookup(key) is not None for key in ("aa01", "bb02", "cc03", "dd04")] == [
+        True, False, False, True]
+
+def test_running_size(tmp_path, monkeypatch):
+    size = len("".join(program(100)))
+    cache = ProgramCache(str(tmp_path), maxBytes=int(4.2*size))
+    listings = []
+    entries = ProgramCache.entries
+    def counted(self, *args):
+        listings.append(1)
+        return entries(self, *args)
+    monkeypatch.setattr(ProgramCache, "entries", counted)
+    for i in range(4):
+        cache.store("%04d" % i, program(100))
+        age(cache, "%04d" % i, 100 - i)
+    # listed once for the first store, then counted
+    assert len(listings) == 1 and cache.evictions == 0
+    cache.store("0004", program(100))
+    # over the cap: down to EVICTTO of it, not just under it
+    assert len(listings) == 2 and cache.evictions == 2
+    assert [cache.lookup("%04d" % i) is not None for i in range(5)] == [False, False, True, True, True]
+    assert gcodecache.sizes[cache.root][0] == 3*size
+
+def test_stale_temp_files_are_removed(tmp_path):
+    cache = ProgramCache(str(tmp_path), maxBytes=1<<20)
+    cache.store("ab12", program(10))
+    d = os.path.dirname(cache.path("ab12"))
+    for name, seconds in (("old.tmp", 2*gcodecache.TMPAGE), ("new.tmp", 0)):
+        with open(os.path.join(d, name), "w") as f:
+            f.write("G01 X")
+        t = time.time() - seconds
+        os.utime(os.path.join(d, name), (t, t))
+    cache.evict(maxBytes=1<<20)
+    assert sorted(os.listdir(d)) == ["ab12.json", "ab12.ngc", "new.tmp"]
+
+def test_concurrent_stores_of_one_key(tmp_path):
+    barrier = threading.Barrier(4)
+    def lines():
+        # everyone is half way through the program at once
+        for i, line in enumerate(program(1000)):
+            if i == 500:
+                barrier.wait()
+            yield line
+    metas = []
+    def store():
+        metas.append(ProgramCache(str(tmp_path), maxBytes=1<<20).store("ab12", lines()))
+    threads = [threading.Thread(target=store) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(metas) == 4
+    meta = ProgramCache(str(tmp_path)).lookup("ab12")
+    assert meta["lines"] == 1000
+    with open(meta["path"]) as f:
+        assert f.read() == "".join(program(1000))
+    assert sorted(os.listdir(os.path.dirname(meta["path"]))) == ["ab12.json", "ab12.ngc"]
+
+def test_cli_hit_evicted_before_the_copy(tmp_path, monkeypatch, capsys):
+    root, out = str(tmp_path / "cache"), str(tmp_path / "out.ngc")
+    job = ["facing", "--x2", "2", "--y2", "2", "--cache", root, "-o", out]
+    assert gcodecli.main(job) == 0
+    lookup = ProgramCache.lookup
+    def evicted(self, key):
+        meta = lookup(self, key)
+        self.remove(key)
+        return meta
+    monkeypatch.setattr(ProgramCache, "lookup", evicted)
+    os.remove(out)
+    assert gcodecli.main(job) == 0
+    assert "cache miss" in capsys.readouterr().err.splitlines()[-1]
+    params = JobParams(x2=2.0, y2=2.0)
+    with open(out) as f:
+        assert f.read() == "".join(gcodecore.lineGenerator("facing")(params))
@@ -0,0 +1,50 @@
+import pytest
+
+import gcodecore, gcodebatch, gcodeserve, gcodecli, cycletime
+from gcodecore import JobParams, LAYERMODES
+
+STOCK = {"x2": 4.0, "y2": 3.0, "z1": 1.0, "z2": 0.5}
+
+def close(values):
+    return all(abs(v - values[0]) <= 1e-9*max(1.0, values[0]) for v in values)
+
+@pytest.mark.parametrize("kind", ["facing", "recting"])
+def test_machine_path_estimate_is_the_same_in_every_layer_mode(kind):
+    minutes = [cycletime.estimate(gcodecore.machinePath(kind)(JobParams(layerMode=m, **STOCK)))["minutes"]
+               for m in LAYERMODES]
+    assert close(minutes)
+    # and an expanded program's own chunks agree
+    expanded = cycletime.estimate(gcodecore.pathGenerator(kind)(JobParams(**STOCK)))["minutes"]
+    assert close(minutes + [expanded])
+
+@pytest.mark.parametrize("kind", ["facing", "recting"])
+def test_batch_minutes_expand_sub_loop(kind, tmp_path):
+    for cache in (None, (str(tmp_path / "cache"), None)):
+        minutes = []
+        for m in LAYERMODES:
+            job = gcodebatch.makeJob(1, dict(STOCK, kind=kind, layerMode=m))
+            minutes.append(gcodebatch.runJob(job, str(tmp_path / ("%s.ngc" % m)), cache=cache)["minutes"])
+        assert close(minutes)
+
+def test_serve_minutes_expand_sub_loop(tmp_path):
+    minutes = []
+    for m in LAYERMODES:
+        job = gcodebatch.makeJob(1, dict(STOCK, kind="facing", layerMode=m))
+        minutes.append(gcodeserve.generateJob(job, "auto", (str(tmp_path), None))["minutes"])
+    assert close(minutes)
+
+def test_cli_estimate_expand_sub_loop(capsys, tmp_path):
+    out = []
+    for m in LAYERMODES:
+        args = ["facing", "--x2", "4", "--y2", "3", "--z1", "1", "--z2", "0.5",
+                "--layerMode", m, "--estimate", "-o", str(tmp_path / "p.ngc")]
+        assert gcodecli.main(args) == 0
+        out.append(capsys.readouterr().err.split("cycle time")[1].splitlines()[0])
+    assert out[0] == out[1] == out[2]
+
+def test_strategy_saving_every_layer_mode():
+    savings = [cycletime.strategySaving(JobParams(layerMode=m, docXY=0.1, **STOCK)) for m in LAYERMODES]
+    for strategy in ("rings", "spiral"):
+        assert close([s[strategy] for s in savings])
+    rings = cycletime.estimate(gcodecore.pathGenerator("facing")(JobParams(docXY=0.1, **STOCK)))["minutes"]
+    assert close([savings[0]["rings"], rings])
@@ -0,0 +1,91 @@
+import sys, time, asyncio
+
+import pytest
+
+import gcodecore, gcodednc
+from gcodecore import JobParams
+from gcodeemit import emitText
+
+def program():
+    return emitText(gcodecore.pathGenerator("facing")(JobParams(x2=1.0, y2=1.0, z2=0.875, docXY=0.1)))
+
+def slowly(blocks, pause):
+    for block in blocks:
+        time.sleep(pause)
+        yield block
+
+async def streamToFake(blocks, pty, lineTime=0.0, **kwargs):
+    fake = gcodednc.FakeController(lineTime=lineTime)
+    if pty:
+        task, target = await fake.servePty()
+    else:
+        server, target = await fake.serveTcp()
+    try:
+        report = await gcodednc.streamTo(target, blocks, **kwargs)
+    finally:
+        if pty:
+            task.cancel()
+            fake.close()
+        else:
+            server.close()
+            await server.wait_closed()
+    return report, fake
+
+@pytest.mark.parametrize("pty", [False, pytest.param(True, marks=pytest.mark.skipif(
+    sys.platform == "win32", reason="no ptys"))])
+def test_stream(pty):
+    lines = [line for line in "".join(program()).splitlines() if gcodednc.cleanLine(line.encode())]
+    report, fake = asyncio.run(streamToFake(program(), pty))
+    assert report["lines"] == len(lines)
+    assert report["errors"] == [] and report["maxPending"] <= gcodednc.RXBUFFER
+    assert all(s["overflows"] == 0 for s in fake.sessions)
+
+def test_underruns_only_count_real_gaps():
+    # a source that keeps up starves nothing, a slow one shows
+    report, fake = asyncio.run(streamToFake(program(), False, underrun=0.02))
+    assert report["underruns"] == 0 and report["starved"] == 0.0
+    blocks = slowly(["G1 X%d\n" % i for i in range(5)], 0.05)
+    report, fake = asyncio.run(streamToFake(blocks, False, underrun=0.02))
+    assert report["underruns"] == 4
+    assert report["starved"] >= 4*0.02
+
+def test_pipe_writer_flow_control():
+    # drain() waits while the transport is above its high water mark
+    async def run():
+        protocol = gcodednc.WriteProtocol()
+        writer = gcodednc.PipeWriter(None, protocol)
+        await writer.drain()
+        protocol.pause_writing()
+        drain = asyncio.ensure_future(writer.drain())
+        await asyncio.sleep(0.01)
+        assert not drain.done()
+        protocol.resume_writing()
+        await asyncio.wait_for(drain, 1)
+        protocol.pause_writing()
+        drain = asyncio.ensure_future(writer.drain())
+        await asyncio.sleep(0)
+        protocol.connection_lost(None)
+        with pytest.raises(ConnectionError):
+            await drain
+        with pytest.raises(ConnectionError):
+            await writer.drain()
+        await asyncio.wait_for(writer.wait_closed(), 1)
+    asyncio.run(run())
+    assert not issubclass(gcodednc.WriteProtocol, getattr(asyncio.streams, "FlowControlMixin", ()))
+
+def test_pty_round_trip():
+    async def run():
+        fake = gcodednc.FakeController(lineTime=0.0, banner=False)
+        task, path = await fake.servePty()
+        try:
+            reader, writer = await gcodednc.connect(path)
+            writer.write(b"G1 X1\n"*64)
+            await writer.drain()
+            for i in range(64):
+                assert await asyncio.wait_for(reader.readline(), 5) == b"ok\r\n"
+            writer.close()
+            await writer.wait_closed()
+        finally:
+            task.cancel()
+            fake.close()
+    asyncio.run(run())
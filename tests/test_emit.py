@@ -0,0 +1,27 @@
+import gcodecore
+from gcodecore import JobParams
+from gcodeemit import emitModal, ModalWriter
+
+def loopProgram(comments):
+    params = JobParams(x2=1.0, y2=1.0, z2=0.875, docXY=0.25, layerMode="loop")
+    return "".join(emitModal(gcodecore.pathGenerator("facing")(params), 4, comments)).splitlines()
+
+def test_loop_feed_to_z_goes_through_the_modal_state():
+    lines = loopProgram(False)
+    i = lines.index("G1 Z[1.0 - #<layer> * 0.0625] F6")
+    assert lines[i+1] == "X1 Y0"       # G1 and F6 are known after it
+    assert not any("(" in line for line in lines)
+    lines = loopProgram(True)
+    i = lines.index("G1 Z[1.0 - #<layer> * 0.0625] F6 (feed to Z)")
+    assert lines[i+1] == "X1 Y0"
+
+def test_literal_lines():
+    w = ModalWriter(4)
+    w.state = (1, "0", "0", "1", "6")
+    assert w.literalText("G01 X0 Z[#1 + 1] F6 (feed)") == "Z[#1 + 1]\n"
+    assert w.state == (1, "0", "0", None, "6")
+    assert w.literalText("G00 X1.50000") == "G0 X1.5\n"
+    assert w.literalText("G0 X1.5") == ""
+    assert w.literalText("o100 call") == "o100 call\n"
+    assert w.state == (None, None, None, None, None)
+    assert w.literalText("G61 (exact path mode)") == "G61 (exact path mode)\n"
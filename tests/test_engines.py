@@ -0,0 +1,117 @@
+import random
+
+import pytest
+
+import gcodecore
+from gcodecore import JobParams, invfrange, CUTDIRS, LAYERMODES
+from gcodeemit import emitText
+
+pytest.importorskip("numpy")
+
+# the generate() of the original facing.py / recting.py windows, the
+# reference every engine and layer mode has to match byte for byte
+
+def baselineFacing(p):
+    xa, xb = p.xaxb()
+    ya, yb = p.yayb()
+    za, zb = p.zazb()
+    gcode = "G54\n"
+    gcode += "G00 Z%g (rapid to safeZ)\n" % (p.safeZ)
+    gcode += "G00 X%g Y%g F%g (rapid to startXY)\n" % (xa, ya, p.feedRate)
+    FirstZ = True
+    for z in invfrange(za, zb, -p.docZ):
+        xa, xb = p.xaxb()
+        ya, yb = p.yayb()
+        done = False
+        if False == FirstZ:
+            gcode += "G01 X%g Y%g F%g (feed to startXY)\n" % (xa, ya, p.feedRate)
+        FirstZ = False
+        gcode += "G01 Z%g F%g (feed to Z)\n" % (z, p.feedRate)
+        emitStartXY = False
+        while False == done:
+            if emitStartXY:
+                gcode += "G00 X%g Y%g (move to startXY)\n" % (xa, ya)
+            if p.cutDir == "Conventional":
+                corners = ((xb, ya), (xb, yb), (xa, yb), (xa, ya))
+            else:
+                corners = ((xa, yb), (xb, yb), (xb, ya), (xa, ya))
+            for x, y in corners:
+                gcode += "G01 X%g Y%g F%g\n" % (x, y, p.feedRate)
+            xa += p.docXY
+            xb -= p.docXY
+            ya += p.docXY
+            yb -= p.docXY
+            done = (xb < xa) or (yb < ya)
+            emitStartXY = True
+    gcode += "M2\n"
+    return gcode
+
+def baselineRecting(p):
+    xa, xb = p.xaxb()
+    ya, yb = p.yayb()
+    za, zb = p.zazb()
+    gcode = "(Generated by recting generator, yo..)\n"
+    gcode += "G20\n"
+    gcode += "G54\n"
+    gcode += "G61 (exact path mode)\n"
+    gcode += "G00 Z%g (rapid to safeZ)\n" % (p.safeZ)
+    gcode += "G00 X%g Y%g F%g (rapid to startXY)\n" % (xa, ya, p.feedRate)
+    FirstZ = True
+    for z in invfrange(za, zb, -p.docZ):
+        xa, xb = p.xaxb()
+        ya, yb = p.yayb()
+        if False == FirstZ:
+            gcode += "G01 X%g Y%g F%g (feed to startXY)\n" % (xa, ya, p.feedRate)
+        FirstZ = False
+        gcode += "G01 Z%g F%g (feed to Z)\n" % (z, p.feedRate)
+        gcode += "G00 X%g Y%g (move to startXY)\n" % (xa, ya)
+        if p.cutDir == "Conventional":
+            corners = ((xa, ya), (xb, ya), (xb, yb), (xa, yb))
+        else:
+            corners = ((xa, ya), (xa, yb), (xb, yb), (xb, ya))
+        for x, y in corners:
+            gcode += "G01 X%g Y%g F%g\n" % (x, y, p.feedRate)
+    gcode += "G00 Z%g (rapid to safeZ)\n" % (p.safeZ)
+    gcode += "M2\n"
+    return gcode
+
+BASELINE = {"facing": baselineFacing, "recting": baselineRecting}
+
+def randomParams(rng):
+    corners = [round(rng.uniform(-3, 3), rng.choice((0, 2, 4))) for i in range(4)]
+    z1, z2 = round(rng.uniform(0, 1), 3), round(rng.uniform(0, 1), 3)
+    return {"x1": corners[0], "x2": corners[1], "y1": corners[2], "y2": corners[3],
+            "z1": z1, "z2": z2, "safeZ": rng.choice((1.0, 2.0, 0.5)),
+            "docXY": rng.choice((0.25, 0.1, 0.05, 0.0137, 0.01)),
+            "docZ": rng.choice((0.125, 0.0625, 0.05, 0.01, 1.0)),
+            "feedRate": rng.choice((6.0, 12.5, 30.0)), "cutDir": rng.choice(CUTDIRS)}
+
+JOBS = [randomParams(random.Random(seed)) for seed in range(40)]
+
+@pytest.mark.parametrize("engine", ["scalar", "numpy"])
+@pytest.mark.parametrize("kind", ["facing", "recting"])
+def test_expand_matches_baseline(kind, engine):
+    lines = gcodecore.lineGenerator(kind, engine)
+    for kw in JOBS:
+        params = JobParams(**kw)
+        assert "".join(lines(params)) == BASELINE[kind](params), kw
+
+@pytest.mark.parametrize("layerMode", LAYERMODES)
+@pytest.mark.parametrize("kind", ["facing", "recting"])
+def test_layer_modes(kind, layerMode):
+    # the engines agree in every mode, and every mode runs the baseline's path
+    for kw in JOBS[:10]:
+        params = JobParams(layerMode=layerMode, **kw)
+        texts = ["".join(emitText(gcodecore.pathGenerator(kind, engine)(params)))
+                 for engine in ("scalar", "numpy")]
+        assert texts[0] == texts[1], kw
+        machine = ["".join(emitText(gcodecore.machinePath(kind, engine)(params)))
+                   for engine in ("scalar", "numpy")]
+        assert machine[0] == machine[1] == BASELINE[kind](params.replace(layerMode="expand")), kw
+
+def test_bench_engines():
+    import gcodebench
+    cases = gcodebench.matrix(["facing", "recting"], plates=(2,), docXYs=(0.1,), docZs=("1/8",))
+    rows = gcodebench.compareEngines(cases, repeat=1)
+    assert len(rows) == len(cases) == 4
+    assert all(row["same"] and set(row["seconds"]) == {"scalar", "numpy"} for row in rows)
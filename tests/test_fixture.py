@@ -0,0 +1,109 @@
+import random
+
+import pytest
+
+import gcodecore, gcodebatch, gcodefixture, gcodeparse, gcodecli
+from gcodecore import JobParams
+from gcodeemit import emitText
+from gcodefixture import Part
+
+def randomParts(seed, n):
+    rng = random.Random(seed)
+    parts = []
+    for i in range(n):
+        x, y = round(rng.uniform(0, 40), 2), round(rng.uniform(0, 30), 2)
+        w, h = round(rng.uniform(0.5, 3), 2), round(rng.uniform(0.5, 3), 2)
+        parts.append(Part("p%d" % i, rng.choice(("facing", "recting")),
+                          JobParams(x1=x, x2=x+w, y1=y, y2=y+h, z2=0.875, docXY=0.2,
+                                    safeZ=rng.choice((0.5, 1.0, 2.0)))))
+    return parts
+
+def legs(parts):
+    cost = [[gcodefixture.dist(a.exit, b.entry) for b in parts] for a in parts]
+    first = [gcodefixture.dist((0.0, 0.0), p.entry) for p in parts]
+    return cost, first
+
+@pytest.mark.parametrize("n", [1, 2, 5, 40])
+def test_planned_order_is_never_longer(n):
+    for seed in range(10):
+        parts = randomParts(seed, n)
+        order, report = gcodefixture.planOrder(parts)
+        assert sorted(order) == list(range(n))
+        cost, first = legs(parts)
+        nn = gcodefixture.nearestNeighbour(parts)
+        assert sorted(nn) == list(range(n))
+        planned = gcodefixture.tourLength(order, cost, first)
+        assert planned == pytest.approx(report["rapidPlanned"])
+        assert planned <= gcodefixture.tourLength(nn, cost, first) + 1e-9
+        assert planned <= report["rapidGiven"] + 1e-9
+        assert report["rapidSaved"] >= -1e-9
+
+def far(n):
+    # a tight cluster a long way from the machine origin
+    return [Part("f%d" % i, "facing", JobParams(x1=900+0.01*i, x2=901+0.01*i, y1=800.0, y2=801.0))
+            for i in range(n)]
+
+@pytest.mark.parametrize("parts", [randomParts(7, 60), far(1), far(5)])
+def test_nearest_neighbour_seed(parts):
+    # the grid index finds what a plain scan would
+    order, at, left = [], (0.0, 0.0), set(range(len(parts)))
+    while left:
+        i = min(left, key=lambda i: (gcodefixture.dist(at, parts[i].entry), i))
+        left.remove(i)
+        order.append(i)
+        at = parts[i].exit
+    assert gcodefixture.nearestNeighbour(parts) == order
+
+def program(parts, order=None, safeZ=None):
+    return "".join(emitText(gcodefixture.fixturePath(parts, order, safeZ)))
+
+def test_every_part_once():
+    parts = randomParts(3, 12)
+    order, report = gcodefixture.planOrder(parts)
+    text = program(parts, order)
+    for part in parts:
+        assert text.count(": %s)\n" % part.name) == 1
+    names = [line.split(": ")[1][:-1] for line in text.splitlines() if line.startswith("(part ")]
+    assert names == [parts[i].name for i in order]
+    assert text.count("M2\n") == 1 and text.endswith("M2\n")
+
+@pytest.mark.parametrize("kinds", [("facing", "recting", "facing"), ("recting", "facing", "recting")])
+def test_safe_z_between_parts(kinds):
+    parts = [Part("p%d" % i, kind, JobParams(x1=3.0*i, x2=3.0*i+2, y1=i, y2=i+1.5, z2=0.75,
+                                              docXY=0.3, safeZ=0.5*(i+1)))
+             for i, kind in enumerate(kinds)]
+    text = program(parts)
+    lines = text.splitlines()
+    starts = [n for n, line in enumerate(lines) if line.startswith("(part ")]
+    p = gcodeparse.parseBytes(text.encode())
+    tp = p.toolpath()
+    at = list(p.lineNumbers())
+    for start in starts[1:]:
+        # the first XY move into the next part starts and ends at safe Z,
+        # the highest any part asks for
+        k = next(k for k in range(len(at)) if at[k] > start)
+        while (tp.x[k], tp.y[k]) == (tp.x[k-1], tp.y[k-1]):
+            k += 1
+        assert tp.z[k-1] == tp.z[k] == 1.5, lines[at[k]]
+    assert "G00 Z1.5 (rapid to safeZ)" in lines[starts[0]+1]
+
+@pytest.mark.parametrize("manifest, message", [
+    ("kind,name,x2\nfacing,a,1,2\n", "job 1: more cells than columns"),
+    ("kind,name,x2\nfacing,a,2\nfacing,b,abc\n", "job 2: bad x2 <abc>"),
+    ("kind,name,x2\nmilling,a,2\n", "job 1: unknown kind <milling>"),
+    ("kind,name,depth\nfacing,a,2\n", "job 1: unknown column <depth>"),
+    ("kind,name,docXY\nfacing,a,0\n", "job 1: "),
+    ("kind,name,x2\n", "no parts in "),
+])
+def test_bad_manifest(manifest, message, tmp_path, capsys):
+    path = tmp_path / "parts.csv"
+    path.write_text(manifest)
+    assert gcodecli.main(["fixture", str(path), "-o", str(tmp_path / "out.ngc")]) == 2
+    err = capsys.readouterr().err
+    assert ("error: " + message) in err and "Traceback" not in err
+
+def test_bad_json_manifest(tmp_path):
+    path = tmp_path / "parts.json"
+    path.write_text('[{"kind": "facing"}, 3]')
+    with pytest.raises(ValueError, match="^job 2: "):
+        gcodebatch.readManifest(str(path))
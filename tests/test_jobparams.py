@@ -0,0 +1,16 @@
+import pytest
+
+import gcodecore
+from gcodecore import JobParams
+
+@pytest.mark.parametrize("key", ["docXY", "docZ", "feedRate"])
+@pytest.mark.parametrize("value", [0.0, -0.1, float("nan")])
+def test_steps_must_be_positive(key, value):
+    with pytest.raises(ValueError):
+        JobParams(**{key: value})
+    with pytest.raises(ValueError):
+        JobParams().replace(**{key: value})
+
+def test_defaults_are_valid():
+    p = JobParams()
+    assert gcodecore.Grid(p).layerZs()
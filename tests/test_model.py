@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+import gcodecore
+from gcodecore import JobParams, CUTDIRS, LAYERMODES, STRATEGIES
+from gcodemodel import ProgramModel
+from gcodeemit import emitText
+
+EDITS = {
+    "x1": lambda rng: round(rng.uniform(-2, 2), 3),
+    "x2": lambda rng: round(rng.uniform(-2, 2), 3),
+    "y1": lambda rng: round(rng.uniform(-2, 2), 3),
+    "y2": lambda rng: round(rng.uniform(-2, 2), 3),
+    "z1": lambda rng: round(rng.uniform(0, 1), 3),
+    "z2": lambda rng: round(rng.uniform(0, 1), 3),
+    "safeZ": lambda rng: rng.choice((0.5, 1.0, 2.0)),
+    "docXY": lambda rng: rng.choice((0.25, 0.1, 0.0137)),
+    "docZ": lambda rng: rng.choice((0.25, 0.125, 0.05)),
+    "feedRate": lambda rng: rng.choice((6.0, 12.5, 30.0, 45.0)),
+    "cutDir": lambda rng: rng.choice(CUTDIRS),
+    "strategy": lambda rng: rng.choice(STRATEGIES),
+    "layerMode": lambda rng: rng.choice(LAYERMODES),
+    "resolution": lambda rng: rng.choice((None, 1e-4, 1e-3)),
+    "toolDiam": lambda rng: rng.choice((0.25, 0.5)),
+}
+
+# the non geometric edits weigh more, they are the ones the model saves on
+WEIGHTS = {"feedRate": 6, "safeZ": 3, "z1": 2, "z2": 2, "docZ": 2, "layerMode": 2}
+
+SEQUENCES = 400     # per kind and engine, 1600 in all
+STEPS = 6
+
+@pytest.mark.parametrize("engine", ["scalar", "numpy"])
+@pytest.mark.parametrize("kind", ["facing", "recting"])
+def test_random_edit_sequences(kind, engine):
+    if engine == "numpy":
+        pytest.importorskip("numpy")
+    rng = random.Random("%s-%s" % (kind, engine))
+    names = [name for name in EDITS for i in range(WEIGHTS.get(name, 1))]
+    for n in range(SEQUENCES):
+        model = ProgramModel(kind, engine)
+        params = JobParams(x1=0.0, x2=2.0, y1=0.0, y2=1.5, z1=1.0, z2=0.75, docXY=0.1)
+        edits = []
+        for step in range(STEPS):
+            name = rng.choice(names)
+            edits.append((name, EDITS[name](rng)))
+            params = params.replace(**{name: edits[-1][1]})
+            full = "".join(emitText(gcodecore.pathGenerator(kind, engine)(params)))
+            assert model.text(params) == full, edits
+    assert model.rebuilds + model.refeeds + model.reuses == STEPS
+
+def test_feed_edit_refeeds():
+    model = ProgramModel("facing")
+    params = JobParams(x2=4.0, y2=3.0, z2=0.5, docXY=0.01)
+    model.text(params)
+    for feed in (7.0, 8.0):
+        params = params.replace(feedRate=feed)
+        assert model.text(params) == "".join(emitText(gcodecore.pathGenerator("facing")(params)))
+    params = params.replace(safeZ=1.0, layerMode="loop")
+    assert model.text(params) == "".join(emitText(gcodecore.pathGenerator("facing")(params)))
+    assert model.stats() == {"rebuilds": 1, "refeeds": 2, "reuses": 1}
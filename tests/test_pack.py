@@ -0,0 +1,51 @@
+import pytest
+
+import gcodecore, gcodepack, gcodecli
+from gcodecore import JobParams
+from gcodeemit import emitText, emitModal
+
+CASES = [
+    ("facing", {}),
+    ("facing", {"x1": 1.23445, "y1": 0.00005, "docXY": 0.0137}),   # %.4f rounding edges
+    ("facing", {"resolution": 1e-4}),
+    ("facing", {"layerMode": "sub"}),
+    ("facing", {"layerMode": "loop"}),
+    ("facing", {"strategy": "spiral"}),
+    ("recting", {}),
+    ("recting", {"x1": 1.23445, "cutDir": "Climb"}),
+    ("recting", {"layerMode": "loop"}),
+]
+
+@pytest.mark.parametrize("kind, kw", CASES)
+def test_round_trip_text_and_modal(kind, kw, tmp_path):
+    params = JobParams(**dict({"x2": 6.0, "y2": 4.0, "z2": 0.75}, **kw))
+    gen = gcodecore.pathGenerator(kind)
+    path = str(tmp_path / "p.gcpk")
+    gcodepack.savePack(gen(params), path)
+    back = gcodepack.loadPack(path)
+    assert "".join(emitText(back)) == "".join(emitText(gen(params)))
+    for decimals in (2, 4, 6):
+        assert ("".join(emitModal(gcodepack.loadPack(path), decimals)) ==
+                "".join(emitModal(gen(params), decimals)))
+
+def test_values_are_kept_exactly(tmp_path):
+    params = JobParams(x1=1.23445, x2=6.0, y2=4.0, z2=0.75)
+    path = str(tmp_path / "p.gcpk")
+    gcodepack.savePack(gcodecore.pathGenerator("facing")(params), path)
+    for a, b in zip(gcodepack.loadPack(path), gcodecore.pathGenerator("facing")(params)):
+        for name in ("x", "y", "f"):
+            assert list(getattr(a, name)) == pytest.approx(list(getattr(b, name)), rel=0, abs=0, nan_ok=True)
+
+def test_cli_unpack_modal(tmp_path, capsys):
+    ngc, pack, out = [str(tmp_path / n) for n in ("m.ngc", "m.gcpk", "u.ngc")]
+    job = ["facing", "--x1", "1.23445", "--x2", "4", "--y2", "3", "--z2", "0.5", "--modal"]
+    assert gcodecli.main(job + ["-o", ngc, "--pack", pack]) == 0
+    assert gcodecli.main(["unpack", pack, "--modal", "-o", out]) == 0
+    assert open(ngc).read() == open(out).read()
+
+def test_layers_are_stored_once(tmp_path):
+    params = JobParams(x2=12.0, y2=12.0, z2=0.5, docXY=0.01)
+    path = str(tmp_path / "p.gcpk")
+    nchunks, nbodies, segments, nbytes = gcodepack.savePack(gcodecore.pathGenerator("facing")(params), path)
+    text = sum(len(t) for t in emitText(gcodecore.pathGenerator("facing")(params)))
+    assert nbodies < nchunks and nbytes*5 < text
@@ -0,0 +1,64 @@
+import pytest
+
+import gcodecore, gcodeparse
+from gcodecore import JobParams
+from gcodeemit import emitText, emitModal
+
+def test_unclosed_comment_ends_at_its_line():
+    p = gcodeparse.parseBytes(b"G0 X0 Y0 Z1 (unclosed\nG1 F12.5 X3 Y4\nG1 X5 (closed) Y6\n")
+    tp = p.toolpath()
+    assert list(tp.x) == [0, 3, 5]
+    assert list(tp.y) == [0, 4, 6]
+    assert list(tp.f)[1:] == [12.5, 12.5]
+    assert list(p.lineNumbers()) == [0, 1, 2]
+    assert p.stats()["badWords"] == 0
+
+def test_words():
+    p = gcodeparse.parseBytes(b"g1x-1.5y+2z.5f6.\nX1.2.3 Y-.25 ; Z9\nX6.4e-05 (X7)\n")
+    tp = p.toolpath()
+    assert list(tp.x) == [-1.5, -1.5, 6.4e-05]
+    assert list(tp.y) == [2.0, -0.25, -0.25]
+    assert list(tp.z) == [0.5, 0.5, 0.5]
+    assert list(tp.f) == [6.0, 6.0, 6.0]
+    assert p.stats()["badWords"] == 1
+
+def bare(chunks):
+    # the chunks without their pre / post lines, which are no segments
+    for tp in chunks:
+        tp.pre = []
+        tp.post = []
+    return chunks
+
+@pytest.mark.parametrize("blocksize", [64, gcodeparse.PARSEBLOCK])
+@pytest.mark.parametrize("kind", ["facing", "recting"])
+def test_round_trip(kind, blocksize):
+    params = JobParams(x1=1.23445, x2=6.0, y2=4.0, z2=0.75, docXY=0.0137)
+    chunks = list(gcodecore.machinePath(kind)(params))
+    text = "".join(emitText(chunks)).encode()
+    back = gcodeparse.parseBytes(text, blocksize).toolpath()
+    assert "".join(emitText([back])) == "".join(emitText(bare(chunks)))
+    chunks = list(gcodecore.machinePath(kind)(params))
+    text = "".join(emitModal(chunks, 4, comments=True)).encode()
+    back = gcodeparse.parseBytes(text, blocksize).toolpath()
+    assert ("".join(emitModal([back], 4, comments=True)) ==
+            "".join(emitModal(bare(chunks), 4, comments=True)))
+
+@pytest.mark.parametrize("text", [b"G01 X1 Y2 (unclosed\nG01 X3\n",
+                                  b"G01 X1 Y2 (unclosed\nG01 X3 (also\n",
+                                  b"(a) G01 X1 Y2 (unclosed\nG01 X3"])
+def test_no_close_paren_after_it(text, tmp_path):
+    path = tmp_path / "u.ngc"
+    path.write_bytes(text)
+    for p in (gcodeparse.parseBytes(text), gcodeparse.parseFile(str(path))):
+        tp = p.toolpath()
+        assert list(tp.x) == [1, 3]
+        assert list(tp.y) == [2, 2]
+
+def test_parse_file_error_is_not_masked(tmp_path, monkeypatch):
+    path = tmp_path / "p.ngc"
+    path.write_bytes(b"G01 X1\n")
+    def fail(self, buf):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(gcodeparse.Parser, "parse", fail)
+    with pytest.raises(RuntimeError):
+        gcodeparse.parseFile(str(path))
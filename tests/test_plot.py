@@ -0,0 +1,105 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import gcodecore, gcodeplot
+from gcodecore import JobParams
+
+def plotData(kind="facing", **kw):
+    params = JobParams(**dict(dict(x1=0.5, x2=6.0, y1=-1.0, y2=3.0, z2=0.75, docXY=0.01), **kw))
+    data = gcodeplot.PlotData()
+    for tp in gcodecore.pathGenerator(kind)(params):
+        data.add(tp)
+    return data
+
+def drawn(data, projection, pixel):
+    # every (u0, v0, u1, v1) a view at this pixel size draws, layer offsets applied
+    out = []
+    for lod, du, dv in data.draws(projection, pixel):
+        for S in (lod.feeds, lod.rapids):
+            out.append(S + (du, dv, du, dv))
+    return np.vstack(out)
+
+def bounds(S):
+    return (min(S[:,0].min(), S[:,2].min()), min(S[:,1].min(), S[:,3].min()),
+            max(S[:,0].max(), S[:,2].max()), max(S[:,1].max(), S[:,3].max()))
+
+@pytest.mark.parametrize("projection", ["top", "iso"])
+@pytest.mark.parametrize("kind", ["facing", "recting"])
+def test_full_detail_below_the_threshold(kind, projection):
+    data = plotData(kind)
+    base = data.cell(projection, 0)
+    assert data.level(projection, base/2) == -1
+    S = drawn(data, projection, base/2)
+    full = drawn(data, projection, 0.0)
+    assert len(S) == len(full)
+    assert np.array_equal(np.unique(S, axis=0), np.unique(full, axis=0))
+    assert bounds(S) == bounds(full)
+    # the extent a view fits to holds it (exactly, seen from the top)
+    u0, v0, u1, v1 = data.extent(projection)
+    assert u0 <= S[:,[0,2]].min() and v0 <= S[:,[1,3]].min()
+    assert u1 >= S[:,[0,2]].max() and v1 >= S[:,[1,3]].max()
+    if projection == "top":
+        assert bounds(S) == pytest.approx((u0, v0, u1, v1))
+
+@pytest.mark.parametrize("projection", ["top", "iso"])
+def test_decimated_keeps_ends_and_extent(projection):
+    data = plotData()
+    full = drawn(data, projection, 0.0)
+    u0, v0, u1, v1 = bounds(full)
+    points = np.vstack((full[:,:2], full[:,2:]))
+    # the program's ends and the endpoints that set its bounding box
+    kept = [full[0,:2], full[-1,2:]] + [points[f(points[:,k])] for f in (np.argmin, np.argmax)
+                                        for k in (0, 1)]
+    previous = len(full)
+    for level in range(gcodeplot.LEVELS):
+        cell = data.cell(projection, level)
+        pixel = cell*1.5
+        assert data.level(projection, pixel) == level
+        S = drawn(data, projection, pixel)
+        # fewer segments the coarser the level, bounded by the cells covered
+        assert len(S) <= previous
+        previous = len(S)
+        assert len(S) <= 4*((u1 - u0)/cell + 2)*((v1 - v0)/cell + 2)
+        # the bounding box stays within a cell, every point of kept is
+        # within a cell of an endpoint drawn
+        assert bounds(S) == pytest.approx((u0, v0, u1, v1), abs=cell)
+        ends = np.vstack((S[:,:2], S[:,2:]))
+        for p in kept:
+            near = np.abs(ends - p).max(axis=1)
+            assert near.min() <= cell
+    assert previous < len(full)/5
+    assert data.level(projection, 1e9) == gcodeplot.LEVELS - 1
+
+def test_view_fits_and_draws():
+    QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    from gcodeview import BackplotView
+    data = plotData()
+    data.prepare()
+    view = BackplotView()
+    view.resize(320, 240)
+    view.setData(data)
+    u0, v0, u1, v1 = data.extent("top")
+    left, top = view.toPlane(0, 0)
+    right, bottom = view.toPlane(view.width(), view.height())
+    assert left < u0 and right > u1 and bottom < v0 and top > v1
+    image = view.grab().toImage()
+    background = view.background.rgb()
+    hits = [(x, y) for x in range(0, image.width(), 2) for y in range(0, image.height(), 2)
+            if image.pixel(x, y) != background]
+    assert hits
+    # what is drawn is where the plot is
+    xs = [x for x, y in hits]
+    ys = [y for x, y in hits]
+    lo = view.toPlane(min(xs), max(ys))
+    hi = view.toPlane(max(xs), min(ys))
+    span = 2/view.scale + 1e-9
+    assert lo[0] >= u0 - span and lo[1] >= v0 - span and hi[0] <= u1 + span and hi[1] <= v1 + span
+    # the line buffer handed to Qt holds the segment rows
+    lod = data.draws("top", 1.0/view.scale)[0][0]
+    poly = view.polygon(lod.feeds, 0, 3)
+    assert [(poly[i].x(), poly[i].y()) for i in range(6)] == [tuple(p) for p in lod.feeds[:3].reshape(6, 2)]
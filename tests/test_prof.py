@@ -0,0 +1,47 @@
+import tracemalloc
+
+import pytest
+
+import gcodecore, gcodeprof
+from gcodecore import JobParams
+from gcodemodel import ProgramModel
+
+def generate(prof):
+    params = JobParams(x2=2.0, y2=2.0, z2=0.75, docXY=0.05)
+    prof.start()
+    for tp in prof.wrap("geometry", gcodecore.pathGenerator("facing")(params)):
+        prof.count("chunks")
+    prof.stop()
+    return prof.report()
+
+def test_deep_starts_and_stops_tracemalloc():
+    assert not tracemalloc.is_tracing()
+    r = generate(gcodeprof.Profiler(deep=True))
+    assert not tracemalloc.is_tracing()
+    assert r["peakBytes"] > 0 and r["counters"]["chunks"] > 0
+
+def test_deep_leaves_others_tracing_alone():
+    tracemalloc.start()
+    try:
+        kept = tracemalloc.get_traced_memory()
+        r = generate(gcodeprof.Profiler(deep=True))
+        assert tracemalloc.is_tracing()
+        assert r["peakBytes"] >= kept[0]
+    finally:
+        tracemalloc.stop()
+
+@pytest.mark.parametrize("engine", ["scalar", "numpy"])
+@pytest.mark.parametrize("layerMode", ["expand", "sub", "loop"])
+def test_rings_per_kind_and_strategy(layerMode, engine):
+    # 3x2 stepping in 0.25 a side: 5 rings, whether they are cut as rings
+    # or as one spiral. recting goes round the outline once a layer
+    params = JobParams(x2=3.0, y2=2.0, z2=0.5, docXY=0.25, layerMode=layerMode)
+    cases = [("facing", "rings", 5), ("facing", "spiral", 5), ("recting", "rings", 1)]
+    for kind, strategy, rings in cases:
+        p = params.replace(strategy=strategy)
+        template = ProgramModel(kind, engine).layerTemplate(p)
+        assert template.rings == template.withFeed(9.0).rings == template.atZ(0.25).rings == rings
+        prof = gcodeprof.Profiler()
+        for tp in prof.tally(gcodecore.pathGenerator(kind, engine)(p)):
+            pass
+        assert prof.counters["rings"] == rings, (kind, strategy)
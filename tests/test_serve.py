@@ -0,0 +1,66 @@
+import json, asyncio
+
+import pytest
+
+import gcodeserve
+
+def run(coro):
+    return asyncio.run(coro)
+
+async def post(port, path, job):
+    reader, writer = await asyncio.open_connection(gcodeserve.HOST, port)
+    body = json.dumps(job).encode("utf-8")
+    writer.write(b"POST %s HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s" % (path.encode(), len(body), body))
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    status = int(data.split(b" ", 2)[1])
+    return status, data
+
+async def withService(tmp_path, test, **kwargs):
+    service = gcodeserve.Service(workers=1, cacheRoot=str(tmp_path), **kwargs)
+    port = await service.start(0)
+    try:
+        return await test(service, port)
+    finally:
+        await service.close()
+
+@pytest.mark.parametrize("job", [{"docZ": 0}, {"docXY": 0}, {"docXY": -1},
+                                 {"feedRate": 0}])
+def test_bad_steps_are_400(tmp_path, job):
+    async def test(service, port):
+        for kind in ("/facing", "/recting"):
+            status, data = await asyncio.wait_for(post(port, kind, job), 10)
+            assert status == 400, data
+        assert not service.making
+    run(withService(tmp_path, test))
+
+def test_slow_program_times_out_and_frees_the_worker(tmp_path):
+    async def test(service, port):
+        big = {"x2": 48, "y2": 48, "docXY": 0.001, "docZ": 0.001, "z2": 0.5}
+        status, data = await asyncio.wait_for(post(port, "/facing", big), 20)
+        assert status == 504, data
+        assert not service.making
+        status, data = await asyncio.wait_for(post(port, "/facing", {"x2": 2}), 20)
+        assert status == 200, data
+    run(withService(tmp_path, test, genTimeout=0.2))
+
+def test_no_second_response_after_the_headers(tmp_path):
+    class Writer(object):
+        def __init__(self):
+            self.data = b""
+            self.transport = self
+            self.aborted = False
+        def write(self, data):
+            self.data += data
+        async def drain(self):
+            pass
+        def abort(self):
+            self.aborted = True
+    async def test(service, port):
+        w = Writer()
+        await service.fail(w, {"sent": True}, 500, "boom")
+        assert w.aborted and w.data == b""
+        await service.fail(w, {"sent": False}, 500, "boom")
+        assert w.data.startswith(b"HTTP/1.1 500")
+    run(withService(tmp_path, test))
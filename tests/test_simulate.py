@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+import gcodecli
+
+@pytest.mark.parametrize("mode", ["expand", "sub", "loop"])
+def test_cli_simulate_every_layer_mode(mode, capsys, tmp_path):
+    args = ["facing", "--x2", "4", "--y2", "3", "--z1", "1", "--z2", "0.5",
+            "--layerMode", mode, "--simulate", "-o", str(tmp_path / "p.ngc")]
+    assert gcodecli.main(args) == 0
+    err = capsys.readouterr().err
+    assert "face cleared" in err and "uncut" not in err
+
+def test_coverage_is_the_swept_disks():
+    import numpy as np, gcodesim
+    from gcodecore import JobParams
+    rng = np.random.default_rng(7)
+    sim = gcodesim.Simulator(JobParams(x2=3.0, y2=2.0, z1=1.0, z2=0.5))
+    X = sim.x0 + (np.arange(sim.nx) + 0.5)*sim.cell
+    Y = sim.y0 + (np.arange(sim.ny) + 0.5)*sim.cell
+    for trial in range(40):
+        S = rng.uniform(-0.5, 3.5, (4, 6))
+        S[0,3:5] = S[0,0:2]     # a point, a move along X, one along Y
+        S[1,4] = S[1,1]
+        S[2,3] = S[2,0]
+        S[:,2] = S[:,5] = 0.5
+        want = np.full((sim.ny, sim.nx), np.inf)
+        for s in S:
+            want = np.minimum(want, gcodesim.sweep(s, X, Y, sim.radius))
+        assert np.array_equal(gcodesim.coverage(S, X, Y, sim.radius), want < np.inf)
+
+def test_dense_plate():
+    import gcodecore, gcodesim
+    from gcodecore import JobParams
+    params = JobParams(x2=24.0, y2=24.0, z1=1.0, z2=0.9375, docXY=0.005)
+    report = gcodesim.simulate(params, gcodecore.machinePath("facing")(params))
+    assert report["islands"] == [] and report["gouge"] == 0.0
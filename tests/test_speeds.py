@@ -0,0 +1,87 @@
+import math
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import gcodecore, gcodespeeds
+from gcodecore import JobParams, sfmtable
+from gcodespeeds import MachineProfile, Sweep
+
+UNLIMITED = MachineProfile(maxHP=math.inf, maxRPM=math.inf, maxFeed=math.inf)
+
+def combos(sweep):
+    for index in np.ndindex(sweep.mrr.shape):
+        yield index, sweep.candidate(index)
+
+def test_unlimited_machine_runs_gcodecore_speeds():
+    sweep = Sweep(UNLIMITED, ["Aluminum, 6061", "Mild Steel"], (0.25, 0.5), (2, 4))
+    for index, c in combos(sweep):
+        S = gcodecore.speeds(gcodespeeds.candidateParams(c, JobParams()))
+        assert c["rpm"] == pytest.approx(S["rpm"])
+        assert c["feedRate"] == pytest.approx(S["ipm"][1])
+        assert c["ipt"] == pytest.approx(S["ipt"][1])
+        assert c["mrr"] == pytest.approx(S["mrr"][1])
+        assert c["hp"] == pytest.approx(S["hpr"][1])
+        assert sweep.ok[index] == (c["docXY"] <= c["toolDiam"])
+
+def test_ranking():
+    sweep = Sweep(MachineProfile(maxHP=0.5, maxRPM=8000.0, maxFeed=60.0))
+    best = sweep.best(50)
+    assert len(best) == 50
+    mrr = [c["mrr"] for c in best]
+    assert mrr == sorted(mrr, reverse=True)
+    assert mrr[0] == pytest.approx(sweep.mrr[sweep.ok].max())
+    # ties go to the smaller tool, then the lighter radial engagement
+    for a, b in zip(best, best[1:]):
+        if round(a["mrr"], 9) == round(b["mrr"], 9):
+            assert (a["toolDiam"], a["docXY"]) <= (b["toolDiam"], b["docXY"])
+    assert sweep.best(0) == []
+    assert [c["material"] for c in sweep.best(5, material="Brass")] == ["Brass"]*5
+    assert all(c["toolDiam"] == 0.5 for c in sweep.best(5, toolDiam=0.5))
+
+def test_machine_limits():
+    machine = MachineProfile(maxHP=0.75, maxRPM=6000.0, maxFeed=40.0)
+    sweep = Sweep(machine)
+    for index, c in combos(sweep):
+        assert c["rpm"] <= machine.maxRPM
+        assert c["feedRate"] <= machine.maxFeed
+        assert c["hp"] <= machine.maxHP*(1 + 1e-9)
+        if sweep.ok[index]:
+            mat = sfmtable[c["material"]]["intooth"]
+            assert mat["min"]*(1 - 1e-9) <= c["ipt"] <= mat["max"]*(1 + 1e-9)
+    # a small tool spins at maxRPM, not at its surface speed
+    c = sweep.candidate((sweep.materials.index("Brass"), 0, 0, 0, 0))
+    assert c["rpm"] == machine.maxRPM
+
+def test_flute_count():
+    # the feed cap leaves 2 flutes enough chip load, not 4
+    sweep = Sweep(MachineProfile(maxFeed=60.0), ["Aluminum, 6061"], (0.25,), (2, 4),
+                  docXYs=(0.05,), docZs=(0.05,))
+    two, four = sweep.candidate((0, 0, 0, 0, 0)), sweep.candidate((0, 0, 1, 0, 0))
+    assert two["feedRate"] == four["feedRate"] == 60.0
+    assert four["ipt"] == pytest.approx(two["ipt"]/2)
+    assert two["ipt"] >= 0.005 > four["ipt"]
+    assert sweep.ok[0, 0, 0, 0, 0] and not sweep.ok[0, 0, 1, 0, 0]
+    assert [c["flutes"] for c in sweep.best(5)] == [2]
+
+def test_feasibility():
+    sweep = Sweep(MachineProfile(minRPM=1000.0), ["Mild Steel"], (0.25, 1.0), (2,),
+                  docXYs=(0.1, 0.5), docZs=(0.05,))
+    # Mild Steel turns a 0.25in tool at ~1375 rpm, a 1in one at ~344. a 0.5in
+    # cut doesn't fit the 0.25in tool
+    assert sweep.ok[0, 0, 0, 0, 0]
+    assert not sweep.ok[0, 0, 0, 1, 0]
+    assert not sweep.ok[0, 1].any()
+    assert [(c["toolDiam"], c["docXY"]) for c in sweep.best(10)] == [(0.25, 0.1)]
+    with pytest.raises(KeyError):
+        Sweep(materials=["Unobtainium"])
+    with pytest.raises(TypeError):
+        MachineProfile(maxTorque=1.0)
+
+def test_candidate_params():
+    c = Sweep(materials=["Brass"]).best(1)[0]
+    params = gcodespeeds.candidateParams(c, JobParams(x2=4.0, y2=3.0))
+    assert (params.x2, params.y2) == (4.0, 3.0)
+    assert {k: getattr(params, k) for k in gcodespeeds.PARAM_KEYS} == {
+        k: c[k] for k in gcodespeeds.PARAM_KEYS}
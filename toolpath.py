@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# Array backed toolpath representation
+# Copyright 2017 - Michael T. Mayers
+# Licensed under the GPLV3 - see https://www.gnu.org/licenses/gpl-3.0.html
+#
+# A Toolpath is a struct-of-arrays segment store, one entry per motion
+# line of the program:
+#
+#   motion  G number (0 rapid, 1 feed)
+#   x y z   machine position *after* the segment (modal, nan = unknown)
+#   f       modal feed rate (nan = not set yet)
+#   words   which of X Y Z F the line actually wrote (W_* bits)
+#   role    what the move is for (ROLE_*), also selects its comment
+#
+# plus `pre` / `post` lists of literal lines (G20, G54, M2 ...) that go
+# before and after the segments. Generators yield programs as a series of
+# Toolpath chunks, gcodeemit turns chunks into text. Chunks sharing a
+# `key` emit identical text (same XY layer replayed at another Z).
+#
+# Fixed point toolpaths (decimals=k) keep x y z f as int64 counts of
+# 10**-k instead of floats, with UNSET standing in for nan. arrays()
+# hands both kinds out as float64 for analysis.
+
+import sys, json, struct
+from array import array
+
+#############################################################################
+
+RAPID = 0
+FEED = 1
+
+W_X = 1
+W_Y = 2
+W_Z = 4
+W_F = 8
+
+ROLE_CUT = 0
+ROLE_SAFEZ = 1     # G00 Z<safeZ>
+ROLE_START = 2     # first rapid over the start corner
+ROLE_RESTART = 3   # feed back to the start corner before the next layer
+ROLE_PLUNGE = 4    # feed down to the layer Z
+ROLE_HOP = 5       # rapid to the next ring
+
+ROLE_NOTES = (
+    None,
+    "rapid to safeZ",
+    "rapid to startXY",
+    "feed to startXY",
+    "feed to Z",
+    "move to startXY",
+)
+
+NAN = float("nan")
+UNSET = -(1<<63)
+
+FIELDS = (("motion","b"), ("words","B"), ("role","B"),
+          ("x","d"), ("y","d"), ("z","d"), ("f","d"))
+COORDS = ("x", "y", "z", "f")
+
+def formatFixed(n, decimals):
+    # int count of 10**-decimals -> shortest decimal text, 18750 -> "1.875"
+    q, r = divmod(abs(n), 10**decimals)
+    if r:
+        text = ("%d.%0*d" % (q, decimals, r)).rstrip("0")
+    else:
+        text = "%d" % q
+    return "-" + text if n < 0 else text
+
+#############################################################################
+
+class Segment(object):
+    # lightweight view of one entry, tp[i]
+    __slots__ = ("motion", "words", "role", "x", "y", "z", "f")
+
+    def __init__(self, motion, words, role, x, y, z, f):
+        self.motion = motion
+        self.words = words
+        self.role = role
+        self.x = x
+        self.y = y
+        self.z = z
+        self.f = f
+
+    def __repr__(self):
+        return "Segment(G%02d x=%g y=%g z=%g f=%g words=%d role=%d)" % (
+            self.motion, self.x, self.y, self.z, self.f, self.words, self.role)
+
+#############################################################################
+
+class Toolpath(object):
+
+    def __init__(self, start=None, decimals=None):
+        self.decimals = decimals
+        self.unset = NAN if decimals is None else UNSET
+        for name, code in self.fields():
+            setattr(self, name, array(code))
+        self.pre = []
+        self.post = []
+        self.key = None
+        # layer templates: how many rings / passes round the outline
+        self.rings = None
+        # modal position the first segment starts from
+        self.start = tuple(start) if start is not None else (self.unset,)*4
+
+    def fields(self):
+        if self.decimals is None:
+            return FIELDS
+        return tuple((name, "q" if name in COORDS else code) for name, code in FIELDS)
+
+    ###################################
+    # building
+
+    def cursor(self):
+        # (x, y, z, f) after the last segment
+        if len(self.motion) == 0:
+            return self.start
+        return (self.x[-1], self.y[-1], self.z[-1], self.f[-1])
+
+    def move(self, motion, x=None, y=None, z=None, f=None, role=ROLE_CUT):
+        # append one line, axes left as None keep their modal value
+        cx, cy, cz, cf = self.cursor()
+        words = 0
+        if x is not None:
+            cx = x
+            words |= W_X
+        if y is not None:
+            cy = y
+            words |= W_Y
+        if z is not None:
+            cz = z
+            words |= W_Z
+        if f is not None:
+            cf = f
+            words |= W_F
+        self.append(motion, words, role, cx, cy, cz, cf)
+
+    def rapid(self, x=None, y=None, z=None, f=None, role=ROLE_CUT):
+        self.move(RAPID, x, y, z, f, role)
+
+    def feed(self, x=None, y=None, z=None, f=None, role=ROLE_CUT):
+        self.move(FEED, x, y, z, f, role)
+
+    def append(self, motion, words, role, x, y, z, f):
+        self.motion.append(motion)
+        self.words.append(words)
+        self.role.append(role)
+        self.x.append(x)
+        self.y.append(y)
+        self.z.append(z)
+        self.f.append(f)
+
+    def extend(self, other):
+        if other.decimals != self.decimals:
+            raise ValueError("can't mix toolpaths with different resolutions")
+        for name, code in FIELDS:
+            getattr(self, name).extend(getattr(other, name))
+        self.pre.extend(other.pre)
+        self.post.extend(other.post)
+        return self
+
+    @classmethod
+    def fromArrays(cls, motion, words, role, x, y, z, f, start=None, decimals=None):
+        # bulk fill from equal length sequences or numpy arrays
+        tp = cls(start, decimals)
+        for (name, code), values in zip(FIELDS, (motion, words, role, x, y, z, f)):
+            col = getattr(tp, name)
+            if hasattr(values, "astype"):
+                col.frombytes(values.astype(col.typecode).tobytes())
+            else:
+                col.extend(values)
+        n = len(tp.motion)
+        if any(len(getattr(tp, name)) != n for name, code in FIELDS):
+            raise ValueError("toolpath columns differ in length")
+        return tp
+
+    @classmethod
+    def literal(cls, lines):
+        # a chunk of literal lines only (no motion)
+        tp = cls()
+        tp.pre = list(lines)
+        return tp
+
+    def atZ(self, z, start=None):
+        # copy of a layer template with every segment at height z, the
+        # copy keeps the template's key since its text is the same
+        tp = Toolpath(start, self.decimals)
+        for name, code in FIELDS:
+            if name != "z":
+                setattr(tp, name, getattr(self, name)[:])
+        tp.z = array(self.z.typecode, [z]) * len(self)
+        tp.key = self.key
+        tp.rings = self.rings
+        return tp
+
+    def withFeed(self, f):
+        # copy of a layer template cut at another feed rate, every
+        # segment's modal f becomes f. the text differs, so a new key
+        tp = Toolpath(self.start[:3] + (f,), self.decimals)
+        for name, code in FIELDS:
+            if name != "f":
+                setattr(tp, name, getattr(self, name)[:])
+        tp.f = array(self.f.typecode, [f]) * len(self)
+        tp.key = object()
+        tp.rings = self.rings
+        return tp
+
+    @classmethod
+    def concat(cls, chunks):
+        # pre/post lists are concatenated as well, so a program split
+        # into chunks (pre on the first, post on the last) joins back up
+        tp = None
+        for chunk in chunks:
+            if tp is None:
+                tp = cls(chunk.start, chunk.decimals)
+            tp.extend(chunk)
+        return tp if tp is not None else cls()
+
+    def __add__(self, other):
+        return Toolpath.concat((self, other))
+
+    ###################################
+    # access
+
+    def __len__(self):
+        return len(self.motion)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            first = range(len(self))[index]
+            tp = Toolpath(self.segmentStart(first[0]) if len(first) else None, self.decimals)
+            for name, code in FIELDS:
+                setattr(tp, name, getattr(self, name)[index])
+            return tp
+        if index < 0:
+            index += len(self)
+        return Segment(self.motion[index], self.words[index], self.role[index],
+                       self.x[index], self.y[index], self.z[index], self.f[index])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def segmentStart(self, index):
+        # modal (x, y, z, f) that segment `index` starts from
+        if index == 0:
+            return self.start
+        i = index-1
+        return (self.x[i], self.y[i], self.z[i], self.f[i])
+
+    def arrays(self):
+        # numpy views of the columns, coordinates always as float64.
+        # float toolpaths are zero-copy; the views pin the buffers, so
+        # drop them before appending to this toolpath again
+        import numpy as np
+        out = {name: np.frombuffer(getattr(self, name), dtype=code)
+               for name, code in FIELDS if name not in COORDS or self.decimals is None}
+        if self.decimals is not None:
+            for name in COORDS:
+                counts = np.frombuffer(getattr(self, name), dtype=np.int64)
+                values = counts / float(10**self.decimals)
+                values[counts == UNSET] = np.nan
+                out[name] = values
+        return out
+
+    def value(self, v):
+        # one coordinate as a float (nan when unset)
+        if self.decimals is None:
+            return v
+        return NAN if v == UNSET else v / float(10**self.decimals)
+
+    ###################################
+    # save / load
+    #
+    #  magic "GCTP", u32 version, u32 header length, u64 segment count,
+    #  json header (pre, post, start, decimals, byteorder), then the raw
+    #  columns
+
+    MAGIC = b"GCTP"
+    VERSION = 1
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            self.dump(f)
+
+    def dump(self, f):
+        header = json.dumps({
+            "pre": self.pre, "post": self.post,
+            "start": [None if v != v or v == UNSET else v for v in self.start],
+            "decimals": self.decimals,
+            "byteorder": sys.byteorder,
+        }).encode("utf-8")
+        f.write(self.MAGIC)
+        f.write(struct.pack("<IIQ", self.VERSION, len(header), len(self)))
+        f.write(header)
+        for name, code in FIELDS:
+            getattr(self, name).tofile(f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.undump(f)
+
+    @classmethod
+    def undump(cls, f):
+        if f.read(4) != cls.MAGIC:
+            raise ValueError("not a toolpath file")
+        version, hlen, count = struct.unpack("<IIQ", f.read(16))
+        if version != cls.VERSION:
+            raise ValueError("unsupported toolpath file version <%d>" % version)
+        header = json.loads(f.read(hlen).decode("utf-8"))
+        decimals = header.get("decimals")
+        tp = cls(None, decimals)
+        tp.start = tuple(tp.unset if v is None else v for v in header["start"])
+        tp.pre = header["pre"]
+        tp.post = header["post"]
+        for name, code in FIELDS:
+            col = getattr(tp, name)
+            col.fromfile(f, count)
+            if header["byteorder"] != sys.byteorder:
+                col.byteswap()
+        return tp